@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+def user_cache_key(user_id) -> str:
+    return f"user:{user_id}"
+
+
+class CachedModelBackend(ModelBackend):
+    """Autenticação padrão com o usuário da sessão guardado em cache.
+
+    O AuthenticationMiddleware busca o usuário a cada requisição; com o cache essa
+    consulta só acontece na primeira requisição ou depois que a conta é alterada.
+    """
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+        return user
@@ -0,0 +1,6 @@
+from .services import sudo_active as is_sudo_active
+
+
+def sudo(request):
+    # Callable: só é avaliado pelos templates que usam a variável
+    return {"sudo_active": lambda: is_sudo_active(request)}
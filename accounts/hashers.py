@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2 com número de iterações configurável (settings.PASSWORD_HASH_ITERATIONS).
+
+    Senhas gravadas com outro custo continuam válidas e são atualizadas no próximo login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS or super().iterations
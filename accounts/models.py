@@ -11,6 +11,7 @@ class CustomUser(AbstractUser):
         last_name (str): Sobrenome.
         email (str): Email.
         role (str): Cargo (employee/admin).
+        store (Store): Loja do usuário (vazio para a matriz, que vê todas as lojas).
         created_at (timestamp): Data de criação.
         updated_at (timestamp): Data de atualização.
 
@@ -21,6 +22,7 @@ class CustomUser(AbstractUser):
         max_length=20,
         choices=[("employee", "Funcionário"), ("admin", "Administrador")],
     )
+    store = models.ForeignKey("stores.Store", null=True, blank=True, on_delete=models.PROTECT)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
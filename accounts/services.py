@@ -1,7 +1,19 @@
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth import update_session_auth_hash
+from django.core import signing
 from django.core.exceptions import ValidationError
+from django.http import HttpRequest
 
 from .models import CustomUser
 
+logger = logging.getLogger(__name__)
+
+SUDO_SESSION_KEY = "sudo"
+SUDO_SALT = "accounts.sudo"
+
 
 def validate_email(email: str, account_id=None) -> list:
     """Valida email único"""
@@ -47,6 +59,15 @@ def create_account(data: dict) -> CustomUser:
     return account
 
 
+def visible_accounts(user: CustomUser):
+    """Contas que o usuário pode ver e alterar: as da própria loja, ou todas para a matriz."""
+
+    accounts = CustomUser.objects.all()
+    if user.store_id is not None:
+        accounts = accounts.filter(store_id=user.store_id)
+    return accounts
+
+
 def update_account(account: CustomUser, data: dict):
     """Atualiza as informações de uma conta"""
     error = []
@@ -64,3 +85,57 @@ def update_account(account: CustomUser, data: dict):
     account.role = data["role"]
 
     return account
+
+
+def _sudo_value(request: HttpRequest) -> str:
+    """Vincula a janela ao usuário, à sessão e à senha atual (o hash muda junto com ela)"""
+    user = request.user
+    return f"{user.pk}:{request.session.session_key}:{user.get_session_auth_hash()}"
+
+
+def sudo_active(request: HttpRequest) -> bool:
+    """Indica se o usuário confirmou a senha há menos de settings.SUDO_WINDOW segundos"""
+    token = request.session.get(SUDO_SESSION_KEY)
+    if not token or not request.user.is_authenticated:
+        return False
+
+    try:
+        value = signing.TimestampSigner(salt=SUDO_SALT).unsign(token, max_age=settings.SUDO_WINDOW)
+    except signing.BadSignature:
+        return False
+    return value == _sudo_value(request)
+
+
+def confirm_password(request: HttpRequest, password: str) -> bool:
+    """Confirma a senha do usuário antes de uma ação destrutiva.
+
+    Uma confirmação bem-sucedida abre uma janela de settings.SUDO_WINDOW segundos, assinada
+    e vinculada à sessão, em que as próximas ações não recalculam o hash da senha.
+
+    Args:
+        request (HttpRequest): Requisição do usuário autenticado.
+        password (str): Senha informada.
+
+    Returns:
+        bool: Se a ação está autorizada.
+    """
+
+    if sudo_active(request):
+        return True
+
+    user = request.user
+    old_hash = user.password
+
+    started = time.perf_counter()
+    valid = user.check_password(password)
+    logger.info("Verificação de senha em %.1f ms", (time.perf_counter() - started) * 1000)
+
+    if not valid:
+        return False
+
+    # check_password atualiza hashes com custo antigo, o que invalidaria a sessão
+    if user.password != old_hash:
+        update_session_auth_hash(request, user)
+
+    request.session[SUDO_SESSION_KEY] = signing.TimestampSigner(salt=SUDO_SALT).sign(_sudo_value(request))
+    return True
@@ -0,0 +1,17 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .backends import user_cache_key
+from .models import CustomUser
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """Remove do cache a conta alterada ou deletada (account_update, account_delete, login...)."""
+
+    key = user_cache_key(instance.pk)
+    cache.delete(key)
+    # Remove de novo após o commit, caso outra requisição tenha lido a versão antiga
+    transaction.on_commit(lambda: cache.delete(key))
@@ -1,3 +1,158 @@
-from django.test import TestCase
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from stores.models import Store
+
+from .backends import user_cache_key
+from .models import CustomUser
+from .services import confirm_password, sudo_active
+
+
+def create_user(username: str, role: str = "admin", store: Store | None = None) -> CustomUser:
+    return CustomUser.objects.create_user(
+        username=username,
+        email=f"{username}@devspizza.com",
+        password="senha-forte",
+        role=role,
+        first_name=username,
+        last_name="Teste",
+        store=store,
+    )
+
+
+class ConfirmPasswordTests(TestCase):
+    """Janela de confirmação de senha (sudo) das ações destrutivas."""
+
+    def setUp(self):
+        self.user = create_user("admin")
+        self.request = self.make_request()
+
+    def make_request(self, session_key: str | None = None):
+        request = RequestFactory().post("/")
+        request.user = self.user
+        request.session = SessionStore(session_key)
+        if session_key is None:
+            request.session.create()
+        return request
+
+    def test_wrong_password_is_rejected(self):
+        self.assertFalse(confirm_password(self.request, "errada"))
+        self.assertFalse(sudo_active(self.request))
+
+    def test_window_skips_the_password_check(self):
+        self.assertTrue(confirm_password(self.request, "senha-forte"))
+        self.assertTrue(sudo_active(self.request))
+
+        with mock.patch.object(CustomUser, "check_password") as check_password:
+            self.assertTrue(confirm_password(self.request, "errada"))
+        check_password.assert_not_called()
+
+    def test_window_expires(self):
+        confirm_password(self.request, "senha-forte")
+
+        later = time.time() + settings.SUDO_WINDOW + 1
+        with mock.patch("time.time", return_value=later):
+            self.assertFalse(sudo_active(self.request))
+            self.assertFalse(confirm_password(self.request, "errada"))
+
+    def test_window_is_bound_to_the_session(self):
+        confirm_password(self.request, "senha-forte")
+
+        other = self.make_request()
+        other.session.update(dict(self.request.session))
+        self.assertFalse(sudo_active(other))
+
+    def test_password_change_closes_the_window(self):
+        confirm_password(self.request, "senha-forte")
+
+        self.user.set_password("nova-senha")
+        self.assertFalse(sudo_active(self.request))
+
+
+class AccountScopeTests(TestCase):
+    """Administradores de uma loja só veem as contas da própria loja."""
+
+    def setUp(self):
+        self.centro = Store.objects.create(name="Centro", code="centro")
+        self.sul = Store.objects.create(name="Sul", code="sul")
+        self.hq = create_user("matriz")
+        self.admin = create_user("centro", store=self.centro)
+        self.other = create_user("sul", store=self.sul)
+
+    def test_store_admin_lists_only_own_store(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("account_list"))
+
+        self.assertEqual(list(response.context["page_obj"]), [self.admin])
+
+    def test_store_admin_cannot_edit_other_store(self):
+        self.client.force_login(self.admin)
+
+        self.assertEqual(self.client.get(reverse("account_update", args=[self.other.id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse("account_update", args=[self.admin.id])).status_code, 200)
+
+    def test_hq_lists_every_account(self):
+        self.client.force_login(self.hq)
+        response = self.client.get(reverse("account_list"))
+
+        self.assertEqual(response.context["page_obj"].paginator.count, 3)
+
+
+@override_settings(AUTHENTICATION_BACKENDS=["accounts.backends.CachedModelBackend"], SESSION_ENGINE="core.sessions")
+class CachedUserTests(TestCase):
+    """Usuário da sessão em cache (CachedModelBackend), removido quando a conta muda."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user("caixa")
+        self.client.force_login(self.user)
+        self.admin = Client()
+        self.admin.force_login(create_user("gerente"))
+
+        # A primeira requisição guarda o usuário no cache
+        self.assertEqual(self.client.get(reverse("account_list")).status_code, 200)
+        self.assertEqual(cache.get(user_cache_key(self.user.pk)), self.user)
+
+    def assertLoggedOut(self):
+        response = self.client.get(reverse("account_list"))
+        self.assertRedirects(response, f"{reverse('login')}?next={reverse('account_list')}")
+
+    def test_account_update_replaces_cached_user(self):
+        data = {"first_name": "Caixa", "last_name": "Novo", "email": "caixa@devspizza.com", "role": "employee"}
+        data.update(password="", confirm_password="")
+        self.admin.post(reverse("account_update", args=[self.user.id]), data)
+
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        # O cargo novo vale já na próxima requisição
+        self.assertRedirects(self.client.get(reverse("account_list")), reverse("home"), fetch_redirect_response=False)
+
+    def test_account_delete_logs_out(self):
+        self.admin.post(reverse("account_delete", args=[self.user.id]), {"password": "senha-forte"})
+
+        self.assertFalse(CustomUser.objects.filter(id=self.user.id).exists())
+        self.assertLoggedOut()
+
+    def test_password_change_logs_out(self):
+        self.user.set_password("nova-senha")
+        self.user.save()
+
+        self.assertLoggedOut()
+
+    def test_deactivated_user_loses_access(self):
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertLoggedOut()
+
+    def test_logout_removes_cached_session(self):
+        session_key = self.client.session.session_key
+        self.client.post(reverse("logout"))
+
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+        self.assertLoggedOut()
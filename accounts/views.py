@@ -12,7 +12,7 @@ from django.views.decorators.http import require_http_methods
 from core.decorators import admin_required
 
 from .models import CustomUser
-from .services import create_account, update_account
+from .services import confirm_password, create_account, update_account, visible_accounts
 
 
 @require_http_methods(["GET", "POST"])
@@ -85,6 +85,8 @@ def register(request: HttpRequest) -> HttpResponse:
 
     try:
         user = create_account(request.POST)
+        # A conta nova pertence à mesma loja de quem a cadastrou
+        user.store_id = request.user.store_id
 
         user.save()
 
@@ -136,7 +138,7 @@ def account_list(request: HttpRequest) -> HttpResponse:
         HttpResponse: Página listando os usuários.
     """
 
-    accounts = CustomUser.objects.all()
+    accounts = visible_accounts(request.user)
 
     field = request.GET.get("field")
     value = request.GET.get("value")
@@ -183,7 +185,7 @@ def account_detail(request: HttpRequest, id: int) -> HttpResponse:
         HttpResponse: Página de detalhamento.
     """
 
-    account = get_object_or_404(CustomUser, id=id)
+    account = get_object_or_404(visible_accounts(request.user), id=id)
 
     return render(request, "account_detail.html", {"account": account})
 
@@ -211,7 +213,7 @@ def account_update(request: HttpRequest, id: int) -> HttpResponse:
         HttpResponseRedirect: Redirecionamento para a página a lista de usuários (POST válido).
     """
 
-    account = get_object_or_404(CustomUser, id=id)
+    account = get_object_or_404(visible_accounts(request.user), id=id)
     context = {"account": account, "role_choices": CustomUser._meta.get_field("role").choices}
 
     if request.method == "GET":
@@ -253,7 +255,7 @@ def account_delete(request, id):
         HttpResponseRedirect: Redirecionamento para a página a lista de usuários (POST válido).
     """
 
-    account = get_object_or_404(CustomUser, id=id)
+    account = get_object_or_404(visible_accounts(request.user), id=id)
     context = {"account": account}
 
     if request.method == "GET":
@@ -262,7 +264,7 @@ def account_delete(request, id):
     else:
         password = request.POST.get("password")
 
-        if not request.user.check_password(password):
+        if not confirm_password(request, password):
             messages.error(request, "A senha que você inseriu está incorreta!")
             return render(request, "account_delete.html", context)
 
@@ -0,0 +1,18 @@
+from django.apps import AppConfig
+from django.contrib.staticfiles.apps import StaticFilesConfig as BaseStaticFilesConfig
+from django.db.backends.signals import connection_created
+
+
+class CoreConfig(AppConfig):
+    default = True
+    name = "core"
+
+    def ready(self):
+        from .metrics import install_query_counter
+
+        connection_created.connect(install_query_counter, dispatch_uid="metrics:query_counter")
+
+
+class StaticFilesConfig(BaseStaticFilesConfig):
+    # input.css é o fonte do Tailwind, apenas o output.css gerado é publicado
+    ignore_patterns = BaseStaticFilesConfig.ignore_patterns + ["css/input.css"]
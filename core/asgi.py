@@ -3,6 +3,9 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Servido via ASGI o /events mantém as conexões Server-Sent Events abertas no event
+loop, sem ocupar um worker por cliente (ver core.live).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
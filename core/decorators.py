@@ -1,7 +1,17 @@
+import random
+import time
 from functools import wraps
+from hashlib import md5
 
 from django.contrib import messages
+from django.db import OperationalError, connections, transaction
 from django.shortcuts import redirect
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.utils.timezone import localdate
+
+from .routers import current_store, replica_reads, replica_version, store_db
+from .versioning import get_versions
 
 
 def admin_required(func):
@@ -14,3 +24,136 @@ def admin_required(func):
             return redirect("home")
 
     return wrapper
+
+
+def hq_required(func):
+    # Usuários de uma loja não veem os dados das outras lojas
+    @wraps(func)
+    def wrapper(request, *args, **kwargs):
+        if request.user.store_id is None:
+            return func(request, *args, **kwargs)
+        else:
+            messages.error(request, "Acesso restrito à matriz")
+            return redirect("home")
+
+    return wrapper
+
+
+def retry_on_lock(attempts: int = 5, backoff: float = 0.05):
+    """Repete a transação quando o banco está travado por outra escrita.
+
+    Deve envolver a função já decorada com store_atomic, para que cada tentativa
+    rode uma transação nova. Dentro de um bloco atômico externo não há como repetir só
+    a parte interna, então o erro é propagado.
+
+    Args:
+        attempts (int): Número máximo de tentativas.
+        backoff (float): Espera inicial (segundos), dobrada a cada nova tentativa.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(attempts):
+                try:
+                    return func(*args, **kwargs)
+                except OperationalError as e:
+                    locked = "locked" in str(e) or "deadlock" in str(e)
+                    if not locked or attempt == attempts - 1 or connections[store_db()].in_atomic_block:
+                        raise
+                    time.sleep(backoff * 2**attempt * (1 + random.random()))
+
+        return wrapper
+
+    return decorator
+
+
+def store_atomic(func):
+    """Executa a função em uma transação no banco da loja atual (ver StoreRouter)."""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with transaction.atomic(using=store_db()):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def use_replica(func):
+    """Permite que as leituras da view sejam feitas na réplica do banco.
+
+    Deve ficar acima do conditional_view, para que as chaves de cache considerem o
+    atraso da réplica.
+    """
+
+    @wraps(func)
+    def wrapper(request, *args, **kwargs):
+        token = replica_reads.set(request.session.get("db_last_write", 0.0))
+        try:
+            return func(request, *args, **kwargs)
+        finally:
+            replica_reads.reset(token)
+
+    return wrapper
+
+
+def conditional_view(*labels):
+    """Responde 304 Not Modified quando os dados exibidos pela view não mudaram.
+
+    A versão dos grupos informados fica disponível em request.data_version para ser
+    usada como chave dos fragmentos cacheados nos templates. O ETag também considera o
+    usuário, a sessão, a URL e o dia atual, já que a página exibe dados de cada um.
+
+    Args:
+        labels (str): Grupos de tabelas lidos pela view (ex: "stock", "movements").
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(request, *args, **kwargs):
+            versions = get_versions(*labels)
+            request.data_version = "-".join(str(versions[label]) for label in labels)
+
+            # Cada loja vê apenas os próprios dados
+            store = current_store.get()
+            if store is not None:
+                request.data_version += f"-s{store.id}"
+
+            # A réplica pode estar atrás das versões, então a chave também considera a cópia lida
+            synced_at = replica_version()
+            if synced_at is not None:
+                request.data_version += f"-r{synced_at}"
+
+            # Mensagens pendentes só aparecem se a página for renderizada novamente
+            if request.method not in ("GET", "HEAD") or len(messages.get_messages(request)):
+                response = func(request, *args, **kwargs)
+                patch_cache_control(response, private=True, no_cache=True)
+                return response
+
+            user = request.user
+            seed = ":".join(
+                [
+                    request.data_version,
+                    str(user.pk),
+                    str(getattr(user, "updated_at", "")),
+                    str(request.session.session_key),
+                    request.get_full_path(),
+                    str(localdate()),
+                ]
+            )
+            etag = quote_etag(md5(seed.encode(), usedforsecurity=False).hexdigest())
+            last_modified = max(versions.values()) // 1_000_000_000
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = func(request, *args, **kwargs)
+                if response.status_code == 200:
+                    response.headers.setdefault("ETag", etag)
+                    response.headers.setdefault("Last-Modified", http_date(last_modified))
+
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return wrapper
+
+    return decorator
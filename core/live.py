@@ -0,0 +1,180 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.db.models import Max
+
+from stores.models import StoreEvent
+
+
+def publish(store_id: int | None, data: dict) -> None:
+    """Grava o evento para os clientes conectados e avisa o hub deste processo.
+
+    Deve ser chamado depois do commit (transaction.on_commit), para que nenhum cliente
+    receba uma alteração desfeita. Mantém apenas os últimos LIVE_EVENT_KEEP eventos. Fora
+    do ASGI (SERVER=wsgi) não grava nada, já que o /events não mantém conexões abertas.
+
+    Args:
+        store_id (int): Loja da alteração (None para dados sem loja).
+        data (dict): Conteúdo do evento.
+    """
+
+    if settings.SERVER != "asgi":
+        return
+
+    event = StoreEvent.objects.create(store_id=store_id, data=data)
+    StoreEvent.objects.filter(id__lte=event.id - settings.LIVE_EVENT_KEEP).delete()
+    hub.notify()
+
+
+def events_after(last_id: int) -> list[StoreEvent]:
+    try:
+        return list(StoreEvent.objects.filter(id__gt=last_id).select_related("store").order_by("id"))
+    finally:
+        close_old_connections()
+
+
+def latest_event_id() -> int:
+    try:
+        return StoreEvent.objects.aggregate(last=Max("id"))["last"] or 0
+    finally:
+        close_old_connections()
+
+
+def visible(event: StoreEvent, store_id: int | None) -> bool:
+    """Se o evento interessa a um cliente da loja informada.
+
+    Usuários sem loja (matriz) veem os dados do banco "default", então recebem os
+    eventos das lojas que ficam nele.
+    """
+
+    if store_id is not None:
+        return event.store_id == store_id
+    return event.store is None or event.store.database == "default"
+
+
+def format_event(event: StoreEvent) -> str:
+    data = json.dumps(event.data, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return f"id: {event.id}\nevent: {event.data['type']}\ndata: {data}\n\n"
+
+
+class Hub:
+    """Distribui os eventos gravados em StoreEvent aos clientes conectados ao processo.
+
+    Uma única tarefa por processo lê os eventos novos, uma consulta a cada
+    LIVE_POLL_INTERVAL segundos (ou logo após uma publicação feita no próprio processo),
+    e coloca cada evento na fila dos clientes interessados. O custo no banco não cresce
+    com o número de conexões, e eventos publicados por outros workers também chegam.
+
+    Clientes que não consomem a fila (conexão lenta) são desconectados e, ao reconectar,
+    recebem os eventos perdidos pelo Last-Event-ID.
+    """
+
+    def __init__(self):
+        self.subscribers: dict[asyncio.Queue, int | None] = {}
+        self.last_id = None
+        self.loop = None
+        self.wakeup = None
+        self.started = None
+        self.task = None
+
+    async def subscribe(self, store_id: int | None) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=settings.LIVE_QUEUE_SIZE)
+        self.subscribers[queue] = store_id
+
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.loop is not loop:
+            self.loop = loop
+            self.wakeup = asyncio.Event()
+            self.started = asyncio.Event()
+            self.task = loop.create_task(self.run())
+
+        # Só retorna depois que o hub sabe a partir de qual evento distribuir
+        await self.started.wait()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self.subscribers.pop(queue, None)
+
+    def is_subscribed(self, queue: asyncio.Queue) -> bool:
+        return queue in self.subscribers
+
+    def notify(self) -> None:
+        # Chamado pela thread que publicou o evento, fora do event loop
+        if self.loop is None or self.loop.is_closed():
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+        except RuntimeError:
+            pass
+
+    async def run(self) -> None:
+        try:
+            self.last_id = await sync_to_async(latest_event_id, thread_sensitive=False)()
+            self.started.set()
+
+            while self.subscribers:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), settings.LIVE_POLL_INTERVAL)
+                except TimeoutError:
+                    pass
+                self.wakeup.clear()
+
+                for event in await sync_to_async(events_after, thread_sensitive=False)(self.last_id):
+                    self.last_id = event.id
+                    self.dispatch(event)
+        except Exception:
+            # Encerra as conexões, que reconectam e recuperam os eventos pelo Last-Event-ID
+            self.subscribers.clear()
+            raise
+        finally:
+            # Sem clientes a tarefa termina; a próxima conexão começa do último evento
+            self.started.set()
+            self.task = None
+
+    def dispatch(self, event: StoreEvent) -> None:
+        for queue, store_id in list(self.subscribers.items()):
+            if not visible(event, store_id):
+                continue
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.unsubscribe(queue)
+
+
+hub = Hub()
+
+
+async def stream(store_id: int | None, last_event_id: int | None):
+    """Gera o fluxo Server-Sent Events de um cliente.
+
+    Com Last-Event-ID (reconexão) reenvia primeiro os eventos perdidos. Envia um
+    comentário a cada LIVE_HEARTBEAT segundos para manter a conexão aberta em proxies.
+    """
+
+    queue = await hub.subscribe(store_id)
+    sent = 0
+    try:
+        yield f"retry: {settings.LIVE_RETRY_MS}\n\n"
+
+        if last_event_id is not None:
+            for event in await sync_to_async(events_after, thread_sensitive=False)(last_event_id):
+                if visible(event, store_id):
+                    yield format_event(event)
+                sent = event.id
+
+        while hub.is_subscribed(queue) or not queue.empty():
+            try:
+                event = await asyncio.wait_for(queue.get(), settings.LIVE_HEARTBEAT)
+            except TimeoutError:
+                yield ": ping\n\n"
+                continue
+            # Eventos já reenviados pelo Last-Event-ID também podem estar na fila
+            if event.id > sent:
+                sent = event.id
+                yield format_event(event)
+    finally:
+        hub.unsubscribe(queue)
@@ -0,0 +1,189 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.timezone import localdate, make_aware
+
+from core.versioning import bump_version
+from movements.models import Movement, MovementInflow, MovementOutflow
+from stock.models import Category, Ingredient, Product, ProductIngredient
+from stock.sync import log_changes
+
+# Prefixos que identificam os dados gerados (usados pelo --clear e pelo run_benchmarks)
+DATASET_USER = "__dataset__"
+CATEGORY_PREFIX = "ds-categoria-"
+INGREDIENT_PREFIX = "ds-ingrediente-"
+PRODUCT_PREFIX = "ds-produto-"
+
+MEASURES = ("g", "kg", "unit")
+CLEAR_BATCH_SIZE = 900
+
+
+@contextmanager
+def manual_dates():
+    """Permite gravar Movement.date com o valor informado (auto_now_add sobrescreve)."""
+
+    field = Movement._meta.get_field("date")
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = "Gera uma massa de dados sintética e determinística para medir desempenho."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ingredients", type=int, default=500, help="Quantidade de ingredientes.")
+        parser.add_argument("--products", type=int, default=2_000, help="Quantidade de produtos.")
+        parser.add_argument("--movements", type=int, default=100_000, help="Quantidade de movimentações.")
+        parser.add_argument("--recipe-size", type=int, default=6, help="Ingredientes por produto (máximo).")
+        parser.add_argument("--days", type=int, default=365, help="Período, até hoje, em que as datas são sorteadas.")
+        parser.add_argument("--seed", type=int, default=42, help="Semente do gerador (mesma semente, mesmos dados).")
+        parser.add_argument("--batch-size", type=int, default=5_000, help="Linhas por bulk_create.")
+        parser.add_argument("--clear", action="store_true", help="Remove os dados gerados anteriormente.")
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            self.clear()
+        elif Ingredient.objects.filter(name__startswith=INGREDIENT_PREFIX).exists():
+            raise CommandError("Já existem dados gerados. Use --clear para recriá-los.")
+
+        if options["recipe_size"] > options["ingredients"]:
+            raise CommandError("--recipe-size não pode ser maior que --ingredients.")
+
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        started = time.monotonic()
+
+        with transaction.atomic():
+            ingredients = self.create_ingredients(options["ingredients"])
+            products = self.create_products(options["products"], ingredients, options["recipe_size"])
+        self.log(f"{len(ingredients)} ingredientes e {len(products)} produtos", started)
+
+        self.create_movements(options["movements"], options["days"], ingredients, products)
+        self.log(f"{options['movements']} movimentações", started)
+
+        # bulk_create não dispara sinais (o registro de alterações é gravado junto)
+        bump_version("stock")
+        bump_version("movements")
+
+    def log(self, message: str, started: float) -> None:
+        self.stdout.write(f"{message} ({time.monotonic() - started:.1f}s)")
+
+    def clear(self) -> None:
+        started = time.monotonic()
+        while True:
+            # Em lotes, para não montar um IN com milhões de ids
+            ids = list(Movement.objects.filter(user=DATASET_USER).values_list("id", flat=True)[:CLEAR_BATCH_SIZE])
+            if not ids:
+                break
+            Movement.objects.filter(id__in=ids).delete()
+        Product.objects.filter(name__startswith=PRODUCT_PREFIX).delete()
+        Ingredient.objects.filter(name__startswith=INGREDIENT_PREFIX).delete()
+        Category.objects.filter(name__startswith=CATEGORY_PREFIX).delete()
+        self.log("Dados anteriores removidos", started)
+
+    def create_ingredients(self, count: int) -> list[Ingredient]:
+        categories = Category.objects.bulk_create(
+            Category(name=f"{CATEGORY_PREFIX}{number:02d}") for number in range(1, 11)
+        )
+        ingredients = []
+        for number in range(1, count + 1):
+            measure = self.rng.choice(MEASURES)
+            ingredients.append(
+                Ingredient(
+                    name=f"{INGREDIENT_PREFIX}{number:05d}",
+                    category=self.rng.choice(categories),
+                    measure=measure,
+                    # Estoque alto o bastante para as saídas do benchmark
+                    qte=Decimal(self.rng.randint(1_000_000, 9_000_000)),
+                    min_qte=Decimal(self.rng.randint(100, 5_000)),
+                )
+            )
+        ingredients = Ingredient.objects.bulk_create(ingredients, batch_size=self.batch_size)
+        log_changes([*categories, *ingredients])
+        return ingredients
+
+    def create_products(self, count: int, ingredients: list, recipe_size: int) -> list[Product]:
+        products = Product.objects.bulk_create(
+            (
+                Product(name=f"{PRODUCT_PREFIX}{number:05d}", price=Decimal(self.rng.randint(500, 15_000)) / 100)
+                for number in range(1, count + 1)
+            ),
+            batch_size=self.batch_size,
+        )
+
+        recipe_items = []
+        for product in products:
+            for ingredient in self.rng.sample(ingredients, self.rng.randint(1, recipe_size)):
+                quantity = Decimal(self.rng.randint(1, 500)) / (1 if ingredient.measure == "g" else 100)
+                recipe_items.append(ProductIngredient(product=product, ingredient=ingredient, quantity=quantity))
+        ProductIngredient.objects.bulk_create(recipe_items, batch_size=self.batch_size)
+        log_changes([*products, *recipe_items])
+        return products
+
+    def create_movements(self, count: int, days: int, ingredients: list, products: list) -> None:
+        """Grava as movimentações em lotes, cada lote em uma transação.
+
+        As datas ficam entre hoje e `days` dias atrás, em ordem crescente; 30% das
+        movimentações são entradas. O estoque dos ingredientes não é alterado.
+        """
+
+        end = make_aware(datetime.combine(localdate(), datetime.min.time()))
+        start = end - timedelta(days=days)
+        step = timedelta(days=days) / max(count, 1)
+
+        created = 0
+        with manual_dates():
+            while created < count:
+                size = min(self.batch_size, count - created)
+                movements, inflows, outflows = [], [], []
+
+                for offset in range(size):
+                    date = start + step * (created + offset) + timedelta(seconds=self.rng.randint(0, 59))
+                    if self.rng.random() < 0.3:
+                        movements.append(self.inflow(date, ingredients))
+                    else:
+                        movements.append(self.outflow(date, products))
+
+                with transaction.atomic():
+                    Movement.objects.bulk_create([movement for movement, _ in movements])
+                    for movement, lines in movements:
+                        for line in lines:
+                            line.movement = movement
+                        (inflows if movement.type == "in" else outflows).extend(lines)
+                    MovementInflow.objects.bulk_create(inflows)
+                    MovementOutflow.objects.bulk_create(outflows)
+
+                created += size
+                if created % (self.batch_size * 20) == 0:
+                    self.stdout.write(f"  {created}/{count}")
+
+    def inflow(self, date, ingredients: list) -> tuple[Movement, list]:
+        lines = []
+        for ingredient in self.rng.sample(ingredients, self.rng.randint(1, min(4, len(ingredients)))):
+            lines.append(
+                MovementInflow(
+                    ingredient=ingredient,
+                    name=ingredient.name,
+                    quantity=Decimal(self.rng.randint(1, 500)),
+                    price=Decimal(self.rng.randint(1_000, 50_000)) / 100,
+                    measure=ingredient.measure,
+                )
+            )
+        movement = Movement(user=DATASET_USER, type="in", date=date, value=sum(line.price for line in lines))
+        return movement, lines
+
+    def outflow(self, date, products: list) -> tuple[Movement, list]:
+        lines = []
+        for product in self.rng.sample(products, self.rng.randint(1, min(3, len(products)))):
+            quantity = self.rng.randint(1, 5)
+            lines.append(MovementOutflow(name=product.name, quantity=quantity, price=product.price * quantity))
+        movement = Movement(user=DATASET_USER, type="out", date=date, value=sum(line.price for line in lines))
+        return movement, lines
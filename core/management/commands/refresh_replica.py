@@ -0,0 +1,43 @@
+import sqlite3
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.routers import REPLICA, synced_marker
+
+
+class Command(BaseCommand):
+    help = "Atualiza a réplica SQLite com uma cópia consistente do banco principal."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Repete a cópia a cada N segundos (0 copia uma única vez).",
+        )
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES["default"]
+        replica = settings.DATABASES.get(REPLICA)
+
+        if not replica or primary["ENGINE"] != "django.db.backends.sqlite3":
+            raise CommandError("Defina DB_REPLICA_NAME para usar uma réplica SQLite.")
+
+        while True:
+            started = time.time()
+            self.copy(primary["NAME"], replica["NAME"])
+            # Só marca como sincronizada depois da cópia completa
+            synced_marker(replica["NAME"]).write_text(str(started))
+
+            self.stdout.write(f"Réplica atualizada em {time.time() - started:.2f}s")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
+
+    def copy(self, source: str, destination: str) -> None:
+        # A API de backup copia página a página com o banco em uso, sem travar os terminais
+        with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(destination)) as dst:
+            src.backup(dst)
@@ -0,0 +1,229 @@
+import json
+import random
+import statistics
+import subprocess
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+from django.utils.timezone import localdate
+
+from accounts.models import CustomUser
+from movements.models import Movement
+from stock.models import Ingredient, Product
+from stock.sync import log_changes
+
+from .generate_dataset import INGREDIENT_PREFIX, PRODUCT_PREFIX
+
+BENCH_EMAIL = "bench@devspizza.local"
+BENCH_NAME = "__bench__"
+
+
+def format_br(value) -> str:
+    return str(value).replace(".", ",")
+
+
+class Command(BaseCommand):
+    help = "Mede o tempo das principais rotas sobre a massa criada pelo generate_dataset e grava o resultado em JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20, help="Execuções medidas por rota.")
+        parser.add_argument("--warmup", type=int, default=2, help="Execuções descartadas antes da medição.")
+        parser.add_argument("--only", nargs="+", help="Mede apenas as rotas informadas.")
+        parser.add_argument("--seed", type=int, default=42, help="Semente usada para escolher produtos e buscas.")
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="Arquivo JSON de saída (padrão: benchmarks/<data>-<commit>.json).",
+        )
+        parser.add_argument("--compare", help="JSON de uma execução anterior para comparar as medianas.")
+
+    def handle(self, *args, **options):
+        self.products = list(Product.objects.filter(name__startswith=PRODUCT_PREFIX).order_by("id"))
+        if not self.products:
+            raise CommandError("Nenhum dado gerado. Rode o generate_dataset antes.")
+
+        self.rng = random.Random(options["seed"])
+        self.client = self.login()
+
+        cases = self.cases()
+        if options["only"]:
+            unknown = set(options["only"]) - cases.keys()
+            if unknown:
+                raise CommandError(f"Rotas desconhecidas: {', '.join(sorted(unknown))}. Opções: {', '.join(cases)}")
+            cases = {name: cases[name] for name in options["only"]}
+
+        stock = dict(Ingredient.objects.filter(name__startswith=INGREDIENT_PREFIX).values_list("id", "qte"))
+        last_movement = Movement.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        try:
+            results = {}
+            for name, request in cases.items():
+                results[name] = self.measure(request, options["warmup"], options["repeat"])
+                self.stdout.write(self.format_line(name, results[name]))
+        finally:
+            self.restore(stock, last_movement)
+
+        report = {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "commit": self.commit(),
+            "database": connection.vendor,
+            "dataset": {
+                "ingredients": len(stock),
+                "products": len(self.products),
+                "movements": Movement.objects.count(),
+            },
+            "repeat": options["repeat"],
+            "results": results,
+        }
+
+        default_name = f"benchmarks/{datetime.now():%Y%m%d-%H%M%S}-{report['commit'] or 'local'}.json"
+        output = settings.BASE_DIR / (options["output"] or default_name)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        self.stdout.write(f"Resultado gravado em {output}")
+
+        if options["compare"]:
+            self.compare(json.loads((settings.BASE_DIR / options["compare"]).read_text(encoding="utf-8")), results)
+
+    def login(self) -> Client:
+        # O Client usa o host "testserver"
+        if "*" not in settings.ALLOWED_HOSTS:
+            settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+
+        user = CustomUser.objects.filter(email=BENCH_EMAIL).first()
+        if user is None:
+            user = CustomUser.objects.create_user(
+                username=BENCH_NAME,
+                email=BENCH_EMAIL,
+                password=None,
+                role="admin",
+                first_name=BENCH_NAME,
+            )
+
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def cases(self) -> dict:
+        """Rotas medidas: nome -> função que devolve (método, url, dados).
+
+        As consultas da página inicial rodam em outras threads e não entram na contagem.
+        """
+
+        today = localdate()
+        deep_page = max(Movement.objects.count() // 10 // 2, 1)
+        ingredients = Ingredient.objects.filter(name__startswith=INGREDIENT_PREFIX).count()
+        products = self.products
+
+        def outflow():
+            data = {"type": "out", "products": [], "commentary": ""}
+            for product in self.rng.sample(products, min(3, len(products))):
+                data["products"].append(product.id)
+                data[f"qp-{product.id}"] = "1"
+            return "post", reverse("movement_create"), data
+
+        def product_update():
+            # Reenvia os dados atuais, sem alterar o produto
+            product = self.rng.choice(products)
+            recipe = product.productingredient_set.all()
+            data = {
+                "name": product.name,
+                "price": format_br(product.price),
+                "ingredients": [item.ingredient_id for item in recipe],
+            }
+            data.update({f"q-{item.ingredient_id}": format_br(item.quantity) for item in recipe})
+            return "post", reverse("product_update", args=[product.id]), data
+
+        return {
+            "home": lambda: ("get", reverse("home"), {}),
+            "movement_list": lambda: ("get", reverse("movement_list"), {}),
+            "movement_list_deep": lambda: ("get", reverse("movement_list"), {"page": deep_page}),
+            "report_30d": lambda: (
+                "post",
+                reverse("report"),
+                {"start_date": f"{today - timedelta(days=29)}", "end_date": f"{today}"},
+            ),
+            "create_outflow": outflow,
+            "ingredient_search": lambda: (
+                "get",
+                reverse("ingredient_list"),
+                # Cerca de 10 ingredientes por busca (ex: "0012" encontra 00120 a 00129)
+                {"field": "name", "value": f"{self.rng.randint(1, ingredients) // 10:04d}"},
+            ),
+            "product_update": product_update,
+        }
+
+    def measure(self, request, warmup: int, repeat: int) -> dict:
+        timings, queries = [], []
+
+        def count_query(execute, sql, params, many, context):
+            queries[-1] += 1
+            return execute(sql, params, many, context)
+
+        for run in range(warmup + repeat):
+            method, url, data = request()
+            queries.append(0)
+            with ExitStack() as stack:
+                for db in connections.all():
+                    stack.enter_context(db.execute_wrapper(count_query))
+                started = time.perf_counter()
+                response = getattr(self.client, method)(url, data)
+                elapsed = time.perf_counter() - started
+
+            if response.status_code >= 400:
+                raise CommandError(f"{method.upper()} {url} respondeu {response.status_code}")
+            if run >= warmup:
+                timings.append(elapsed * 1000)
+            else:
+                queries.pop()
+
+        timings.sort()
+        return {
+            "min_ms": round(timings[0], 3),
+            "median_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+            "mean_ms": round(statistics.fmean(timings), 3),
+            "max_ms": round(timings[-1], 3),
+            "queries": statistics.median(queries),
+        }
+
+    def restore(self, stock: dict, last_movement: int) -> None:
+        """Desfaz as saídas do benchmark, devolvendo o estoque ao valor anterior."""
+
+        Movement.objects.filter(id__gt=last_movement, user__startswith=BENCH_NAME).delete()
+        ingredients = [Ingredient(id=pk, qte=qte) for pk, qte in stock.items()]
+        Ingredient.objects.bulk_update(ingredients, ["qte"], batch_size=500)
+        log_changes(Ingredient.objects.filter(id__in=stock))
+
+    def commit(self) -> str:
+        try:
+            result = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+        return result.stdout.strip()
+
+    def format_line(self, name: str, result: dict) -> str:
+        return (
+            f"{name:<20} mediana {result['median_ms']:>9.2f}ms  p95 {result['p95_ms']:>9.2f}ms  "
+            f"consultas {result['queries']:g}"
+        )
+
+    def compare(self, previous: dict, results: dict) -> None:
+        self.stdout.write(f"\nComparação com {previous.get('commit') or previous['created_at']} (mediana):")
+        for name, result in results.items():
+            before = previous["results"].get(name)
+            if not before:
+                continue
+            change = (result["median_ms"] - before["median_ms"]) / before["median_ms"] * 100
+            self.stdout.write(f"{name:<20} {before['median_ms']:>9.2f}ms -> {result['median_ms']:>9.2f}ms ({change:+.1f}%)")
@@ -0,0 +1,61 @@
+import time
+from contextvars import ContextVar
+
+from prometheus_client import Counter, Histogram
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (1_000, 5_000, 20_000, 50_000, 100_000, 500_000, 1_000_000)
+
+# Métodos HTTP com rótulo próprio; os demais viram "other" para não criar séries novas
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+# Requisições, agrupadas pelo nome da rota (url_name)
+REQUESTS = Counter("devspizza_http_requests_total", "Requisições atendidas.", ["view", "method", "status"])
+LATENCY = Histogram(
+    "devspizza_http_request_duration_seconds", "Tempo de resposta.", ["view"], buckets=LATENCY_BUCKETS
+)
+QUERIES = Histogram(
+    "devspizza_db_queries_per_request", "Consultas SQL por requisição.", ["view"], buckets=QUERY_BUCKETS
+)
+QUERY_TIME = Counter("devspizza_db_query_seconds_total", "Tempo total gasto em SQL.", ["view"])
+RESPONSE_SIZE = Histogram(
+    "devspizza_http_response_size_bytes", "Tamanho das respostas.", ["view"], buckets=SIZE_BUCKETS
+)
+
+# Negócio (movements.services)
+MOVEMENTS = Counter("devspizza_movements_total", "Movimentações registradas.", ["type"])
+STOCK_REJECTIONS = Counter("devspizza_stock_rejections_total", "Saídas recusadas por estoque insuficiente.")
+MOVEMENT_ROWS = Histogram(
+    "devspizza_movement_rows_written", "Linhas gravadas por movimentação.", ["type"], buckets=(1, 2, 5, 10, 20, 50, 100)
+)
+
+# Duração de cada consulta SQL da requisição atual, definida pelo MetricsMiddleware.
+# None fora de uma requisição (comandos, worker).
+request_queries: ContextVar[list | None] = ContextVar("request_queries", default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    queries = request_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        # As threads do get_dashboard recebem o contexto da requisição e gravam na mesma
+        # lista; append é atômico
+        queries.append(time.perf_counter() - started)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """Instala o count_query em cada conexão aberta (sinal connection_created).
+
+    Só os bancos realmente usados ganham o contador, sem abrir as conexões da réplica,
+    das lojas ou dos arquivos a cada requisição. Fica no início da lista para não ser
+    removido por um execute_wrapper ativo quando a conexão foi aberta.
+    """
+
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_query)
@@ -0,0 +1,126 @@
+import time
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+
+from stores.services import get_store
+
+from . import metrics, profiling
+from .routers import current_store, primary_writes
+
+
+class HTMLGZipMiddleware(GZipMiddleware):
+    """Compacta apenas respostas HTML maiores que settings.GZIP_MIN_LENGTH.
+
+    Arquivos estáticos já saem pré-compactados pelo WhiteNoise e PDFs não ganham
+    nada com uma segunda compactação.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or not response.get("Content-Type", "").startswith("text/html"):
+            return response
+        if len(response.content) < settings.GZIP_MIN_LENGTH:
+            return response
+        return super().process_response(request, response)
+
+
+class ReadYourWritesMiddleware:
+    """Registra na sessão o instante da última requisição que gravou no primário.
+
+    O ReplicaRouter só lê da réplica depois que ela alcança esse instante, então quem
+    acabou de registrar algo sempre vê o próprio registro. Requisições que só leem,
+    mesmo via POST (ex: relatório), não afetam a sessão.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = {"wrote": False}
+        token = primary_writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            primary_writes.reset(token)
+
+        if writes["wrote"] and hasattr(request, "session"):
+            request.session["db_last_write"] = time.time()
+        return response
+
+
+class MetricsMiddleware:
+    """Coleta latência, consultas SQL e tamanho da resposta de cada rota para o /metrics.
+
+    As consultas são contadas pelo metrics.count_query, instalado em cada conexão quando
+    ela é aberta, e incluem as feitas nas threads do get_dashboard.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = []
+        token = metrics.request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.request_queries.reset(token)
+        elapsed = time.perf_counter() - started
+
+        # Rótulos limitados às rotas e métodos conhecidos (o caminho nunca vira rótulo)
+        match = request.resolver_match
+        view = match.view_name if match else "<unresolved>"
+        method = request.method if request.method in metrics.METHODS else "other"
+
+        metrics.REQUESTS.labels(view, method, response.status_code).inc()
+        metrics.LATENCY.labels(view).observe(elapsed)
+        metrics.QUERIES.labels(view).observe(len(queries))
+        metrics.QUERY_TIME.labels(view).inc(sum(queries))
+        if not response.streaming:
+            metrics.RESPONSE_SIZE.labels(view).observe(len(response.content))
+
+        return response
+
+
+class ProfilingMiddleware:
+    """Perfila a requisição quando um administrador envia ?_profile ou X-Profile.
+
+    Sem a marcação o custo é só a verificação do cabeçalho e da query string. Os
+    perfis gravados ficam listados em /profiles.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if "_profile" not in request.GET and "X-Profile" not in request.headers:
+            return self.get_response(request)
+
+        user = request.user
+        if not user.is_authenticated or not (user.role == "admin" or user.is_staff):
+            return self.get_response(request)
+
+        return profiling.profile_request(request, self.get_response)
+
+
+class StoreMiddleware:
+    """Define a loja do usuário logado (current_store) durante a requisição.
+
+    Com ela o StoreRouter escolhe o banco da loja e os models de estoque e
+    movimentações filtram os registros da loja automaticamente.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        store_id = getattr(request.user, "store_id", None)
+        if store_id is None:
+            return self.get_response(request)
+
+        token = current_store.set(get_store(store_id))
+        try:
+            return self.get_response(request)
+        finally:
+            current_store.reset(token)
@@ -0,0 +1,138 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import ExitStack
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+# cProfile e tracemalloc são globais no processo, então só uma requisição é
+# perfilada por vez; as demais seguem sem perfil.
+_lock = threading.Lock()
+
+# Ligado durante uma requisição perfilada, para que o código que usa threads rode em
+# sequência (ex: get_dashboard)
+profiling_active: ContextVar[bool] = ContextVar("profiling_active", default=False)
+
+
+def profile_dir() -> Path:
+    path = Path(settings.PROFILE_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def profile_request(request, get_response):
+    """Executa a requisição sob cProfile e tracemalloc, registrando todo o SQL.
+
+    Grava em settings.PROFILE_DIR um relatório em texto (.txt), os dados brutos do
+    cProfile (.prof, para snakeviz/pstats) e um resumo (.json). O nome dos arquivos
+    volta no cabeçalho X-Profile-Id.
+    """
+
+    if not _lock.acquire(blocking=False):
+        return get_response(request)
+
+    queries = []
+
+    def capture_query(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            queries.append(
+                {
+                    "alias": context["connection"].alias,
+                    "sql": sql,
+                    "params": repr(params)[:300],
+                    "ms": round((time.perf_counter() - started) * 1000, 3),
+                }
+            )
+
+    profiler = cProfile.Profile()
+    token = profiling_active.set(True)
+    try:
+        tracemalloc.start()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(capture_query))
+            profiler.enable()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.disable()
+        elapsed = time.perf_counter() - started
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        profiling_active.reset(token)
+        _lock.release()
+
+    match = request.resolver_match
+    summary = {
+        "path": request.get_full_path(),
+        "method": request.method,
+        "view": match.view_name if match else "<unresolved>",
+        "user": request.user.get_username(),
+        "status": response.status_code,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "peak_memory_kb": round(peak / 1024, 1),
+        "queries": len(queries),
+        "query_ms": round(sum(query["ms"] for query in queries), 3),
+    }
+    name = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{summary['view'].replace(':', '-')}"
+    save_profile(name, summary, profiler, snapshot, queries)
+
+    response["X-Profile-Id"] = name
+    return response
+
+
+def save_profile(name: str, summary: dict, profiler, snapshot, queries: list) -> None:
+    path = profile_dir()
+
+    stats_output = io.StringIO()
+    pstats.Stats(profiler, stream=stats_output).sort_stats("cumulative").print_stats(settings.PROFILE_TOP)
+
+    lines = [f"{key}: {value}" for key, value in summary.items()]
+    lines += ["", f"== SQL ({len(queries)}) =="]
+    lines += [f"[{query['alias']}] {query['ms']:.3f}ms {query['sql']} {query['params']}" for query in queries]
+    lines += ["", "== Memória (maiores alocações) =="]
+    lines += [str(stat) for stat in snapshot.statistics("lineno")[: settings.PROFILE_TOP]]
+    lines += ["", "== cProfile (tempo acumulado) ==", stats_output.getvalue()]
+
+    profiler.dump_stats(path / f"{name}.prof")
+    (path / f"{name}.txt").write_text("\n".join(lines), encoding="utf-8")
+    (path / f"{name}.json").write_text(json.dumps({**summary, "sql": queries}), encoding="utf-8")
+
+    prune_profiles(path)
+
+
+def prune_profiles(path: Path) -> None:
+    """Mantém apenas os settings.PROFILE_KEEP perfis mais recentes."""
+
+    for summary in sorted(path.glob("*.json"), reverse=True)[settings.PROFILE_KEEP :]:
+        for suffix in (".json", ".txt", ".prof"):
+            summary.with_suffix(suffix).unlink(missing_ok=True)
+
+
+def list_profiles() -> list[dict]:
+    """Retorna os resumos dos perfis gravados, do mais recente ao mais antigo."""
+
+    profiles = []
+    for summary in sorted(profile_dir().glob("*.json"), reverse=True):
+        try:
+            data = json.loads(summary.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        data.pop("sql", None)
+        profiles.append({"name": summary.stem, **data})
+    return profiles
@@ -0,0 +1,143 @@
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+REPLICA = "replica"
+
+# Sessões e usuários são lidos antes da view e logo após o login, sempre do primário
+PRIMARY_ONLY_APPS = {"sessions", "auth", "contenttypes", "accounts"}
+
+# Apps cujos dados pertencem a uma loja e podem ficar no banco próprio dela
+SHARDED_APPS = {"stock", "movements"}
+
+# Loja do usuário logado, definida pelo StoreMiddleware. None mostra os dados de todas
+# as lojas (matriz, comandos de manutenção).
+current_store: ContextVar = ContextVar("current_store", default=None)
+
+# Instante da última escrita da sessão atual, definido pelo decorator use_replica.
+# None indica que a view não aceita ler da réplica.
+replica_reads: ContextVar[float | None] = ContextVar("replica_reads", default=None)
+
+# Marcado pelo ReplicaRouter quando a requisição atual grava no primário dados que a
+# réplica serve. Definido pelo ReadYourWritesMiddleware (None fora de uma requisição).
+primary_writes: ContextVar[dict | None] = ContextVar("primary_writes", default=None)
+
+_synced = {"value": None, "checked_at": 0.0}
+
+
+def synced_marker(name) -> Path:
+    """Arquivo onde o refresh_replica registra o instante da última cópia do SQLite."""
+
+    return Path(f"{name}.synced")
+
+
+def replica_synced_at() -> float | None:
+    """Retorna o instante (timestamp) até o qual a réplica tem os dados do primário.
+
+    O valor é consultado no máximo uma vez por segundo em cada processo.
+
+    Returns:
+        float: Timestamp da última sincronização.
+        None: Se não for possível determinar (réplica indisponível).
+    """
+
+    now = time.monotonic()
+    if now - _synced["checked_at"] < 1:
+        return _synced["value"]
+
+    replica = connections[REPLICA]
+    try:
+        if replica.vendor == "sqlite":
+            value = float(synced_marker(replica.settings_dict["NAME"]).read_text())
+        elif replica.vendor == "postgresql":
+            with replica.cursor() as cursor:
+                cursor.execute("SELECT EXTRACT(EPOCH FROM pg_last_xact_replay_timestamp())")
+                replayed = cursor.fetchone()[0]
+            # Fora de recuperação (não é standby) a réplica está sempre em dia
+            value = float(replayed) if replayed is not None else time.time()
+        else:
+            value = time.time()
+    except (OSError, ValueError, DatabaseError):
+        value = None
+
+    _synced.update(value=value, checked_at=now)
+    return value
+
+
+def replica_version() -> float | None:
+    """Retorna o instante de sincronização da réplica se a leitura atual for feita nela.
+
+    Usado para compor as chaves de cache, já que a réplica pode estar atrás das versões
+    das tabelas.
+    """
+
+    last_write = replica_reads.get()
+    if last_write is None or REPLICA not in settings.DATABASES:
+        return None
+
+    synced_at = replica_synced_at()
+    if synced_at is None or synced_at < last_write:
+        return None
+    if time.time() - synced_at > settings.DB_REPLICA_MAX_LAG:
+        return None
+    return synced_at
+
+
+class ReplicaRouter:
+    """Envia as leituras das views marcadas com use_replica para a réplica.
+
+    A réplica só é usada se estiver dentro do atraso tolerado (DB_REPLICA_MAX_LAG) e
+    se já contiver a última escrita feita pela sessão; do contrário a leitura vai para
+    o primário. Escritas, sessões, usuários e migrações usam sempre o primário.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return "default"
+        return REPLICA if replica_version() is not None else "default"
+
+    def db_for_write(self, model, **hints):
+        writes = primary_writes.get()
+        if writes is not None and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            writes["wrote"] = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+def store_db() -> str:
+    """Retorna o alias do banco com os dados da loja atual ("default" sem loja)."""
+
+    store = current_store.get()
+    return store.database if store is not None else "default"
+
+
+class StoreRouter:
+    """Envia estoque e movimentações da loja atual para o banco dela (Store.database).
+
+    Lojas no banco "default" dividem as tabelas e são separadas pelo campo store. As
+    demais tabelas (contas, lojas, sessões) ficam sempre no "default".
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in SHARDED_APPS and store_db() != "default":
+            return store_db()
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # A loja de um ingrediente ou movimentação pode estar em outro banco
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.STORE_DATABASES:
+            return app_label in SHARDED_APPS
+        return None
@@ -0,0 +1,129 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, F, Q, Sum
+from django.utils.timezone import localdate, make_aware, timedelta
+
+from movements.models import ArchivedMonth, Movement
+from stock.models import Ingredient, Product, StockLot
+
+from .profiling import profiling_active
+
+
+def _net(aggregate: dict, period: str):
+    return (aggregate[f"{period}_out"] or 0) - (aggregate[f"{period}_in"] or 0)
+
+
+def _movement_totals() -> dict:
+    """Calcula o faturamento do dia, da semana e do mês em uma única consulta."""
+
+    today = localdate()
+    starts = {
+        "daily": today,
+        "weekly": today - timedelta(days=today.weekday()),
+        "monthly": today.replace(day=1),
+    }
+    starts = {period: make_aware(datetime.combine(day, time.min)) for period, day in starts.items()}
+
+    sums = {}
+    for period, start in starts.items():
+        for kind in ("in", "out"):
+            sums[f"{period}_{kind}"] = Sum("value", filter=Q(type=kind, date__gte=start))
+
+    aggregate = Movement.objects.filter(date__gte=min(starts.values())).aggregate(**sums)
+    return {f"{period}_net": _net(aggregate, period) for period in starts}
+
+
+def _ingredient_totals() -> dict:
+    return Ingredient.objects.aggregate(
+        total_ingredients=Count("id"),
+        low_stock_count=Count("id", filter=Q(qte__lt=F("min_qte"))),
+    )
+
+
+def _counts() -> dict:
+    # Movimentações arquivadas contam pelos totais mensais (da loja, pelo StoreScopedManager)
+    archived = ArchivedMonth.objects.aggregate(total=Sum("movements"))["total"] or 0
+    return {
+        "total_movements": Movement.objects.count() + archived,
+        "total_products": Product.objects.count(),
+    }
+
+
+def _recent_movements() -> dict:
+    return {"recent_movements": list(Movement.objects.order_by("-date")[:5])}
+
+
+def _low_stock_alerts() -> dict:
+    return {"low_stock_alerts": list(Ingredient.objects.filter(qte__lt=F("min_qte")))}
+
+
+def _expiring_lots() -> dict:
+    # Marcados pelo comando flag_expiring_lots (e pela entrada, se já chegam perto da validade)
+    lots = StockLot.objects.filter(expiring=True, remaining__gt=0).select_related("ingredient")
+    return {"expiring_lots": list(lots.order_by("expires_on"))}
+
+
+DASHBOARD_QUERIES = (
+    _counts,
+    _movement_totals,
+    _ingredient_totals,
+    _recent_movements,
+    _low_stock_alerts,
+    _expiring_lots,
+)
+
+# Threads fixas do processo, uma por consulta. O event loop criado pelo async_to_sync
+# a cada requisição teria um executor próprio, com threads e conexões novas a cada vez.
+_executor = ThreadPoolExecutor(max_workers=len(DASHBOARD_QUERIES), thread_name_prefix="dashboard")
+
+
+def _run_query(query) -> dict:
+    """Executa a consulta em uma thread do pool, reciclando a conexão ao final.
+
+    A thread não passa pelos sinais de início e fim de requisição, então a conexão é
+    fechada aqui se passou do CONN_MAX_AGE ou ficou inutilizável. As threads são fixas,
+    então o processo mantém no máximo uma conexão aberta por thread.
+    """
+
+    try:
+        return query()
+    finally:
+        close_old_connections()
+
+
+async def get_dashboard() -> dict:
+    """Reúne os indicadores da página inicial.
+
+    As consultas são independentes entre si e rodam ao mesmo tempo, cada uma em uma
+    thread com sua própria conexão, então a latência total se aproxima da consulta mais
+    lenta. Com settings.DASHBOARD_CONCURRENT desligado elas rodam em sequência na
+    thread atual (útil em testes, onde a transação não é visível para outras conexões,
+    e em requisições perfiladas, já que cProfile e a captura de SQL só veem a thread da
+    requisição).
+
+    Returns:
+        dict: Contexto do template home.html.
+    """
+
+    if settings.DASHBOARD_CONCURRENT and not profiling_active.get():
+        loop = asyncio.get_running_loop()
+        # Cada consulta roda com o contexto da requisição (loja atual, leitura da réplica)
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(_executor, contextvars.copy_context().run, _run_query, query)
+                for query in DASHBOARD_QUERIES
+            )
+        )
+    else:
+        results = [await sync_to_async(query)() for query in DASHBOARD_QUERIES]
+
+    context = {}
+    for result in results:
+        context.update(result)
+    return context
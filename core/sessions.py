@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+
+class SessionStore(CachedDBStore):
+    """Sessão lida do cache com gravação no banco adiada (write-behind).
+
+    Cada alteração vai direto para o cache, mas o banco só é atualizado quando a
+    sessão é criada ou quando a última gravação tem mais de
+    settings.SESSION_DB_WRITE_INTERVAL segundos. Se o cache for perdido, no máximo esse
+    intervalo de alterações volta ao estado gravado no banco.
+    """
+
+    @property
+    def persisted_key(self):
+        return f"{self.cache_key}:persisted"
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+
+        interval = settings.SESSION_DB_WRITE_INTERVAL
+        persisted_at = None if must_create or not interval else self._cache.get(self.persisted_key)
+
+        if persisted_at is None or time.time() - persisted_at >= interval:
+            super().save(must_create)
+            self._cache.set(self.persisted_key, time.time(), self.get_expiry_age())
+            return
+
+        self._cache.set(self.cache_key, self._session, self.get_expiry_age())
+
+    def delete(self, session_key=None):
+        if session_key is None and self.session_key is not None:
+            self._cache.delete(self.persisted_key)
+        super().delete(session_key)
@@ -14,6 +14,7 @@ from pathlib import Path
 
 from decouple import Csv, config
 from django.contrib.messages import constants
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -30,6 +31,14 @@ DEBUG = config("DEBUG", cast=bool, default=False)
 
 ALLOWED_HOSTS = config("ALLOWED_HOSTS", cast=Csv())
 
+# Perfil do ambiente. "development" instala o recarregamento automático do navegador e o
+# visualizador do esquema do banco; "production" remove esses apps, o middleware e as
+# rotas deles e mantém os templates compilados em memória.
+ENVIRONMENT = config("ENVIRONMENT", default="development")
+if ENVIRONMENT not in ("development", "production"):
+    raise ImproperlyConfigured(f"ENVIRONMENT inválido: {ENVIRONMENT} (use development ou production)")
+PRODUCTION = ENVIRONMENT == "production"
+
 
 # Application definition
 
@@ -39,25 +48,35 @@ INSTALLED_APPS = [
     "django.contrib.contenttypes",
     "django.contrib.sessions",
     "django.contrib.messages",
-    "django.contrib.staticfiles",
-    "schema_viewer",
+    "core.apps.StaticFilesConfig",
+    "core",
     "accounts",
     "movements",
     "stock",
-    "django_browser_reload",
+    "stores",
+    "jobs",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "core.middleware.MetricsMiddleware",
+    "core.middleware.HTMLGZipMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middleware.StoreMiddleware",
+    "core.middleware.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "django_browser_reload.middleware.BrowserReloadMiddleware",
 ]
 
+# Apps de desenvolvimento: o BrowserReloadMiddleware processa toda resposta HTML
+if not PRODUCTION:
+    INSTALLED_APPS += ["schema_viewer", "django_browser_reload"]
+    MIDDLEWARE += ["django_browser_reload.middleware.BrowserReloadMiddleware"]
+
 ROOT_URLCONF = "core.urls"
 
 TEMPLATES = [
@@ -70,25 +89,156 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "accounts.context_processors.sudo",
             ],
         },
     },
 ]
 
+# Em produção os templates são lidos e compilados uma única vez por worker. Em
+# desenvolvimento o Django já usa o cache, mas o limpa quando um template é alterado.
+if PRODUCTION:
+    TEMPLATES[0]["APP_DIRS"] = False
+    TEMPLATES[0]["OPTIONS"]["loaders"] = [
+        (
+            "django.template.loaders.cached.Loader",
+            [
+                "django.template.loaders.filesystem.Loader",
+                "django.template.loaders.app_directories.Loader",
+            ],
+        ),
+    ]
+
 WSGI_APPLICATION = "core.wsgi.application"
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+DB_ENGINE = config("DB_ENGINE")
+
+if DB_ENGINE == "django.db.backends.sqlite3":
+    DATABASES = {
+        "default": {
+            "ENGINE": DB_ENGINE,
+            "NAME": BASE_DIR / config("DB_NAME", default="db.sqlite3"),
+        }
+    }
+
+    # Perfil para vários terminais gravando ao mesmo tempo: WAL deixa leituras e
+    # escrita concorrerem, o timeout faz a conexão esperar pelo lock em vez de falhar e
+    # BEGIN IMMEDIATE pega o lock de escrita no início da transação (um lock adquirido
+    # no meio de uma transação DEFERRED falha sem respeitar o timeout).
+    if config("SQLITE_TUNING", cast=bool, default=True):
+        DATABASES["default"]["OPTIONS"] = {
+            "timeout": config("SQLITE_BUSY_TIMEOUT", cast=int, default=20),
+            "transaction_mode": "IMMEDIATE",
+            "init_command": ";".join(
+                [
+                    "PRAGMA journal_mode=WAL",
+                    f"PRAGMA synchronous={config('SQLITE_SYNCHRONOUS', default='NORMAL')}",
+                    f"PRAGMA cache_size=-{config('SQLITE_CACHE_SIZE_KB', cast=int, default=20000)}",
+                    f"PRAGMA mmap_size={config('SQLITE_MMAP_SIZE', cast=int, default=134217728)}",
+                ]
+            ),
+        }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": DB_ENGINE,
+            "NAME": config("DB_NAME", default="devspizza"),
+            "USER": config("DB_USER", default=""),
+            "PASSWORD": config("DB_PASSWORD", default=""),
+            "HOST": config("DB_HOST", default="localhost"),
+            "PORT": config("DB_PORT", default=""),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+            "TEST": {"NAME": config("DB_TEST_NAME", default=None)},
+        }
+    }
+
+    # Com o pool (psycopg_pool) as conexões são reaproveitadas entre requisições e o
+    # Django exige CONN_MAX_AGE = 0. Sem pool, DB_CONN_MAX_AGE mantém a conexão aberta
+    # por worker durante o tempo informado (segundos).
+    DB_POOL_MAX_SIZE = config("DB_POOL_MAX_SIZE", cast=int, default=0)
+
+    if DB_POOL_MAX_SIZE and DB_ENGINE == "django.db.backends.postgresql":
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": config("DB_POOL_MIN_SIZE", cast=int, default=2),
+            "max_size": DB_POOL_MAX_SIZE,
+            "timeout": config("DB_POOL_TIMEOUT", cast=int, default=10),
+        }
+    else:
+        DATABASES["default"]["CONN_MAX_AGE"] = config("DB_CONN_MAX_AGE", cast=int, default=60)
+
+# Lojas com banco próprio: cada alias listado em STORE_DATABASES vira um banco com as
+# tabelas de estoque e movimentações (SQLite: store-<alias>.sqlite3, demais bancos:
+# <DB_NAME>_<alias> no mesmo servidor). A loja aponta para o alias em Store.database;
+# lojas sem banco próprio ficam no "default", separadas pelo campo store.
+STORE_DATABASES = config("STORE_DATABASES", cast=Csv(), default="")
+
+for alias in STORE_DATABASES:
+    DATABASES[alias] = {**DATABASES["default"], "TEST": {"DEPENDENCIES": []}}
+    if DB_ENGINE == "django.db.backends.sqlite3":
+        DATABASES[alias]["NAME"] = BASE_DIR / f"store-{alias}.sqlite3"
+    else:
+        DATABASES[alias]["NAME"] = f"{DATABASES['default']['NAME']}_{alias}"
+
+DATABASE_ROUTERS = ["core.routers.StoreRouter"]
+
+# Réplica de leitura para relatórios e painéis (views marcadas com use_replica). No
+# SQLite é uma cópia do arquivo atualizada pelo comando refresh_replica, nos demais
+# bancos um servidor em replicação. Acima de DB_REPLICA_MAX_LAG segundos de atraso as
+# leituras voltam para o primário.
+DB_REPLICA_NAME = config("DB_REPLICA_NAME", default="")
+DB_REPLICA_HOST = config("DB_REPLICA_HOST", default="")
+DB_REPLICA_MAX_LAG = config("DB_REPLICA_MAX_LAG", cast=int, default=300)
+
+if DB_REPLICA_NAME or DB_REPLICA_HOST:
+    DATABASES["replica"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+    if DB_ENGINE == "django.db.backends.sqlite3":
+        DATABASES["replica"]["NAME"] = BASE_DIR / DB_REPLICA_NAME
+    else:
+        DATABASES["replica"]["HOST"] = DB_REPLICA_HOST
+        DATABASES["replica"]["PORT"] = config("DB_REPLICA_PORT", default=DATABASES["default"]["PORT"])
+
+    DATABASE_ROUTERS.append("core.routers.ReplicaRouter")
+    MIDDLEWARE.append("core.middleware.ReadYourWritesMiddleware")
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Guarda as versões das tabelas (ETag) e os fragmentos de templates. O padrão é um
+# diretório compartilhado por todos os workers: com um cache por processo (LocMemCache)
+# uma escrita atendida por um worker não invalidaria as versões dos demais.
+
+CACHES = {
     "default": {
-        "ENGINE": config("DB_ENGINE"),
-        "NAME": BASE_DIR / config("DB_NAME", default="db.sqlite3"),
+        "BACKEND": config("CACHE_BACKEND", default="django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": config("CACHE_LOCATION", default=str(BASE_DIR / "cache")),
+        "OPTIONS": {"MAX_ENTRIES": config("CACHE_MAX_ENTRIES", cast=int, default=10_000)},
     }
 }
 
 
+# Password hashing
+# https://docs.djangoproject.com/en/5.2/topics/auth/passwords/
+# PASSWORD_HASH_ITERATIONS ajusta o custo do PBKDF2 (vazio usa o padrão do Django).
+# Depois de uma confirmação de senha as ações destrutivas ficam liberadas por
+# SUDO_WINDOW segundos sem recalcular o hash.
+
+PASSWORD_HASHERS = [
+    "accounts.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+PASSWORD_HASH_ITERATIONS = config("PASSWORD_HASH_ITERATIONS", cast=int, default=0)
+SUDO_WINDOW = config("SUDO_WINDOW", cast=int, default=300)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -125,6 +275,27 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+# Em produção (ENVIRONMENT=production) o collectstatic gera arquivos com hash no nome e
+# versões .gz/.br, servidos pelo WhiteNoise com cache imutável; fora dela o {% static %}
+# funciona sem o manifesto do collectstatic, mesmo com DEBUG=False
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": (
+            "whitenoise.storage.CompressedManifestStaticFilesStorage"
+            if PRODUCTION
+            else "django.contrib.staticfiles.storage.StaticFilesStorage"
+        ),
+    },
+}
+
+# Tamanho mínimo (bytes) para compactar respostas HTML
+GZIP_MIN_LENGTH = config("GZIP_MIN_LENGTH", cast=int, default=1024)
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -133,6 +304,25 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "accounts.CustomUser"
 
+# O usuário da sessão fica em cache e é invalidado quando a conta é alterada
+AUTHENTICATION_BACKENDS = ["accounts.backends.CachedModelBackend"]
+USER_CACHE_TIMEOUT = config("USER_CACHE_TIMEOUT", cast=int, default=300)
+
+# Sessões lidas do cache, gravadas no banco no máximo a cada SESSION_DB_WRITE_INTERVAL
+# segundos (0 grava a cada alteração)
+SESSION_ENGINE = "core.sessions"
+SESSION_DB_WRITE_INTERVAL = config("SESSION_DB_WRITE_INTERVAL", cast=int, default=60)
+
+# Com um cache por processo (LocMemCache) e mais de um worker, o logout, a exclusão de
+# uma conta ou a troca de cargo não chegariam à sessão e ao usuário guardados nos
+# outros workers: nesse caso sessões e usuários são lidos sempre do banco
+if CACHES["default"]["BACKEND"].endswith("LocMemCache") and config("WEB_CONCURRENCY", cast=int, default=2) > 1:
+    AUTHENTICATION_BACKENDS = ["django.contrib.auth.backends.ModelBackend"]
+    SESSION_ENGINE = "django.contrib.sessions.backends.db"
+
+# Mensagens em cookie, sem gravar na sessão
+MESSAGE_STORAGE = "django.contrib.messages.storage.cookie.CookieStorage"
+
 LOGIN_URL = "login"
 
 LOGIN_REDIRECT_URL = "home"
@@ -142,3 +332,70 @@ MESSAGE_TAGS = {
     constants.WARNING: "yellow",
     constants.SUCCESS: "green",
 }
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "root": {"handlers": ["console"], "level": config("LOG_LEVEL", default="WARNING")},
+}
+
+# Token exigido pelo /metrics (Authorization: Bearer <token>). Vazio, apenas
+# administradores logados acessam
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+# Perfis sob demanda (?_profile=1 ou cabeçalho X-Profile, só administradores):
+# diretório dos arquivos, quantos manter e quantas linhas de cada seção
+PROFILE_DIR = BASE_DIR / config("PROFILE_DIR", default="profiles")
+PROFILE_KEEP = config("PROFILE_KEEP", cast=int, default=50)
+PROFILE_TOP = config("PROFILE_TOP", cast=int, default=40)
+
+# Movimentações de meses fechados há mais de ARCHIVE_AFTER_MONTHS meses são movidas
+# pelo comando archive_movements para um arquivo SQLite por mês em ARCHIVE_DIR
+ARCHIVE_DIR = BASE_DIR / config("ARCHIVE_DIR", default="archive")
+ARCHIVE_AFTER_MONTHS = config("ARCHIVE_AFTER_MONTHS", cast=int, default=12)
+
+# Relatórios diários, semanais e mensais pré-gerados pelo comando generate_reports depois
+# que o período fecha
+REPORT_DIR = BASE_DIR / config("REPORT_DIR", default="reports")
+
+# Fila de tarefas em segundo plano (comando run_worker): tarefas ao mesmo tempo, intervalo
+# de leitura da fila, tentativas por tarefa, espera antes da primeira nova tentativa (dobra
+# a cada falha) e tempo (segundos) após o qual uma tarefa em execução volta para a fila
+JOB_WORKERS = config("JOB_WORKERS", cast=int, default=4)
+JOB_POLL_INTERVAL = config("JOB_POLL_INTERVAL", cast=float, default=2.0)
+JOB_MAX_ATTEMPTS = config("JOB_MAX_ATTEMPTS", cast=int, default=3)
+JOB_BACKOFF = config("JOB_BACKOFF", cast=int, default=30)
+JOB_TIMEOUT = config("JOB_TIMEOUT", cast=int, default=3600)
+
+# Comandos executados periodicamente pelo run_worker (comando e argumentos -> expressão
+# cron de 5 campos, no fuso TIME_ZONE)
+JOB_SCHEDULES = {
+    "generate_reports": "10 0 * * *",
+    "flag_expiring_lots": "0 3 * * *",
+    "compact_catalog_changes": "30 3 * * *",
+}
+
+# Máximo de alterações do catálogo devolvidas por requisição do /stock/sync
+SYNC_PAGE_SIZE = config("SYNC_PAGE_SIZE", cast=int, default=1000)
+
+# Ordem de consumo dos lotes nas saídas: "fefo" (vence primeiro) ou "fifo" (chegou primeiro).
+# O comando flag_expiring_lots marca os lotes que vencem em até LOT_EXPIRY_DAYS dias.
+LOT_CONSUMPTION = config("LOT_CONSUMPTION", default="fefo")
+LOT_EXPIRY_DAYS = config("LOT_EXPIRY_DAYS", cast=int, default=3)
+
+# Servidor da aplicação (gunicorn.conf.py): wsgi ou asgi. Os eventos ao vivo só são
+# gravados com SERVER=asgi; em WSGI o /events responde 204 e ninguém os leria
+SERVER = config("SERVER", default="wsgi")
+
+# Atualizações ao vivo (/events, Server-Sent Events, apenas com SERVER=asgi): intervalo
+# de leitura dos eventos, comentário para manter a conexão aberta, espera do navegador
+# antes de reconectar, eventos pendentes por cliente e eventos mantidos no banco
+LIVE_POLL_INTERVAL = config("LIVE_POLL_INTERVAL", cast=float, default=1.0)
+LIVE_HEARTBEAT = config("LIVE_HEARTBEAT", cast=float, default=15.0)
+LIVE_RETRY_MS = config("LIVE_RETRY_MS", cast=int, default=3000)
+LIVE_QUEUE_SIZE = config("LIVE_QUEUE_SIZE", cast=int, default=100)
+LIVE_EVENT_KEEP = config("LIVE_EVENT_KEEP", cast=int, default=1000)
+
+# Executa as consultas da página inicial em paralelo (uma conexão por consulta)
+DASHBOARD_CONCURRENT = config("DASHBOARD_CONCURRENT", cast=bool, default=True)
@@ -0,0 +1,322 @@
+import asyncio
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+from accounts.tests import create_user
+from movements.services import create_outflow
+from movements.tests import outflow_data
+from stock.models import Category, Ingredient, Product, ProductIngredient
+from stores.models import Store, StoreEvent
+from stores.services import using_store
+
+from .live import publish, stream
+from .routers import REPLICA, ReplicaRouter, replica_reads
+
+
+class ConditionalViewTests(TestCase):
+    """Respostas 304 e fragmentos cacheados pela versão dos dados (conditional_view)."""
+
+    def setUp(self):
+        self.user = create_user("admin")
+        self.client.force_login(self.user)
+        self.cheese = Ingredient.objects.create(name="Queijo", measure="kg", qte=Decimal("10"), min_qte=0)
+        self.url = reverse("ingredient_list")
+
+    def test_matching_etag_is_not_modified(self):
+        response = self.client.get(self.url)
+
+        cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        self.assertIn("no-cache", cached["Cache-Control"])
+
+    def test_if_modified_since(self):
+        response = self.client.get(self.url)
+
+        cached = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_ingredient_update_changes_etag_and_fragments(self):
+        response = self.client.get(self.url)
+
+        # A versão muda no on_commit, que o TestCase não executa sozinho
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cheese.name = "Mussarela"
+            self.cheese.save()
+
+        updated = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(updated.status_code, 200)
+        self.assertNotEqual(updated["ETag"], response["ETag"])
+        self.assertContains(updated, "Mussarela")
+
+    def test_movement_changes_etag(self):
+        pizza = Product.objects.create(name="Pizza", price=Decimal("40.00"))
+        ProductIngredient.objects.create(product=pizza, ingredient=self.cheese, quantity=Decimal("0.300"))
+        url = reverse("movement_list")
+        response = self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_outflow(outflow_data({pizza: "1"}), "caixa")
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+    def test_etag_differs_per_user(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        self.client.force_login(create_user("gerente"))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_stores_do_not_share_etags_or_fragments(self):
+        centro = Store.objects.create(name="Centro", code="centro")
+        sul = Store.objects.create(name="Sul", code="sul")
+        with using_store(centro):
+            Ingredient.objects.create(name="Calabresa", measure="kg", qte=Decimal("5"), min_qte=0)
+
+        self.client.force_login(create_user("centro", store=centro))
+        response = self.client.get(self.url)
+        self.assertContains(response, "Calabresa")
+
+        # Mesmo papel e mesma URL: só a loja separa os fragmentos em cache
+        self.client.force_login(create_user("sul", store=sul))
+        other = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(other.status_code, 200)
+        self.assertNotContains(other, "Calabresa")
+        self.assertNotEqual(other.wsgi_request.data_version, response.wsgi_request.data_version)
+
+
+class MetricsTests(TestCase):
+    """Acesso ao /metrics e rótulos das métricas do MetricsMiddleware."""
+
+    def sample(self, name: str, **labels) -> float:
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_restricted_to_admins_without_token(self):
+        with self.assertLogs("django.request", "WARNING"):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 401)
+
+            self.client.force_login(create_user("caixa", role="employee"))
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 401)
+
+        self.client.force_login(create_user("admin"))
+        self.assertContains(self.client.get(reverse("metrics")), "devspizza_http_requests_total")
+
+    @override_settings(METRICS_TOKEN="segredo")
+    def test_token_replaces_login(self):
+        self.client.force_login(create_user("admin"))
+        with self.assertLogs("django.request", "WARNING"):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 401)
+
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer segredo")
+        self.assertEqual(response.status_code, 200)
+
+    def test_labels_do_not_grow_with_paths_or_methods(self):
+        before = self.sample("devspizza_http_requests_total", view="<unresolved>", method="other", status="404")
+
+        with self.assertLogs("django.request", "WARNING"):
+            for path in ("/nao-existe/1", "/nao-existe/2"):
+                self.client.get(path)
+                self.client.generic("PROPFIND", path)
+
+        labels = {
+            tuple(sample.labels.values())
+            for family in REGISTRY.collect()
+            if family.name.startswith("devspizza_http")
+            for sample in family.samples
+        }
+        self.assertFalse([values for values in labels if any("nao-existe" in value for value in values)])
+        self.assertNotIn("PROPFIND", {value for values in labels for value in values})
+        self.assertEqual(
+            self.sample("devspizza_http_requests_total", view="<unresolved>", method="other", status="404"), before + 2
+        )
+
+    def test_counts_queries_without_opening_other_databases(self):
+        # Um banco configurado mas não usado na requisição (como os arquivos mensais)
+        connections.settings["unused"] = {**connections["default"].settings_dict, "NAME": "/nao-existe/unused.sqlite3"}
+        self.addCleanup(connections.settings.pop, "unused")
+        self.client.force_login(create_user("admin"))
+        before = self.sample("devspizza_db_queries_per_request_sum", view="ingredient_list")
+
+        self.client.get(reverse("ingredient_list"))
+
+        self.assertGreater(self.sample("devspizza_db_queries_per_request_sum", view="ingredient_list"), before)
+        self.assertNotIn("unused", [connection.alias for connection in connections.all(initialized_only=True)])
+
+
+@override_settings(PROFILE_DIR=Path(tempfile.mkdtemp()))
+class ProfilingTests(TestCase):
+    """ProfilingMiddleware: desligado por padrão, só para administradores que pedem o perfil."""
+
+    def setUp(self):
+        self.url = reverse("ingredient_list")
+
+    def get(self, *args, **kwargs):
+        with mock.patch(
+            "core.middleware.profiling.profile_request", side_effect=lambda request, get_response: get_response(request)
+        ) as profile_request:
+            self.client.get(*args, **kwargs)
+        return profile_request.called
+
+    def test_off_without_parameter_or_header(self):
+        self.client.force_login(create_user("admin"))
+
+        self.assertFalse(self.get(self.url))
+
+    def test_only_admins_and_staff(self):
+        self.assertFalse(self.get(self.url, {"_profile": "1"}))
+
+        employee = create_user("caixa", role="employee")
+        self.client.force_login(employee)
+        self.assertFalse(self.get(self.url, {"_profile": "1"}))
+
+        employee.is_staff = True
+        employee.save()
+        self.assertTrue(self.get(self.url, {"_profile": "1"}))
+
+    def test_parameter_or_header_records_profile(self):
+        self.client.force_login(create_user("admin"))
+        self.assertTrue(self.get(self.url, HTTP_X_PROFILE="1"))
+
+        response = self.client.get(self.url, {"_profile": "1"})
+        name = response["X-Profile-Id"]
+        for suffix in (".txt", ".json", ".prof"):
+            self.assertTrue((settings.PROFILE_DIR / f"{name}{suffix}").exists())
+        self.assertNotIn("X-Profile-Id", self.client.get(self.url))
+
+
+class LiveEventsTests(TransactionTestCase):
+    """Eventos ao vivo (/events): o stream lê os eventos em outra thread, fora da transação do TestCase."""
+
+    def setUp(self):
+        self.centro = Store.objects.create(name="Centro", code="centro")
+        self.sul = Store.objects.create(name="Sul", code="sul", database="sul")
+
+    def publish_events(self) -> list[int]:
+        with override_settings(SERVER="asgi"):
+            for store in (self.centro, self.sul, self.centro, None):
+                publish(store and store.id, {"type": "movement"})
+        return list(StoreEvent.objects.order_by("id").values_list("id", flat=True))
+
+    def read(self, store_id: int | None, last_event_id: int | None, count: int) -> list[str]:
+        async def read():
+            messages = stream(store_id, last_event_id)
+            try:
+                return [await anext(messages) for _ in range(count)]
+            finally:
+                await messages.aclose()
+
+        return asyncio.run(read())
+
+    def test_publish_only_with_asgi(self):
+        publish(self.centro.id, {"type": "movement"})
+        self.assertFalse(StoreEvent.objects.exists())
+
+        with override_settings(SERVER="asgi"):
+            publish(self.centro.id, {"type": "movement"})
+        self.assertEqual(StoreEvent.objects.get().store, self.centro)
+
+    def test_wsgi_responds_no_content(self):
+        self.client.force_login(create_user("admin"))
+
+        self.assertEqual(self.client.get(reverse("live_events")).status_code, 204)
+
+    def test_replays_own_store_after_last_event_id(self):
+        ids = self.publish_events()
+
+        retry, event = self.read(self.centro.id, ids[0], 2)
+
+        self.assertEqual(retry, f"retry: {settings.LIVE_RETRY_MS}\n\n")
+        self.assertTrue(event.startswith(f"id: {ids[2]}\nevent: movement\n"))
+
+    def test_hq_receives_default_database_events(self):
+        ids = self.publish_events()
+
+        events = self.read(None, 0, 4)[1:]
+
+        # O evento da loja em outro banco fica de fora
+        self.assertEqual([event.split("\n")[0] for event in events], [f"id: {id}" for id in (ids[0], ids[2], ids[3])])
+
+
+# Como em settings.py quando DB_REPLICA_NAME ou DB_REPLICA_HOST está definido
+@override_settings(
+    DATABASE_ROUTERS=[*settings.DATABASE_ROUTERS, "core.routers.ReplicaRouter"],
+    MIDDLEWARE=[*settings.MIDDLEWARE, "core.middleware.ReadYourWritesMiddleware"],
+)
+class ReplicaTests(TransactionTestCase):
+    """Leituras na réplica, com uma segunda conexão espelhando o banco de teste (TEST MIRROR)."""
+
+    @classmethod
+    def setUpClass(cls):
+        # A réplica só é configurada com DB_REPLICA_NAME/HOST, então é registrada aqui
+        # apontando para o banco de teste, como o MIRROR faria
+        connections.settings[REPLICA] = {**connections["default"].settings_dict, "TEST": {"MIRROR": "default"}}
+        cls.addClassCleanup(connections.settings.pop, REPLICA)
+        cls.addClassCleanup(connections.close_all)
+        cls.databases = {"default", REPLICA}
+        super().setUpClass()
+
+    def setUp(self):
+        self.user = create_user("admin")
+        self.client.force_login(self.user)
+        self.url = reverse("movement_list")
+
+    def synced(self, seconds_ago: float):
+        return mock.patch("core.routers.replica_synced_at", return_value=time.time() - seconds_ago)
+
+    def route(self) -> str:
+        token = replica_reads.set(time.time() - 60)
+        try:
+            return ReplicaRouter().db_for_read(Ingredient)
+        finally:
+            replica_reads.reset(token)
+
+    def test_reads_replica_within_lag(self):
+        with self.synced(10):
+            self.assertEqual(self.route(), REPLICA)
+            # Sessões e usuários nunca
+            self.assertEqual(ReplicaRouter().db_for_read(type(self.user)), "default")
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        with self.synced(settings.DB_REPLICA_MAX_LAG + 10):
+            self.assertEqual(self.route(), "default")
+
+    def test_unavailable_replica_falls_back_to_primary(self):
+        with mock.patch("core.routers.replica_synced_at", return_value=None):
+            self.assertEqual(self.route(), "default")
+
+    def test_views_without_use_replica_read_primary(self):
+        with self.synced(0):
+            self.assertEqual(ReplicaRouter().db_for_read(Ingredient), "default")
+
+    def test_post_pins_session_to_primary(self):
+        with self.synced(30), CaptureQueriesContext(connections[REPLICA]) as replica:
+            self.client.get(self.url)
+        self.assertTrue(replica.captured_queries)
+
+        self.client.post(reverse("category_create"), {"name": "Queijos", "description": ""})
+        self.assertTrue(Category.objects.filter(name="Queijos").exists())
+        self.assertIn("db_last_write", self.client.session)
+
+        # A réplica ainda não tem a escrita: a sessão lê do primário até ela alcançar
+        with self.synced(30), CaptureQueriesContext(connections[REPLICA]) as replica:
+            self.client.get(self.url)
+        self.assertFalse(replica.captured_queries)
+
+        with self.synced(0), CaptureQueriesContext(connections[REPLICA]) as replica:
+            self.client.get(self.url)
+        self.assertTrue(replica.captured_queries)
+
+    def test_read_only_post_does_not_pin(self):
+        self.client.post(reverse("report"), {"start_date": "2025-01-01", "end_date": "2025-01-31"})
+
+        self.assertNotIn("db_last_write", self.client.session)
@@ -11,21 +11,32 @@ Class-based views
     1. Add an import:  from other_app.views import Home
     2. Add a URL to urlpatterns:  path('', Home.as_view(), name='home')
 Including another URLconf
-    1. Import the include() function: from django.urls import include, path
+    1. Import the include() function: from django.urls import include, path, re_path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from django.conf import settings
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 
-from .views import home
+from .views import home, live_events, metrics, profile_download, profile_list
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("schema-viewer/", include("schema_viewer.urls")),
     path("", home, name="home"),
+    path("events", live_events, name="live_events"),
+    path("metrics", metrics, name="metrics"),
+    path("profiles/", profile_list, name="profile_list"),
+    re_path(r"^profiles/(?P<name>[\w-]+)\.(?P<kind>txt|json|prof)$", profile_download, name="profile_download"),
     path("accounts/", include("accounts.urls"), name="accounts"),
     path("movements/", include("movements.urls"), name="movements"),
     path("stock/", include("stock.urls"), name="stock"),
-    path("__reload__/", include("django_browser_reload.urls")),
+    path("stores/", include("stores.urls"), name="stores"),
 ]
+
+# Rotas dos apps de desenvolvimento, ausentes com ENVIRONMENT=production
+if not settings.PRODUCTION:
+    urlpatterns += [
+        path("schema-viewer/", include("schema_viewer.urls")),
+        path("__reload__/", include("django_browser_reload.urls")),
+    ]
@@ -0,0 +1,72 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .routers import store_db
+
+
+def _key(label: str) -> str:
+    return f"version:{label}"
+
+
+def get_versions(*labels: str) -> dict[str, int]:
+    """Retorna a versão atual de cada grupo de tabelas.
+
+    A versão é o instante (em nanosegundos) da última alteração registrada. Grupos sem
+    versão em cache (primeira consulta, reinício ou expiração) recebem o instante atual,
+    o que no pior caso força uma nova renderização, nunca uma resposta desatualizada.
+
+    Args:
+        labels (str): Nomes dos grupos (normalmente o app_label do app).
+
+    Returns:
+        dict: Versão de cada grupo.
+    """
+
+    keys = {_key(label): label for label in labels}
+    found = cache.get_many(keys)
+
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+
+    return {keys[key]: version for key, version in found.items()}
+
+
+def bump_version(*labels: str, using: str | None = None) -> None:
+    """Gera uma nova versão para os grupos após o commit da transação atual.
+
+    Args:
+        labels (str): Nomes dos grupos alterados.
+        using (str): Banco da transação (padrão: o banco da loja atual).
+    """
+
+    def bump():
+        version = time.time_ns()
+        cache.set_many({_key(label): version for label in labels}, None)
+
+    # Fora de um bloco atômico o on_commit executa imediatamente
+    transaction.on_commit(bump, using=using or store_db())
+
+
+def track(label: str, *models) -> None:
+    """Conecta os sinais de gravação e exclusão dos models ao grupo informado.
+
+    Alterações em massa (bulk_update, update) não disparam sinais e precisam chamar
+    bump_version explicitamente.
+
+    Args:
+        label (str): Nome do grupo.
+        models (Model): Models cujas alterações invalidam o grupo.
+    """
+
+    def receiver(sender, using, **kwargs):
+        bump_version(label, using=using)
+
+    for model in models:
+        uid = f"version:{label}:{model._meta.label}"
+        post_save.connect(receiver, sender=model, weak=False, dispatch_uid=uid)
+        post_delete.connect(receiver, sender=model, weak=False, dispatch_uid=uid + ":delete")
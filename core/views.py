@@ -1,37 +1,90 @@
+import os
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.db.models import F, Sum
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
-from django.utils.timezone import now, timedelta
+from django.views.decorators.http import require_http_methods
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+
+from core.decorators import admin_required, conditional_view, use_replica
 
-from movements.models import Movement
-from stock.models import Category, Ingredient, Product
+from .live import stream
+from .profiling import list_profiles, profile_dir
+from .services import get_dashboard
 
 
 @login_required
+@use_replica
+@conditional_view("movements", "stock")
 def home(request):
-    today = now().date()
-    week_start = today - timedelta(days=today.weekday())
-    month_start = today.replace(day=1)
-
-    def get_net(start_date):
-        entradas = (
-            Movement.objects.filter(date__date__gte=start_date, type="in").aggregate(Sum("value"))["value__sum"] or 0
-        )
-        saidas = (
-            Movement.objects.filter(date__date__gte=start_date, type="out").aggregate(Sum("value"))["value__sum"] or 0
-        )
-        return saidas - entradas
-
-    context = {
-        "total_movements": Movement.objects.count(),
-        "total_products": Product.objects.count(),
-        "low_stock_count": Ingredient.objects.filter(qte__lt=F("min_qte")).count(),
-        "total_ingredients": Ingredient.objects.count(),
-        "recent_movements": Movement.objects.order_by("-date")[:5],
-        "low_stock_alerts": Ingredient.objects.filter(qte__lt=F("min_qte")),
-        "daily_net": get_net(today),
-        "weekly_net": get_net(week_start),
-        "monthly_net": get_net(month_start),
-    }
+    context = async_to_sync(get_dashboard)()
 
     return render(request, "home.html", context)
+
+
+@login_required
+@require_http_methods(["GET"])
+async def live_events(request):
+    """Envia as alterações das movimentações (Server-Sent Events) às páginas abertas.
+
+    Só funciona servido via ASGI (SERVER=asgi): em WSGI cada conexão aberta prenderia um
+    worker, e nenhum evento é publicado, então responde 204 e o navegador não reconecta.
+    """
+
+    if settings.SERVER != "asgi" or not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    try:
+        last_event_id = int(request.headers["Last-Event-ID"])
+    except (KeyError, ValueError):
+        last_event_id = None
+
+    response = StreamingHttpResponse(stream(user.store_id, last_event_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Impede que o nginx acumule os eventos antes de repassá-los
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@require_http_methods(["GET"])
+def metrics(request):
+    """Expõe as métricas no formato texto do Prometheus.
+
+    Com vários workers (PROMETHEUS_MULTIPROC_DIR definido) soma os valores de todos os
+    processos.
+    """
+
+    if settings.METRICS_TOKEN:
+        if request.headers.get("Authorization") != f"Bearer {settings.METRICS_TOKEN}":
+            return HttpResponse(status=401)
+    elif not (request.user.is_authenticated and (request.user.role == "admin" or request.user.is_staff)):
+        # Sem token as métricas (tráfego e movimentações) ficam restritas aos administradores
+        return HttpResponse(status=401)
+
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+@login_required
+@admin_required
+def profile_list(request):
+    return render(request, "profile_list.html", {"profiles": list_profiles()})
+
+
+@login_required
+@admin_required
+def profile_download(request, name, kind):
+    path = profile_dir() / f"{name}.{kind}"
+    if not path.is_file():
+        raise Http404
+
+    return FileResponse(path.open("rb"), as_attachment=kind == "prof", filename=path.name)
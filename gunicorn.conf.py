@@ -0,0 +1,22 @@
+import decouple
+
+# SERVER=asgi serve o core/asgi.py com workers do Uvicorn, SERVER=wsgi o core/wsgi.py
+SERVER = decouple.config("SERVER", default="wsgi")
+
+bind = decouple.config("BIND", default="0.0.0.0:8000")
+workers = decouple.config("WEB_CONCURRENCY", cast=int, default=2)
+
+if SERVER == "asgi":
+    wsgi_app = "core.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+else:
+    wsgi_app = "core.wsgi:application"
+    worker_class = "sync"
+
+
+def child_exit(server, worker):
+    # Descarta as métricas do worker encerrado no modo multiprocesso do Prometheus
+    if decouple.config("PROMETHEUS_MULTIPROC_DIR", default=""):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
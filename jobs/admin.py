@@ -0,0 +1,39 @@
+from django.contrib import admin
+from django.db.models import Avg, Count, Max, Q
+from django.utils import timezone
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ["id", "command", "status", "run_at", "attempts", "started_at", "duration", "schedule"]
+    list_filter = ["status", "command"]
+    search_fields = ["command", "schedule"]
+    readonly_fields = ["created_at", "started_at", "finished_at", "duration", "error"]
+    ordering = ["-run_at"]
+    actions = ["retry"]
+
+    @admin.action(description="Executar novamente")
+    def retry(self, request, queryset):
+        updated = queryset.exclude(status="running").update(status="queued", run_at=timezone.now(), attempts=0)
+        self.message_user(request, f"{updated} tarefas colocadas na fila")
+
+    def changelist_view(self, request, extra_context=None):
+        """Mostra acima da lista o tamanho da fila e o tempo de execução de cada comando."""
+
+        now = timezone.now()
+        queue = Job.objects.aggregate(
+            due=Count("id", filter=Q(status="queued", run_at__lte=now)),
+            scheduled=Count("id", filter=Q(status="queued", run_at__gt=now)),
+            running=Count("id", filter=Q(status="running")),
+            failed=Count("id", filter=Q(status="failed")),
+        )
+        commands = (
+            Job.objects.filter(status="done")
+            .values("command")
+            .annotate(runs=Count("id"), avg=Avg("duration"), max=Max("duration"), last=Max("finished_at"))
+            .order_by("command")
+        )
+        extra_context = {**(extra_context or {}), "queue": queue, "commands": commands}
+        return super().changelist_view(request, extra_context)
@@ -0,0 +1,70 @@
+import multiprocessing
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs.services import claim, requeue_stale, run_job, schedule_jobs
+
+
+class Command(BaseCommand):
+    help = "Executa as tarefas da fila (tabela Job) e cria as tarefas agendadas em JOB_SCHEDULES."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=settings.JOB_WORKERS, help="Tarefas executadas ao mesmo tempo."
+        )
+        parser.add_argument(
+            "--processes",
+            action="store_true",
+            help="Executa as tarefas em processos em vez de threads (tarefas que usam muita CPU).",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Executa as tarefas vencidas e encerra, sem esperar novas."
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        if options["processes"]:
+            # spawn em vez de fork: os processos não herdam as conexões abertas do worker
+            executor = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context("spawn"), initializer=django.setup
+            )
+        else:
+            executor = ThreadPoolExecutor(workers, thread_name_prefix="job")
+
+        stopping = []
+        # SIGTERM (systemd, docker stop) encerra como o Ctrl+C: sem novas tarefas,
+        # esperando as que estão em execução
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+
+        running = {}
+        self.stdout.write(f"Worker iniciado com {workers} {'processos' if options['processes'] else 'threads'}")
+        with executor:
+            try:
+                while not stopping:
+                    requeue_stale()
+                    schedule_jobs()
+                    claimed = claim(workers - len(running))
+                    running.update({executor.submit(run_job, id): id for id in claimed})
+                    if options["once"] and not claimed and not running:
+                        break
+
+                    if running:
+                        # Acorda assim que uma tarefa termina para ocupar o lugar dela
+                        done = wait(running, timeout=settings.JOB_POLL_INTERVAL, return_when=FIRST_COMPLETED).done
+                        self.report(running, done)
+                    elif not options["once"]:
+                        time.sleep(settings.JOB_POLL_INTERVAL)
+            except KeyboardInterrupt:
+                pass
+
+            self.stdout.write("Encerrando: aguardando as tarefas em execução")
+            self.report(running, wait(running).done)
+
+    def report(self, running: dict, done) -> None:
+        for future in done:
+            self.stdout.write(f"Tarefa {running.pop(future)}: {future.result()}")
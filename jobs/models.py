@@ -0,0 +1,52 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Tarefa executada fora da requisição pelo comando run_worker.
+
+    Cada tarefa é um comando de gerenciamento (ex: generate_reports) com os argumentos
+    dele. A fila é a própria tabela, então não há broker externo.
+
+    Attributes:
+        command (str): Comando de gerenciamento executado.
+        args (list): Argumentos do comando.
+        status (str): queued (na fila), running, done ou failed (sem novas tentativas).
+        run_at (timestamp): A partir de quando a tarefa pode ser executada.
+        attempts (int): Execuções já iniciadas.
+        max_attempts (int): Máximo de execuções antes de marcar como failed.
+        schedule (str): Agendamento que criou a tarefa (vazio para tarefas avulsas).
+        created_at (timestamp): Data de criação.
+        started_at (timestamp): Início da última execução.
+        finished_at (timestamp): Fim da última execução.
+        duration (float): Duração da última execução, em segundos.
+        error (str): Erro da última execução que falhou.
+    """
+
+    STATUSES = [("queued", "Na fila"), ("running", "Executando"), ("done", "Concluída"), ("failed", "Falhou")]
+
+    command = models.CharField(max_length=100)
+    args = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default="queued")
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    schedule = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        # Busca das próximas tarefas da fila
+        indexes = [models.Index(fields=["status", "run_at"], name="job_queue")]
+        constraints = [
+            # Cada horário de um agendamento vira uma única tarefa, mesmo com vários workers
+            models.UniqueConstraint(
+                fields=["schedule", "run_at"], condition=~models.Q(schedule=""), name="unique_scheduled_job"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.command} ({self.get_status_display()})"
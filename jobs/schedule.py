@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+from django.core.exceptions import ValidationError
+
+# Campos da expressão cron: (nome, mínimo, máximo)
+FIELDS = [("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31), ("month", 1, 12), ("weekday", 0, 6)]
+
+# Limite da busca do próximo horário (expressões como "0 0 30 2 *" nunca acontecem)
+MAX_DAYS = 366 * 5
+
+
+def parse_field(value: str, low: int, high: int) -> set[int]:
+    """Converte um campo cron (*, */n, a-b, a-b/n e listas separadas por vírgula)."""
+
+    values = set()
+    for part in value.split(","):
+        step = 1
+        if "/" in part:
+            part, step = part.split("/", 1)
+            step = int(step)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(bound) for bound in part.split("-", 1))
+        else:
+            start = end = int(part)
+        if step < 1 or start < low or end > high or start > end:
+            raise ValueError(value)
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def parse(expression: str) -> dict[str, set[int]]:
+    """Converte uma expressão cron de 5 campos (minuto hora dia mês dia-da-semana).
+
+    O dia da semana vai de 0 (domingo) a 6, e 7 também é aceito como domingo.
+
+    Raises:
+        ValidationError: Se a expressão é inválida.
+    """
+
+    parts = expression.split()
+    if len(parts) != len(FIELDS):
+        raise ValidationError(f"Agendamento inválido: {expression}")
+    try:
+        # 7 também é domingo
+        parts[4] = ",".join("0" if part == "7" else part for part in parts[4].split(","))
+        fields = {name: parse_field(part, low, high) for part, (name, low, high) in zip(parts, FIELDS)}
+    except ValueError:
+        raise ValidationError(f"Agendamento inválido: {expression}") from None
+    # Como no cron: com dia e dia da semana restritos, basta um dos dois coincidir
+    fields["any_day"] = parts[2] != "*" and parts[4] != "*"
+    return fields
+
+
+def day_matches(fields: dict, moment: datetime) -> bool:
+    day = moment.day in fields["day"]
+    # datetime.weekday() começa na segunda; no cron, 0 é domingo
+    weekday = (moment.weekday() + 1) % 7 in fields["weekday"]
+    return day or weekday if fields["any_day"] else day and weekday
+
+
+def next_run(expression: str, after: datetime) -> datetime:
+    """Próximo horário da expressão cron depois de after (no fuso de after).
+
+    Avança por mês, dia, hora e minuto, pulando de uma vez os que não coincidem.
+    """
+
+    fields = parse(expression)
+    moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    limit = after + timedelta(days=MAX_DAYS)
+
+    while moment <= limit:
+        if moment.month not in fields["month"]:
+            year, month = divmod(moment.month, 12)
+            moment = moment.replace(year=moment.year + year, month=month + 1, day=1, hour=0, minute=0)
+        elif not day_matches(fields, moment):
+            moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+        elif moment.hour not in fields["hour"]:
+            moment = (moment + timedelta(hours=1)).replace(minute=0)
+        elif moment.minute not in fields["minute"]:
+            moment += timedelta(minutes=1)
+        else:
+            return moment
+    raise ValidationError(f"O agendamento {expression} não acontece nos próximos anos")
@@ -0,0 +1,157 @@
+import io
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+from .schedule import next_run
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(command: str, *args, run_at=None, max_attempts: int | None = None) -> Job:
+    """Coloca um comando de gerenciamento na fila do run_worker.
+
+    Args:
+        command (str): Nome do comando (ex: "generate_reports").
+        *args: Argumentos do comando, como na linha de comando.
+        run_at (datetime): A partir de quando executar (padrão: agora).
+        max_attempts (int): Execuções antes de desistir (padrão: settings.JOB_MAX_ATTEMPTS).
+
+    Returns:
+        Job: Tarefa criada.
+    """
+
+    return Job.objects.create(
+        command=command,
+        args=[str(arg) for arg in args],
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def schedule_jobs(now=None) -> int:
+    """Garante na fila a próxima execução de cada agendamento de settings.JOB_SCHEDULES.
+
+    Cada horário vira uma única tarefa (restrição unique_scheduled_job), então vários
+    workers podem chamar esta função ao mesmo tempo. A próxima execução só é criada
+    depois que a atual sai da fila, e um horário perdido com o worker parado roda uma
+    única vez quando ele volta.
+
+    Returns:
+        int: Tarefas criadas.
+    """
+
+    now = timezone.localtime(now)
+    pending = set(
+        Job.objects.filter(status__in=["queued", "running"]).exclude(schedule="").values_list("schedule", flat=True)
+    )
+
+    jobs = []
+    for name, expression in settings.JOB_SCHEDULES.items():
+        if name in pending:
+            continue
+        command, *args = name.split()
+        jobs.append(
+            Job(
+                command=command,
+                args=args,
+                schedule=name,
+                run_at=next_run(expression, now),
+                max_attempts=settings.JOB_MAX_ATTEMPTS,
+            )
+        )
+    return len(Job.objects.bulk_create(jobs, ignore_conflicts=True))
+
+
+def requeue_stale(now=None) -> int:
+    """Devolve à fila as tarefas em execução há mais de settings.JOB_TIMEOUT segundos.
+
+    São tarefas de um worker que parou no meio (processo encerrado, servidor reiniciado).
+    A execução interrompida conta como uma tentativa, e as que já esgotaram as
+    tentativas ficam como failed.
+
+    Returns:
+        int: Tarefas devolvidas.
+    """
+
+    now = now or timezone.now()
+    stale = Job.objects.filter(status="running", started_at__lt=now - timedelta(seconds=settings.JOB_TIMEOUT))
+    error = "Execução interrompida"
+    stale.filter(attempts__gte=F("max_attempts")).update(status="failed", finished_at=now, error=error)
+    return stale.update(status="queued", run_at=now, error=error)
+
+
+def claim(limit: int, now=None) -> list[int]:
+    """Reserva até limit tarefas vencidas da fila, das mais antigas para as mais novas.
+
+    As candidatas são lidas pelo índice job_queue (com SKIP LOCKED onde o banco permite)
+    e cada uma só é reservada se ainda estiver na fila, com um UPDATE condicional, então
+    dois workers nunca executam a mesma tarefa.
+
+    Returns:
+        list: Ids das tarefas reservadas.
+    """
+
+    now = now or timezone.now()
+    claimed = []
+    with transaction.atomic():
+        due = Job.objects.filter(status="queued", run_at__lte=now).order_by("run_at", "id")
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        for id in due.values_list("id", flat=True)[:limit]:
+            if Job.objects.filter(id=id, status="queued").update(
+                status="running", started_at=now, finished_at=None, attempts=F("attempts") + 1
+            ):
+                claimed.append(id)
+    return claimed
+
+
+def backoff(attempts: int) -> timedelta:
+    """Espera antes de uma nova tentativa: JOB_BACKOFF segundos, dobrando a cada falha."""
+
+    return timedelta(seconds=settings.JOB_BACKOFF * 2 ** (attempts - 1))
+
+
+def run_job(job_id: int) -> str:
+    """Executa uma tarefa reservada por claim e registra o resultado.
+
+    Uma tarefa que falha volta para a fila após backoff(attempts) enquanto houver
+    tentativas; depois disso fica como failed, com o erro. Roda nas threads (ou
+    processos) do run_worker, então fecha a conexão ao final como o pool da página inicial.
+
+    Returns:
+        str: Status final da tarefa.
+    """
+
+    try:
+        job = Job.objects.get(id=job_id)
+        start = time.perf_counter()
+        output = io.StringIO()
+        try:
+            call_command(job.command, *job.args, stdout=output)
+        except Exception:
+            job.error = traceback.format_exc()
+            if job.attempts < job.max_attempts:
+                job.status = "queued"
+                job.run_at = timezone.now() + backoff(job.attempts)
+            else:
+                job.status = "failed"
+            logger.warning("Tarefa %s (%s) falhou na tentativa %s", job.id, job.command, job.attempts, exc_info=True)
+        else:
+            job.status, job.error = "done", ""
+            logger.info("Tarefa %s (%s): %s", job.id, job.command, output.getvalue().strip())
+
+        job.finished_at = timezone.now()
+        job.duration = time.perf_counter() - start
+        job.save(update_fields=["status", "run_at", "error", "finished_at", "duration"])
+        return job.status
+    finally:
+        close_old_connections()
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .schedule import next_run
+from .services import claim, enqueue, requeue_stale, run_job, schedule_jobs
+
+TZ = ZoneInfo("America/Sao_Paulo")
+
+
+class ScheduleTests(SimpleTestCase):
+    def test_next_run(self):
+        # Quarta-feira, 18/03/2026, 10:30
+        now = datetime(2026, 3, 18, 10, 30, tzinfo=TZ)
+        self.assertEqual(next_run("10 0 * * *", now), datetime(2026, 3, 19, 0, 10, tzinfo=TZ))
+        self.assertEqual(next_run("*/15 * * * *", now), datetime(2026, 3, 18, 10, 45, tzinfo=TZ))
+        self.assertEqual(next_run("0 9-17 * * 1-5", now), datetime(2026, 3, 18, 11, 0, tzinfo=TZ))
+        self.assertEqual(next_run("0 0 1 * *", now), datetime(2026, 4, 1, 0, 0, tzinfo=TZ))
+        # Domingo (0 ou 7)
+        self.assertEqual(next_run("0 8 * * 7", now), datetime(2026, 3, 22, 8, 0, tzinfo=TZ))
+        # Dia do mês ou dia da semana, como no cron
+        self.assertEqual(next_run("0 0 1 * 5", now), datetime(2026, 3, 20, 0, 0, tzinfo=TZ))
+        self.assertEqual(next_run("0 0 1 1 *", now), datetime(2027, 1, 1, 0, 0, tzinfo=TZ))
+
+    def test_invalid(self):
+        for expression in ["* * * *", "60 * * * *", "0 0 31 2-1 *", "*/0 * * * *", "a * * * *", "0 0 30 2 *"]:
+            with self.subTest(expression=expression), self.assertRaises(ValidationError):
+                next_run(expression, datetime(2026, 3, 18, tzinfo=TZ))
+
+
+@override_settings(JOB_SCHEDULES={"check --deploy": "10 0 * * *"}, JOB_BACKOFF=30, JOB_MAX_ATTEMPTS=2)
+class JobTests(TestCase):
+    def test_claim_runs_each_job_once(self):
+        job = enqueue("check")
+        enqueue("check", run_at=timezone.now() + timedelta(hours=1))
+
+        self.assertEqual(claim(10), [job.id])
+        self.assertEqual(claim(10), [])
+        self.assertEqual(run_job(job.id), "done")
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("done", 1))
+        self.assertIsNotNone(job.duration)
+
+    def test_retry_with_backoff(self):
+        job = enqueue("check")
+        with (
+            mock.patch("jobs.services.call_command", side_effect=RuntimeError("falhou")),
+            self.assertLogs("jobs.services", "WARNING"),
+        ):
+            claim(1)
+            before = timezone.now()
+            self.assertEqual(run_job(job.id), "queued")
+            job.refresh_from_db()
+            self.assertGreaterEqual(job.run_at, before + timedelta(seconds=30))
+            self.assertIn("falhou", job.error)
+
+            # A nova tentativa só sai da fila depois da espera
+            self.assertEqual(claim(1), [])
+            claim(1, now=job.run_at)
+            self.assertEqual(run_job(job.id), "failed")
+
+    def test_schedule_creates_one_job_per_time(self):
+        now = datetime(2026, 3, 18, 10, 30, tzinfo=TZ)
+        self.assertEqual(schedule_jobs(now), 1)
+        self.assertEqual(schedule_jobs(now), 0)
+
+        job = Job.objects.get()
+        self.assertEqual(
+            (job.command, job.args, job.run_at), ("check", ["--deploy"], datetime(2026, 3, 19, 0, 10, tzinfo=TZ))
+        )
+
+        # A próxima execução só é criada depois que a atual sai da fila
+        claim(1, now=job.run_at)
+        Job.objects.filter(id=job.id).update(status="done")
+        schedule_jobs(job.run_at)
+        self.assertEqual(Job.objects.filter(status="queued").get().run_at, datetime(2026, 3, 20, 0, 10, tzinfo=TZ))
+
+    def test_stale_jobs_are_requeued(self):
+        job = enqueue("check")
+        claim(1)
+        self.assertEqual(requeue_stale(timezone.now() + timedelta(hours=2)), 1)
+        self.assertEqual(Job.objects.get(id=job.id).status, "queued")
+
+
+@override_settings(JOB_SCHEDULES={})
+class WorkerTests(TransactionTestCase):
+    # As tarefas rodam nas threads do worker, cada uma com a sua conexão
+    def test_once(self):
+        enqueue("check")
+        call_command("run_worker", "--once", "--workers", "1", stdout=StringIO())
+        self.assertTrue(Job.objects.filter(command="check", args=[], status="done").exists())
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class MovementsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'movements'
+
+    def ready(self):
+        from core.versioning import track
+
+        track(self.label, *self.get_models())
@@ -0,0 +1,280 @@
+from collections import Counter
+from datetime import date, datetime
+from itertools import chain
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Q, Sum
+from django.utils.timezone import localdate, make_aware
+
+from core.routers import store_db
+from core.versioning import bump_version
+from stock.models import RecipeVersionItem
+
+from .filters import filter_movements
+from .models import ArchivedMonth, Movement, MovementInflow, MovementOutflow
+
+ARCHIVE_MODELS = (Movement, MovementInflow, MovementOutflow)
+
+# Movimentações copiadas por vez (o SQLite limita a quantidade de parâmetros do IN)
+BATCH_SIZE = 900
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_range(month: date) -> tuple[datetime, datetime]:
+    """Retorna o início do mês e o início do mês seguinte (timezone local)."""
+
+    start = make_aware(datetime.combine(month, datetime.min.time()))
+    end = make_aware(datetime.combine(add_months(month, 1), datetime.min.time()))
+    return start, end
+
+
+def archive_cutoff(months: int) -> date:
+    """Primeiro dia do mês mais antigo que continua nas tabelas principais."""
+
+    return add_months(month_start(localdate()), -months)
+
+
+def archive_path(month: date, using: str = "default") -> Path:
+    # Cada banco de loja tem os próprios arquivos: os ids das movimentações se repetem entre bancos
+    prefix = "movements" if using == "default" else f"movements-{using}"
+    return Path(settings.ARCHIVE_DIR) / f"{prefix}-{month:%Y-%m}.sqlite3"
+
+
+def archive_db(month: date, using: str = "default") -> str:
+    """Registra (se preciso) e retorna o alias da conexão com o arquivo SQLite do mês.
+
+    Cada mês arquivado é um arquivo com as mesmas tabelas de movimentações, então as
+    consultas usam os próprios models com .using(alias). Ao registrar um arquivo que já
+    existe, as colunas adicionadas aos models depois do arquivamento são criadas nele.
+
+    Args:
+        month (date): Primeiro dia do mês.
+        using (str): Banco de onde as movimentações foram arquivadas.
+    """
+
+    alias = f"archive_{month:%Y_%m}" if using == "default" else f"archive_{using}_{month:%Y_%m}"
+    if alias not in connections.settings:
+        connections.settings[alias] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": archive_path(month, using),
+            "ATOMIC_REQUESTS": False,
+            "AUTOCOMMIT": True,
+            "CONN_MAX_AGE": 0,
+            "CONN_HEALTH_CHECKS": False,
+            "OPTIONS": {},
+            "TIME_ZONE": None,
+            "USER": "",
+            "PASSWORD": "",
+            "HOST": "",
+            "PORT": "",
+            "TEST": {"NAME": None, "MIRROR": None, "CHARSET": None, "COLLATION": None, "MIGRATE": False},
+        }
+        if archive_path(month, using).exists():
+            sync_archive_schema(alias)
+    return alias
+
+
+def sync_archive_schema(alias: str) -> None:
+    """Cria no arquivo as tabelas e colunas de movimentações que ainda não existem.
+
+    O schema editor só é aberto se faltar algo: no SQLite ele não pode ser usado dentro
+    de uma transação, e a maioria dos arquivos já está em dia.
+    """
+
+    connection = connections[alias]
+    existing = set(connection.introspection.table_names())
+    tables, fields = [], []
+    with connection.cursor() as cursor:
+        for model in ARCHIVE_MODELS:
+            table = model._meta.db_table
+            if table not in existing:
+                tables.append(model)
+                continue
+            columns = {column.name for column in connection.introspection.get_table_description(cursor, table)}
+            fields.extend(
+                (model, field) for field in model._meta.local_concrete_fields if field.column not in columns
+            )
+
+    if not tables and not fields:
+        return
+    with connection.schema_editor() as editor:
+        for model in tables:
+            editor.create_model(model)
+        for model, field in fields:
+            editor.add_field(model, field)
+
+
+def create_archive(month: date, using: str = "default") -> str:
+    """Cria o arquivo do mês com as tabelas de movimentações, se ainda não existirem."""
+
+    archive_path(month, using).parent.mkdir(parents=True, exist_ok=True)
+    alias = archive_db(month, using)
+    sync_archive_schema(alias)
+    return alias
+
+
+def archive_month(month: date, using: str = "default") -> int:
+    """Move as movimentações do mês de um banco (default ou de loja) para o arquivo.
+
+    Os totais do mês de cada loja (ArchivedMonth, no mesmo banco das movimentações) são
+    atualizados na mesma transação que remove as linhas das tabelas principais, e as
+    linhas só são removidas depois de copiadas. Repetir o arquivamento de um mês
+    interrompido não duplica registros.
+
+    Args:
+        month (date): Primeiro dia do mês.
+        using (str): Banco das movimentações (ver STORE_DATABASES).
+
+    Returns:
+        int: Quantidade de movimentações arquivadas.
+    """
+
+    start, end = month_range(month)
+    hot = Movement.objects.using(using).filter(date__gte=start, date__lt=end)
+    alias = create_archive(month, using)
+
+    archived = 0
+    while ids := list(hot.order_by("id").values_list("id", flat=True)[:BATCH_SIZE]):
+        movements = list(Movement.objects.using(using).filter(id__in=ids))
+        inflows = list(MovementInflow.objects.using(using).filter(movement_id__in=ids))
+        outflows = list(MovementOutflow.objects.using(using).filter(movement_id__in=ids))
+
+        # O auto_now_add de Movement.date sobrescreve a data no bulk_create
+        dates = [movement.date for movement in movements]
+        with transaction.atomic(using=alias):
+            for model, rows in ((Movement, movements), (MovementInflow, inflows), (MovementOutflow, outflows)):
+                model.objects.using(alias).bulk_create(rows, ignore_conflicts=True)
+            for movement, original in zip(movements, dates):
+                movement.date = original
+            Movement.objects.using(alias).bulk_update(movements, ["date"])
+
+        # Os totais ficam separados por loja, já que várias lojas podem dividir o banco
+        totals = (
+            Movement.objects.using(using)
+            .filter(id__in=ids)
+            .values("store_id")
+            .annotate(
+                count=Count("id"),
+                inflow=Sum("value", filter=Q(type="in")),
+                outflow=Sum("value", filter=Q(type="out")),
+            )
+            .order_by()
+        )
+        with transaction.atomic(using=using):
+            for row in totals:
+                rollup, _ = (
+                    ArchivedMonth.objects.using(using)
+                    .select_for_update()
+                    .get_or_create(month=month, store_id=row["store_id"])
+                )
+                rollup.movements += row["count"]
+                rollup.inflow_value += row["inflow"] or 0
+                rollup.outflow_value += row["outflow"] or 0
+                rollup.save()
+
+            MovementInflow.objects.using(using).filter(movement_id__in=ids).delete()
+            MovementOutflow.objects.using(using).filter(movement_id__in=ids).delete()
+            Movement.objects.using(using).filter(id__in=ids).delete()
+
+        archived += len(ids)
+
+    bump_version("movements", using=using)
+    return archived
+
+
+def archived_months(start: datetime, end: datetime) -> list[date]:
+    """Meses arquivados que se sobrepõem ao período informado."""
+
+    first = month_start(localdate(start))
+    months = ArchivedMonth.objects.filter(month__gte=first, month__lte=localdate(end))
+    return list(months.values_list("month", flat=True).distinct().order_by("month"))
+
+
+def movements_between(start: datetime, end: datetime, *related: str, filters: dict | None = None):
+    """Movimentações do período, incluindo as que estão em meses arquivados.
+
+    Sem meses arquivados no período retorna o QuerySet das tabelas principais; do
+    contrário, uma lista já ordenada com os registros do arquivo e das tabelas.
+
+    Args:
+        start (datetime): Início do período.
+        end (datetime): Fim do período.
+        related (str): Relações para prefetch_related (ex: "ingredients", "products").
+        filters (dict): Filtros da lista de movimentações (ver movements.filters).
+
+    Returns:
+        QuerySet | list: Movimentações da mais recente para a mais antiga.
+    """
+
+    hot = Movement.objects.filter(date__range=(start, end))
+    if filters:
+        hot = filter_movements(hot, filters)
+    hot = hot.prefetch_related(*related).order_by("-date")
+
+    months = archived_months(start, end)
+    if not months:
+        return hot
+
+    using = store_db()
+    archived = (hot.using(archive_db(month, using)) for month in months if archive_path(month, using).exists())
+    return sorted(chain(hot, *archived), key=lambda movement: movement.date, reverse=True)
+
+
+def recipe_consumption(start: datetime, end: datetime) -> list[dict]:
+    """Consumo de ingredientes pelas receitas no período, incluindo os meses arquivados.
+
+    As saídas de cada banco são somadas por versão da receita em uma consulta agrupada,
+    e as somas são multiplicadas pelos itens das versões (RecipeVersionItem), buscados
+    de uma vez. Editar uma receita não altera o consumo de saídas anteriores.
+
+    Returns:
+        list: name, measure e quantity de cada ingrediente, em ordem alfabética.
+    """
+
+    # Os itens não passam pelo StoreScopedManager: a loja é filtrada pela movimentação
+    outflows = MovementOutflow.objects.filter(movement__in=Movement.objects.filter(date__range=(start, end)))
+    outflows = outflows.filter(recipe__isnull=False).values("recipe_id").annotate(total=Sum("quantity"))
+
+    sold = Counter()
+    using = store_db()
+    months = [month for month in archived_months(start, end) if archive_path(month, using).exists()]
+    archives = [archive_db(month, using) for month in months]
+    for rows in (outflows, *(outflows.using(alias) for alias in archives)):
+        for row in rows:
+            sold[row["recipe_id"]] += row["total"]
+
+    consumed = Counter()
+    items = RecipeVersionItem.objects.filter(version_id__in=sold)
+    for version_id, name, measure, quantity in items.values_list("version_id", "name", "measure", "quantity"):
+        consumed[(name, measure)] += quantity * sold[version_id]
+
+    return [
+        {"name": name, "measure": measure, "quantity": quantity}
+        for (name, measure), quantity in sorted(consumed.items())
+    ]
+
+
+def get_movement(id: int) -> Movement | None:
+    """Busca a movimentação nas tabelas principais e, se não encontrar, nos arquivos."""
+
+    movement = Movement.objects.filter(id=id).first()
+    if movement is not None:
+        return movement
+
+    using = store_db()
+    for month in ArchivedMonth.objects.values_list("month", flat=True).distinct().order_by("-month"):
+        if archive_path(month, using).exists():
+            movement = Movement.objects.using(archive_db(month, using)).filter(id=id).first()
+            if movement is not None:
+                return movement
+    return None
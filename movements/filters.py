@@ -0,0 +1,150 @@
+from decimal import Decimal, InvalidOperation
+from operator import attrgetter
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Q, QuerySet, Sum
+
+from .models import Movement, MovementInflow, MovementOutflow
+
+# Ordenações aceitas na lista: parâmetro "sort" -> campos do order_by. Cada uma tem um
+# índice do Movement que começa pelo primeiro campo.
+SORTS = {
+    "-date": ("-date", "-id"),
+    "date": ("date", "id"),
+    "-value": ("-value", "-date"),
+    "value": ("value", "date"),
+}
+SORT_CHOICES = [
+    ("-date", "Mais recentes"),
+    ("date", "Mais antigas"),
+    ("-value", "Maior valor"),
+    ("value", "Menor valor"),
+]
+DEFAULT_SORT = "-date"
+
+
+def parse_amount(value: str, name: str) -> Decimal | None:
+    """Converte um valor do filtro no formato brasileiro (1.234,56); vazio é sem limite."""
+
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        amount = Decimal(value.replace(".", "").replace(",", "."))
+    except InvalidOperation:
+        raise ValidationError(f"Insira um valor válido para {name}") from None
+    if amount < 0 or not amount.is_finite():
+        raise ValidationError(f"Insira um valor válido para {name}")
+    return amount
+
+
+def parse_filters(params) -> dict:
+    """Lê os filtros da lista de movimentações (tipo, responsável, item, faixa de valor e ordem).
+
+    Raises:
+        ValidationError: Com as mensagens de todos os filtros inválidos.
+    """
+
+    filters, errors = {}, []
+
+    type = params.get("type", "")
+    if type:
+        if type in dict(Movement._meta.get_field("type").choices):
+            filters["type"] = type
+        else:
+            errors.append("Selecione um tipo de movimentação válido")
+
+    for field in ("user", "item"):
+        value = params.get(field, "").strip()
+        if value:
+            filters[field] = value
+
+    for field, name in (("min_value", "o valor mínimo"), ("max_value", "o valor máximo")):
+        try:
+            amount = parse_amount(params.get(field, ""), name)
+        except ValidationError as e:
+            errors.extend(e.messages)
+            continue
+        if amount is not None:
+            filters[field] = amount
+
+    if "min_value" in filters and "max_value" in filters and filters["min_value"] > filters["max_value"]:
+        errors.append("O valor mínimo não pode ser maior que o valor máximo")
+
+    sort = params.get("sort") or DEFAULT_SORT
+    if sort not in SORTS:
+        errors.append("Selecione uma ordenação válida")
+    filters["sort"] = sort
+
+    if errors:
+        raise ValidationError(errors)
+    return filters
+
+
+def filter_movements(movements: QuerySet, filters: dict) -> QuerySet:
+    """Aplica os filtros de parse_filters às movimentações (sem ordenar).
+
+    Cada filtro segue um índice: (type, date) e (user, date) no Movement e (name, movement)
+    nos itens. O item é buscado pelo nome nos itens de entrada e de saída, limitado aos
+    itens do tipo filtrado, e volta como subconsulta de ids das movimentações.
+    """
+
+    if "type" in filters:
+        movements = movements.filter(type=filters["type"])
+    if "user" in filters:
+        movements = movements.filter(user=filters["user"])
+    if "min_value" in filters:
+        movements = movements.filter(value__gte=filters["min_value"])
+    if "max_value" in filters:
+        movements = movements.filter(value__lte=filters["max_value"])
+
+    if "item" in filters:
+        lines = []
+        if filters.get("type") != "out":
+            lines.append(MovementInflow.objects.filter(name=filters["item"]))
+        if filters.get("type") != "in":
+            lines.append(MovementOutflow.objects.filter(name=filters["item"]))
+        match = Q()
+        for items in lines:
+            match |= Q(id__in=items.values("movement_id"))
+        movements = movements.filter(match)
+
+    return movements
+
+
+def sort_movements(movements, sort: str):
+    """Ordena um QuerySet pelo banco ou uma lista (período com meses arquivados) em memória."""
+
+    fields = SORTS[sort]
+    if isinstance(movements, QuerySet):
+        return movements.order_by(*fields)
+
+    movements = list(movements)
+    # Ordenações estáveis, do último critério para o primeiro
+    for field in reversed(fields):
+        movements.sort(key=attrgetter(field.lstrip("-")), reverse=field.startswith("-"))
+    return movements
+
+
+def facets(movements) -> list[dict]:
+    """Quantidade e total de cada tipo nas movimentações filtradas.
+
+    Um QuerySet é resumido em uma única consulta agrupada por tipo; uma lista (período
+    com meses arquivados) é resumida em memória.
+
+    Returns:
+        list: type, label, count e total de cada tipo presente.
+    """
+
+    labels = dict(Movement._meta.get_field("type").choices)
+    if isinstance(movements, QuerySet):
+        rows = movements.order_by().values("type").annotate(count=Count("id"), total=Sum("value")).order_by("type")
+    else:
+        summary = {}
+        for movement in movements:
+            row = summary.setdefault(movement.type, {"type": movement.type, "count": 0, "total": Decimal(0)})
+            row["count"] += 1
+            row["total"] += movement.value
+        rows = [summary[type] for type in sorted(summary)]
+
+    return [{**row, "label": labels.get(row["type"], row["type"])} for row in rows]
@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import TruncMonth
+
+from movements.archive import archive_cutoff, archive_month, month_range
+from movements.models import Movement
+
+
+class Command(BaseCommand):
+    help = "Move as movimentações de meses fechados para arquivos SQLite mensais."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=settings.ARCHIVE_AFTER_MONTHS,
+            help="Meses completos mantidos nas tabelas principais, além do mês atual.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Apenas lista os meses que seriam arquivados.")
+
+    def handle(self, *args, **options):
+        if options["months"] < 1:
+            raise CommandError("--months deve ser pelo menos 1 (o mês atual e o anterior nunca são arquivados).")
+
+        cutoff, _ = month_range(archive_cutoff(options["months"]))
+        # Lojas com banco próprio (STORE_DATABASES) arquivam em arquivos próprios
+        for using in ["default", *settings.STORE_DATABASES]:
+            months = (
+                Movement.objects.using(using)
+                .filter(date__lt=cutoff)
+                .annotate(month=TruncMonth("date"))
+                .values_list("month", flat=True)
+                .distinct()
+                .order_by("month")
+            )
+
+            for month in months:
+                month = month.date()
+                if options["dry_run"]:
+                    self.stdout.write(f"{using}: {month:%m/%Y}")
+                    continue
+
+                started = time.monotonic()
+                archived = archive_month(month, using)
+                self.stdout.write(
+                    f"{using}: {month:%m/%Y}: {archived} movimentações arquivadas ({time.monotonic() - started:.1f}s)"
+                )
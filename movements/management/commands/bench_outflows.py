@@ -0,0 +1,80 @@
+import threading
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.http import QueryDict
+
+from movements.models import Movement
+from movements.services import create_outflow
+from stock.models import Ingredient, Product, ProductIngredient
+
+BENCH_NAME = "__bench__"
+
+
+class Command(BaseCommand):
+    help = "Mede as saídas por segundo suportadas com vários terminais gravando ao mesmo tempo."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=4, help="Número de threads gravando saídas.")
+        parser.add_argument("--seconds", type=float, default=10, help="Duração da medição.")
+
+    def handle(self, *args, **options):
+        product = self.create_fixtures()
+        results = []
+        deadline = time.monotonic() + options["seconds"]
+
+        threads = [
+            threading.Thread(target=self.writer, args=(product.id, deadline, results))
+            for _ in range(options["writers"])
+        ]
+        try:
+            started = time.monotonic()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.monotonic() - started
+        finally:
+            self.delete_fixtures()
+
+        ok = sum(r["ok"] for r in results)
+        locked = sum(r["locked"] for r in results)
+
+        self.stdout.write(f"Banco: {connection.vendor} ({connection.settings_dict['OPTIONS'] or 'padrão'})")
+        self.stdout.write(f"Terminais: {options['writers']} | Duração: {elapsed:.1f}s")
+        self.stdout.write(f"Saídas registradas: {ok} ({ok / elapsed:.1f}/s)")
+        self.stdout.write(f"Falhas por banco travado: {locked}")
+
+    def writer(self, product_id: int, deadline: float, results: list) -> None:
+        data = QueryDict(mutable=True)
+        data.setlist("products", [str(product_id)])
+        data[f"qp-{product_id}"] = "1"
+        data["commentary"] = ""
+
+        counts = {"ok": 0, "locked": 0}
+        try:
+            while time.monotonic() < deadline:
+                try:
+                    create_outflow(data, BENCH_NAME)
+                    counts["ok"] += 1
+                except OperationalError:
+                    counts["locked"] += 1
+                except ValidationError:
+                    break
+        finally:
+            connection.close()
+            results.append(counts)
+
+    def create_fixtures(self) -> Product:
+        self.delete_fixtures()
+        ingredient = Ingredient.objects.create(name=BENCH_NAME, qte=9_999_999, measure="unit")
+        product = Product.objects.create(name=BENCH_NAME, price=1)
+        ProductIngredient.objects.create(product=product, ingredient=ingredient, quantity=1)
+        return product
+
+    def delete_fixtures(self) -> None:
+        Movement.objects.filter(user=BENCH_NAME).delete()
+        Product.objects.filter(name=BENCH_NAME).delete()
+        Ingredient.objects.filter(name=BENCH_NAME).delete()
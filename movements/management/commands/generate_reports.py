@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from movements.reports import generate_closed_reports
+from stores.models import Store
+from stores.services import using_store
+
+
+class Command(BaseCommand):
+    help = "Gera os relatórios do último dia, semana e mês fechados de cada loja e de todas as lojas."
+
+    def handle(self, *args, **options):
+        for store in [None, *Store.objects.all()]:
+            with using_store(store):
+                generated = generate_closed_reports()
+            name = store.name if store else "Todas as lojas"
+            self.stdout.write(f"{name}: {', '.join(str(artifact) for artifact in generated) or 'em dia'}")
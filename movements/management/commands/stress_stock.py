@@ -0,0 +1,249 @@
+import multiprocessing
+import random
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.http import QueryDict
+from django.test import Client
+from django.urls import reverse
+
+from accounts.models import CustomUser
+from movements.models import Movement, MovementInflow, MovementOutflow
+from movements.services import create_inflow, create_outflow
+from stock import units
+from stock.models import Ingredient, Product, ProductIngredient
+
+STRESS_NAME = "__stress__"
+STRESS_EMAIL = "stress@devspizza.local"
+
+# Poucos ingredientes compartilhados por todos os produtos, para forçar disputa
+INGREDIENTS = (("farinha", "kg", "50"), ("queijo", "g", "20000"), ("molho", "g", "15000"), ("massa", "unit", "300"))
+RECIPES = (
+    ("margherita", "25,90", {"farinha": "0,3", "queijo": "150", "molho": "100", "massa": "1"}),
+    ("mussarela", "29,90", {"farinha": "0,3", "queijo": "250", "massa": "1"}),
+    ("calzone", "34,90", {"farinha": "0,5", "queijo": "200", "molho": "80", "massa": "2"}),
+    ("pao de alho", "14,90", {"farinha": "0,2", "queijo": "50"}),
+    ("molho extra", "4,90", {"molho": "120"}),
+)
+INFLOWS = {"kg": (("kg", "5"), ("g", "2500")), "g": (("g", "3000"), ("kg", "2,5")), "unit": (("unit", "40"),)}
+
+
+def fixture_name(name: str) -> str:
+    return f"{STRESS_NAME} {name}"
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_worker(worker: int, options: dict, ingredients: dict, products: dict) -> dict:
+    """Registra entradas e saídas até o prazo, medindo a latência de cada tentativa.
+
+    Roda em uma thread ou em um processo separado, sempre com sua própria conexão.
+    """
+
+    rng = random.Random(options["seed"] + worker)
+    deadline = time.monotonic() + options["seconds"]
+    result = {"latencies": defaultdict(list), "ok": defaultdict(int), "rejected": defaultdict(int), "locked": 0}
+
+    client = None
+    if options["via"] == "client":
+        client = Client()
+        client.force_login(CustomUser.objects.get(email=STRESS_EMAIL))
+
+    try:
+        while time.monotonic() < deadline:
+            kind = "in" if rng.random() < options["inflow_ratio"] else "out"
+            data = inflow_data(rng, ingredients) if kind == "in" else outflow_data(rng, products)
+
+            started = time.perf_counter()
+            try:
+                if client is None:
+                    (create_inflow if kind == "in" else create_outflow)(data, STRESS_NAME)
+                    accepted = True
+                else:
+                    response = client.post(reverse("movement_create"), {"type": kind, **dict(data.lists())})
+                    # Redireciona quando registra, renderiza o formulário com os erros quando recusa
+                    accepted = response.status_code == 302
+            except ValidationError:
+                accepted = False
+            except OperationalError:
+                result["locked"] += 1
+                continue
+            finally:
+                result["latencies"][kind].append((time.perf_counter() - started) * 1000)
+
+            result["ok" if accepted else "rejected"][kind] += 1
+    finally:
+        connection.close()
+
+    return {key: dict(value) if isinstance(value, defaultdict) else value for key, value in result.items()}
+
+
+def inflow_data(rng: random.Random, ingredients: dict) -> QueryDict:
+    data = QueryDict(mutable=True)
+    data["commentary"] = ""
+    for ingredient_id, measure in rng.sample(sorted(ingredients.items()), rng.randint(1, 2)):
+        unit, quantity = rng.choice(INFLOWS[measure])
+        data.appendlist("ingredients", str(ingredient_id))
+        data[f"qi-{ingredient_id}"] = quantity
+        data[f"pi-{ingredient_id}"] = "10,00"
+        data[f"m-{ingredient_id}"] = unit
+    return data
+
+
+def outflow_data(rng: random.Random, products: dict) -> QueryDict:
+    data = QueryDict(mutable=True)
+    data["commentary"] = ""
+    for product_id in rng.sample(sorted(products), rng.randint(1, 3)):
+        data.appendlist("products", str(product_id))
+        data[f"qp-{product_id}"] = str(rng.randint(1, 3))
+    return data
+
+
+class Command(BaseCommand):
+    help = (
+        "Simula vários terminais registrando entradas e saídas dos mesmos ingredientes ao mesmo tempo "
+        "e confere se o estoque final bate com as movimentações gravadas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8, help="Terminais simultâneos.")
+        parser.add_argument("--seconds", type=float, default=10, help="Duração do teste.")
+        parser.add_argument(
+            "--via",
+            choices=["services", "client"],
+            default="services",
+            help="Chama os services diretamente ou passa pela view (middlewares, sessão e CSRF) com o test client.",
+        )
+        parser.add_argument("--processes", action="store_true", help="Usa processos em vez de threads.")
+        parser.add_argument("--inflow-ratio", type=float, default=0.2, help="Fração das operações que são entradas.")
+        parser.add_argument("--seed", type=int, default=42, help="Semente das operações sorteadas.")
+        parser.add_argument("--keep", action="store_true", help="Mantém os dados do teste ao final.")
+
+    def handle(self, *args, **options):
+        if options["via"] == "client" and "*" not in settings.ALLOWED_HOSTS:
+            settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+
+        ingredients, products = self.create_fixtures()
+        initial = dict(Ingredient.objects.filter(id__in=ingredients).values_list("id", "qte"))
+
+        try:
+            started = time.monotonic()
+            results = self.run(options, ingredients, products)
+            elapsed = time.monotonic() - started
+
+            self.report(options, results, elapsed)
+            mismatches = self.check_stock(initial)
+        finally:
+            if not options["keep"]:
+                self.delete_fixtures()
+
+        if mismatches:
+            for line in mismatches:
+                self.stderr.write(line)
+            raise CommandError("Estoque divergente das movimentações registradas.")
+        self.stdout.write(self.style.SUCCESS("Estoque confere com entradas e saídas registradas."))
+
+    def run(self, options: dict, ingredients: dict, products: dict) -> list[dict]:
+        args = [(worker, options, ingredients, products) for worker in range(options["workers"])]
+
+        if options["processes"]:
+            # Os processos filhos não podem herdar a conexão aberta do pai
+            connections.close_all()
+            with multiprocessing.get_context("fork").Pool(options["workers"]) as pool:
+                return pool.starmap(run_worker, args)
+
+        results = []
+        threads = [threading.Thread(target=lambda a=a: results.append(run_worker(*a))) for a in args]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def report(self, options: dict, results: list[dict], elapsed: float) -> None:
+        mode = "processos" if options["processes"] else "threads"
+        self.stdout.write(f"Banco: {connection.vendor} | Via: {options['via']} | {options['workers']} {mode} | {elapsed:.1f}s")
+
+        for kind, label in (("in", "Entradas"), ("out", "Saídas")):
+            ok = sum(result["ok"].get(kind, 0) for result in results)
+            rejected = sum(result["rejected"].get(kind, 0) for result in results)
+            latencies = [value for result in results for value in result["latencies"].get(kind, [])]
+            self.stdout.write(
+                f"{label:<9} registradas {ok:>6} ({ok / elapsed:7.1f}/s)  recusadas {rejected:>5}  "
+                f"p50 {percentile(latencies, 0.5):7.2f}ms  p99 {percentile(latencies, 0.99):7.2f}ms"
+            )
+
+        self.stdout.write(f"Falhas por banco travado: {sum(result['locked'] for result in results)}")
+
+    def check_stock(self, initial: dict) -> list[str]:
+        """Recalcula o estoque a partir das movimentações gravadas pelo teste.
+
+        Estoque esperado = inicial + entradas (convertidas para a unidade do ingrediente)
+        - saídas multiplicadas pela receita de cada produto.
+        """
+
+        ingredients = {ingredient.name: ingredient for ingredient in Ingredient.objects.filter(id__in=initial)}
+        expected = dict(initial)
+
+        inflows = MovementInflow.objects.filter(movement__user__startswith=STRESS_NAME)
+        for name, quantity, measure in inflows.values_list("name", "quantity", "measure"):
+            ingredient = ingredients[name]
+            expected[ingredient.id] += units.convert(quantity, measure, ingredient.measure)
+
+        recipes = defaultdict(list)
+        for item in ProductIngredient.objects.filter(ingredient_id__in=initial).select_related("product"):
+            recipes[item.product.name].append((item.ingredient_id, item.quantity))
+
+        outflows = MovementOutflow.objects.filter(movement__user__startswith=STRESS_NAME)
+        for name, quantity in outflows.values_list("name", "quantity"):
+            for ingredient_id, recipe_quantity in recipes[name]:
+                expected[ingredient_id] -= recipe_quantity * quantity
+
+        mismatches = []
+        for ingredient in ingredients.values():
+            if ingredient.qte != expected[ingredient.id]:
+                mismatches.append(f"{ingredient.name}: estoque {ingredient.qte}, esperado {expected[ingredient.id]}")
+            if ingredient.qte < 0:
+                mismatches.append(f"{ingredient.name}: estoque negativo ({ingredient.qte})")
+        return mismatches
+
+    def create_fixtures(self) -> tuple[dict, dict]:
+        self.delete_fixtures()
+
+        ingredients = {}
+        for name, measure, qte in INGREDIENTS:
+            ingredient = Ingredient.objects.create(name=fixture_name(name), measure=measure, qte=Decimal(qte))
+            ingredients[name] = ingredient
+
+        products = {}
+        for name, price, recipe in RECIPES:
+            product = Product.objects.create(name=fixture_name(name), price=Decimal(price.replace(",", ".")))
+            for ingredient_name, quantity in recipe.items():
+                ProductIngredient.objects.create(
+                    product=product,
+                    ingredient=ingredients[ingredient_name],
+                    quantity=Decimal(quantity.replace(",", ".")),
+                )
+            products[product.id] = product.name
+
+        CustomUser.objects.create_user(
+            username=STRESS_NAME, email=STRESS_EMAIL, password=None, role="admin", first_name=STRESS_NAME
+        )
+        return {ingredient.id: ingredient.measure for ingredient in ingredients.values()}, products
+
+    def delete_fixtures(self) -> None:
+        Movement.objects.filter(user__startswith=STRESS_NAME).delete()
+        Product.objects.filter(name__startswith=STRESS_NAME).delete()
+        Ingredient.objects.filter(name__startswith=STRESS_NAME).delete()
+        CustomUser.objects.filter(email=STRESS_EMAIL).delete()
@@ -1,7 +1,10 @@
 from django.db import models
 
+from stock import units
+from stores.models import StoreScopedModel
 
-class Movement(models.Model):
+
+class Movement(StoreScopedModel):
     """Representa uma movimentação.
 
     Atributes:
@@ -10,6 +13,7 @@ class Movement(models.Model):
         type (str): Tipo de movimentação (in/out).
         date (timestamp): Data da movimentação.
         commentary (str): Comentário sobre a transação movimentação.
+        store (Store): Loja onde a movimentação foi registrada.
 
     """
 
@@ -19,6 +23,14 @@ class Movement(models.Model):
     date = models.DateTimeField(auto_now_add=True)
     commentary = models.TextField(null=True, blank=True)
 
+    class Meta:
+        # Um índice por caminho de acesso da lista de movimentações (ver movements.filters)
+        indexes = [
+            models.Index(fields=["type", "date"], name="movement_type_date"),
+            models.Index(fields=["user", "date"], name="movement_user_date"),
+            models.Index(fields=["value", "date"], name="movement_value_date"),
+        ]
+
     def __str__(self):
         return f"{self.date} - {self.user}: {self.value}"
 
@@ -29,22 +41,43 @@ class MovementInflow(models.Model):
     Atributes:
         movement (Fk): Chave estrangeira para a movimentação base com o nome de ingredients.
         name (str): Nome do ingrediente.
-        quantity (Decimal): Quantidade adicionada.
+        quantity (Decimal): Quantidade adicionada, na unidade do ingrediente.
         price (Decimal): Preço pago.
-        measure (str) Unidade de Medida (g/kg/unit).
+        measure (str) Unidade do ingrediente na entrada (ver stock.units); quantidades
+            informadas em outra unidade ou em embalagens são convertidas ao registrar.
+        ingredient (Ingredient): Ingrediente recebido, que continua ligado à entrada se for
+            renomeado. Sem constraint, já que as entradas arquivadas ficam em outro banco.
 
     """
 
     # related_name para fazer acesso reverso e pegar essas informações
     movement = models.ForeignKey(Movement, on_delete=models.CASCADE, related_name="ingredients")
     name = models.CharField(max_length=100)
-    quantity = models.DecimalField(default=0, max_digits=10, decimal_places=2)
+    quantity = models.DecimalField(default=0, max_digits=10, decimal_places=3)
     price = models.DecimalField(default=0, max_digits=10, decimal_places=2)
-    measure = models.CharField(max_length=10, choices=([("g", "Gramas"), ("kg", "Quilos"), ("unit", "Unidades")]))
+    measure = models.CharField(max_length=10, choices=units.MEASURE_CHOICES)
+    ingredient = models.ForeignKey(
+        "stock.Ingredient",
+        null=True,
+        blank=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="inflows",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["name", "movement"], name="movement_inflow_name"),
+            models.Index(fields=["ingredient", "movement"], name="movement_inflow_ingredient"),
+        ]
 
     def __str__(self):
         return f"{self.name}: {self.quantity} - {self.price}"
 
+    @property
+    def fractional(self) -> bool:
+        return units.is_fractional(self.measure)
+
 
 class MovementOutflow(models.Model):
     """Representa uma movimentação de saida (produtos).
@@ -54,6 +87,8 @@ class MovementOutflow(models.Model):
         name (str): Nome do produto.
         quantity (int): Quantidade vendida.
         price (Decimal): Preço.
+        recipe (RecipeVersion): Versão da receita consumida. Sem constraint, já que as
+            saídas arquivadas ficam em outro banco.
 
     """
 
@@ -62,6 +97,92 @@ class MovementOutflow(models.Model):
     name = models.CharField(max_length=100)
     quantity = models.PositiveIntegerField(default=0)
     price = models.DecimalField(default=0, max_digits=10, decimal_places=2)
+    recipe = models.ForeignKey(
+        "stock.RecipeVersion",
+        null=True,
+        blank=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="outflows",
+    )
+
+    class Meta:
+        indexes = [models.Index(fields=["name", "movement"], name="movement_outflow_name")]
 
     def __str__(self):
         return f"{self.name}: {self.quantity} - {self.price}"
+
+
+class ArchivedMonth(StoreScopedModel):
+    """Representa um mês cujas movimentações de uma loja foram movidas para o arquivo.
+
+    Guarda os totais do mês, calculados antes do arquivamento, para que os indicadores
+    não precisem consultar o arquivo.
+
+    Atributes:
+        month (date): Primeiro dia do mês.
+        movements (int): Quantidade de movimentações arquivadas.
+        inflow_value (Decimal): Soma das entradas.
+        outflow_value (Decimal): Soma das saídas.
+        archived_at (timestamp): Data do último arquivamento do mês.
+    """
+
+    month = models.DateField()
+    movements = models.PositiveIntegerField(default=0)
+    inflow_value = models.DecimalField(default=0, max_digits=14, decimal_places=2)
+    outflow_value = models.DecimalField(default=0, max_digits=14, decimal_places=2)
+    archived_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["store", "month"], name="unique_archived_month_per_store"),
+            models.UniqueConstraint(
+                fields=["month"], condition=models.Q(store=None), name="unique_archived_month_without_store"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%m/%Y}: {self.movements}"
+
+
+class ReportArtifact(StoreScopedModel):
+    """Relatório pré-gerado de um período fechado (dia, semana ou mês), gravado em disco.
+
+    A versão muda sempre que uma movimentação do período é registrada ou removida, e o
+    arquivo (com a versão no nome) só é servido enquanto foi gerado na versão atual.
+
+    Atributes:
+        kind (str): Tipo de período (daily/weekly/monthly).
+        start (date): Primeiro dia do período.
+        end (date): Último dia do período.
+        version (int): Versão dos dados do período.
+        generated_version (int): Versão do arquivo gerado (vazia se ainda não foi gerado).
+        generated_at (timestamp): Data da última geração.
+        store (Store): Loja do relatório (vazia para o relatório de todas as lojas).
+    """
+
+    KINDS = [("daily", "Diário"), ("weekly", "Semanal"), ("monthly", "Mensal")]
+
+    kind = models.CharField(max_length=10, choices=KINDS)
+    start = models.DateField()
+    end = models.DateField()
+    version = models.PositiveIntegerField(default=0)
+    generated_version = models.PositiveIntegerField(null=True, blank=True)
+    generated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["store", "kind", "start"], name="unique_report_per_store"),
+            models.UniqueConstraint(
+                fields=["kind", "start"], condition=models.Q(store=None), name="unique_report_without_store"
+            ),
+        ]
+        # Invalidação: relatórios cujo período contém a data da movimentação
+        indexes = [models.Index(fields=["start", "end"], name="report_period")]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.start:%d/%m/%Y}: v{self.version}"
+
+    @property
+    def fresh(self) -> bool:
+        return self.generated_version == self.version
@@ -0,0 +1,234 @@
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.timezone import localdate, make_aware
+
+from core.routers import current_store
+from stock import units
+
+from .archive import add_months, movements_between, recipe_consumption
+from .models import ReportArtifact
+
+
+def render_report(start_dt: datetime, end_dt: datetime, period: str) -> bytes:
+    """Gera o PDF do relatório de movimentações do período.
+
+    Args:
+        start_dt (datetime): Início do período.
+        end_dt (datetime): Fim do período.
+        period (str): Período exibido no cabeçalho.
+
+    Returns:
+        bytes: Conteúdo do PDF.
+    """
+
+    # Importado só ao gerar um PDF: o fpdf (com o fontTools) é a dependência mais lenta
+    # de importar e deixaria mais lenta a inicialização de todo worker
+    from fpdf import FPDF
+
+    # prefetch_related para realizar apenas uma busca por todos os dados que atendem ao filtro
+    movements = movements_between(start_dt, end_dt, "ingredients", "products")
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(200, 10, txt="Relatório de Movimentações", ln=True, align="C")
+    pdf.set_font("Arial", size=10)
+    pdf.cell(200, 10, f"Período: {period}", ln=True, align="C")
+    pdf.ln(5)
+
+    total_in = 0
+    total_out = 0
+
+    for movement in movements:
+        pdf.set_font("Arial", "B", 12)
+        pdf.cell(0, 10, f"{movement.get_type_display()} - {movement.date.strftime('%d/%m/%Y %H:%M')}", ln=True)
+        pdf.set_font("Arial", size=10)
+        pdf.cell(0, 8, f"Responsável: {movement.user}", ln=True)
+        pdf.cell(
+            0,
+            8,
+            f"Valor total: R$ {movement.value:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
+            ln=True,
+        )
+
+        pdf.ln(2)
+        if movement.type == "in":
+            total_in += movement.value
+            pdf.set_font("Arial", "B", 10)
+            pdf.cell(60, 8, "Nome", border=1)
+            pdf.cell(40, 8, "Quantidade", border=1)
+            pdf.cell(30, 8, "Medida", border=1)
+            pdf.cell(40, 8, "Preço (R$)", border=1)
+            pdf.ln()
+
+            for ing in movement.ingredients.all():
+                pdf.set_font("Arial", size=10)
+                pdf.cell(60, 8, ing.name, border=1)
+                pdf.cell(40, 8, f"{ing.quantity}", border=1)
+                pdf.cell(30, 8, ing.get_measure_display(), border=1)
+                pdf.cell(40, 8, f"{ing.price:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."), border=1)
+                pdf.ln()
+        else:
+            total_out += movement.value
+            pdf.set_font("Arial", "B", 10)
+            pdf.cell(60, 8, "Nome", border=1)
+            pdf.cell(40, 8, "Quantidade", border=1)
+            pdf.cell(40, 8, "Preço (R$)", border=1)
+            pdf.ln()
+
+            for prod in movement.products.all():
+                pdf.set_font("Arial", size=10)
+                pdf.cell(60, 8, prod.name, border=1)
+                pdf.cell(40, 8, f"{prod.quantity}", border=1)
+                pdf.cell(40, 8, f"{prod.price:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."), border=1)
+                pdf.ln()
+
+        pdf.ln(5)  # espaço entre movimentos
+
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 10, "Resumo Financeiro", ln=True)
+
+    pdf.set_font("Arial", size=10)
+    pdf.cell(
+        0, 8, f"Total de Entradas: R$ {total_in:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."), ln=True
+    )
+    pdf.cell(
+        0, 8, f"Total de Saídas:   R$ {total_out:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."), ln=True
+    )
+
+    consumption = recipe_consumption(start_dt, end_dt)
+    if consumption:
+        pdf.ln(5)
+        pdf.set_font("Arial", "B", 12)
+        pdf.cell(0, 10, "Consumo de Ingredientes (receitas)", ln=True)
+        pdf.set_font("Arial", "B", 10)
+        pdf.cell(60, 8, "Nome", border=1)
+        pdf.cell(40, 8, "Quantidade", border=1)
+        pdf.cell(30, 8, "Medida", border=1)
+        pdf.ln()
+        pdf.set_font("Arial", size=10)
+        for row in consumption:
+            pdf.cell(60, 8, row["name"], border=1)
+            pdf.cell(40, 8, f"{row['quantity']:,.3f}".replace(",", "X").replace(".", ",").replace("X", "."), border=1)
+            pdf.cell(30, 8, units.label(row["measure"]), border=1)
+            pdf.ln()
+
+    return bytes(pdf.output(dest="S"))
+
+
+def period_range(kind: str, day: date) -> tuple[date, date]:
+    """Primeiro e último dia do período (dia, semana de segunda a domingo ou mês) que contém day."""
+
+    match kind:
+        case "daily":
+            return day, day
+        case "weekly":
+            start = day - timedelta(days=day.weekday())
+            return start, start + timedelta(days=6)
+        case "monthly":
+            start = day.replace(day=1)
+            return start, add_months(start, 1) - timedelta(days=1)
+    raise ValueError(f"Período inválido: {kind}")
+
+
+def last_closed(kind: str, today: date | None = None) -> date:
+    """Início do último período fechado (ontem, a semana passada ou o mês passado)."""
+
+    today = today or localdate()
+    start, _ = period_range(kind, today)
+    return period_range(kind, start - timedelta(days=1))[0]
+
+
+def artifact_path(artifact: ReportArtifact) -> Path:
+    """Arquivo do relatório, com a versão dos dados no nome."""
+
+    folder = f"s{artifact.store_id}" if artifact.store_id else "all"
+    name = f"{artifact.kind}-{artifact.start:%Y-%m-%d}-v{artifact.version}.pdf"
+    return Path(settings.REPORT_DIR) / folder / name
+
+
+def get_artifact(kind: str, start: date) -> ReportArtifact:
+    """Registro do relatório do período na loja atual (None: todas as lojas)."""
+
+    store = current_store.get()
+    start, end = period_range(kind, start)
+    # _base_manager: o relatório da matriz (sem loja) não pode trazer os das lojas
+    artifact, _ = ReportArtifact._base_manager.get_or_create(
+        store_id=store.id if store else None, kind=kind, start=start, defaults={"end": end}
+    )
+    return artifact
+
+
+def build_artifact(artifact: ReportArtifact) -> Path:
+    """Gera e grava o relatório, removendo os arquivos de versões anteriores.
+
+    O arquivo é escrito em um temporário e renomeado, então uma leitura simultânea nunca
+    encontra um PDF pela metade. Se uma movimentação do período mudar durante a geração,
+    a versão do registro já é outra e o arquivo não é marcado como gerado.
+    """
+
+    start_dt = make_aware(datetime.combine(artifact.start, time.min))
+    end_dt = make_aware(datetime.combine(artifact.end, time.max))
+    content = render_report(start_dt, end_dt, f"{artifact.start:%d/%m/%Y} até {artifact.end:%d/%m/%Y}")
+
+    path = artifact_path(artifact)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix(".tmp")
+    temporary.write_bytes(content)
+    temporary.replace(path)
+    for old in path.parent.glob(f"{artifact.kind}-{artifact.start:%Y-%m-%d}-v*.pdf"):
+        if old != path:
+            old.unlink(missing_ok=True)
+
+    now = timezone.now()
+    ReportArtifact._base_manager.filter(id=artifact.id, version=artifact.version).update(
+        generated_version=artifact.version, generated_at=now
+    )
+    artifact.generated_version, artifact.generated_at = artifact.version, now
+    return path
+
+
+def report_file(kind: str, start: date) -> tuple[ReportArtifact, Path]:
+    """Relatório do período, gerado agora apenas se ainda não existe na versão atual."""
+
+    artifact = get_artifact(kind, start)
+    path = artifact_path(artifact)
+    if not artifact.fresh or not path.exists():
+        path = build_artifact(artifact)
+    return artifact, path
+
+
+def generate_closed_reports(today: date | None = None) -> list[ReportArtifact]:
+    """Gera os relatórios do último dia, semana e mês fechados que estão desatualizados.
+
+    Returns:
+        list: Relatórios gerados.
+    """
+
+    generated = []
+    for kind, _ in ReportArtifact.KINDS:
+        artifact = get_artifact(kind, last_closed(kind, today))
+        if not artifact.fresh or not artifact_path(artifact).exists():
+            build_artifact(artifact)
+            generated.append(artifact)
+    return generated
+
+
+def invalidate_reports(movement) -> int:
+    """Muda a versão dos relatórios dos períodos que contêm a movimentação.
+
+    Vale para os relatórios da loja da movimentação e para os de todas as lojas. O
+    arquivo antigo continua em disco até a próxima geração, mas não é mais servido.
+
+    Returns:
+        int: Quantidade de relatórios invalidados.
+    """
+
+    day = localdate(movement.date)
+    return ReportArtifact._base_manager.filter(
+        Q(store_id=movement.store_id) | Q(store_id=None), start__lte=day, end__gte=day
+    ).update(version=F("version") + 1)
@@ -3,11 +3,25 @@ from decimal import Decimal, InvalidOperation
 
 from django.core.exceptions import ValidationError
 from django.db import transaction
-from django.utils.timezone import is_naive, make_aware
-
-from stock.models import Ingredient, Product
+from django.template.defaultfilters import floatformat
+from django.urls import reverse
+from django.utils.formats import date_format, localize
+from django.utils.timezone import is_naive, localtime, make_aware
+
+from core import metrics
+from core.live import publish
+from core.decorators import retry_on_lock, store_atomic
+from core.routers import store_db
+from core.versioning import bump_version
+from stock import units
+from stock.lots import create_lots, parse_expiry, trim_lots
+from stock.models import Ingredient, Pack, Product, ProductIngredient
+from stock.services import publish_recipe
+from stock.sync import log_changes
+from stores.services import record_store_movement
 
 from .models import Movement, MovementInflow, MovementOutflow
+from .reports import invalidate_reports
 
 
 def format_period(start: str, end: str) -> tuple[datetime, datetime]:
@@ -34,28 +48,6 @@ def format_period(start: str, end: str) -> tuple[datetime, datetime]:
         raise
 
 
-def convert_measures(qte: Decimal, origin: str, destiny: str) -> Decimal:
-    """Converte Gramas em Kg e vice versa.
-
-    Args:
-        qte (Decimal): Quantidade a ser convertida.
-        origin (str): Unidade de medida inserida na transação.
-        destiny (str): Unidade de medida do item.
-
-    Returns:
-        Decimal: Número convertido.
-    """
-
-    factors = {
-        ("g", "kg"): lambda x: x / 1000,
-        ("kg", "g"): lambda x: x * 1000,
-        ("g", "g"): lambda x: x,
-        ("kg", "kg"): lambda x: x,
-        ("unit", "unit"): lambda x: x,
-    }
-    return factors[(origin, destiny)](qte)
-
-
 def parse_value_br(value: str, name: str) -> tuple[Decimal | None, list[str]]:
     """Converte valor no formato brasileiro (1.234,56) para Decimal no padrão internacional (1234.56).
 
@@ -82,7 +74,177 @@ def parse_value_br(value: str, name: str) -> tuple[Decimal | None, list[str]]:
     return value, []
 
 
-@transaction.atomic
+def inflow_quantity(qte: Decimal, measure: str, ingredient: Ingredient, packs: dict[int, Pack]) -> Decimal:
+    """Converte a quantidade informada na entrada para a unidade do ingrediente.
+
+    A conversão é feita uma única vez, na leitura do formulário: o item da entrada é
+    gravado na unidade do ingrediente, então relatórios e contagens somam as entradas
+    sem misturar unidades.
+
+    Args:
+        qte (Decimal): Quantidade informada.
+        measure (str): Unidade informada (ver stock.units) ou embalagem ("pack-<id>").
+        ingredient (Ingredient): Ingrediente recebido.
+        packs (dict): Embalagens dos ingredientes da entrada, indexadas pelo id.
+
+    Returns:
+        Decimal: Quantidade na unidade do ingrediente.
+
+    Raises:
+        ValidationError: Se a unidade é de outra grandeza ou a embalagem não é do ingrediente.
+    """
+
+    if not measure.startswith(units.PACK_PREFIX):
+        return units.convert(qte, measure, ingredient.measure)
+
+    pack_id = measure.removeprefix(units.PACK_PREFIX)
+    pack = packs.get(int(pack_id)) if pack_id.isdigit() else None
+    if pack is None or pack.ingredient_id != ingredient.id:
+        raise ValidationError(f"Embalagem inválida para {ingredient.name}")
+    return qte * pack.quantity
+
+
+def ingredient_quantity(ingredient: Ingredient) -> str:
+    # Mesmo formato da lista de ingredientes e dos alertas da página inicial
+    qte = localize(ingredient.qte) if ingredient.fractional else floatformat(ingredient.qte, 0)
+    return f"{qte} {ingredient.get_measure_display()}"
+
+
+def movement_event(movement: Movement, ingredients=(), previous: dict | None = None, sign: int = 1) -> dict:
+    """Monta as variações enviadas às páginas abertas quando a movimentação é registrada ou removida.
+
+    Args:
+        movement (Movement): Movimentação.
+        ingredients (list): Ingredientes com o estoque alterado pela movimentação.
+        previous (dict): Estoque de cada ingrediente antes da movimentação.
+        sign (int): 1 para registro, -1 para exclusão.
+
+    Returns:
+        dict: count e net (variação do total de movimentações e do faturamento), movement,
+            ingredients (estoque atual formatado), alerts (ingredientes abaixo do mínimo) e
+            restored (ingredientes que voltaram ao mínimo).
+    """
+
+    net = movement.value if movement.type == "out" else -movement.value
+    quantities, alerts, restored = {}, [], []
+    for ingredient in ingredients:
+        quantity = ingredient_quantity(ingredient)
+        quantities[ingredient.id] = quantity
+        if ingredient.qte < ingredient.min_qte:
+            alerts.append({"id": ingredient.id, "text": f"{ingredient.name} abaixo do mínimo ({quantity})"})
+        elif previous[ingredient.id] < ingredient.min_qte:
+            restored.append(ingredient.id)
+
+    return {
+        "type": "movement",
+        "count": sign,
+        "net": str(sign * net),
+        "movement": {
+            "id": movement.id,
+            "deleted": sign < 0,
+            "type": movement.type,
+            "type_display": movement.get_type_display(),
+            "value": localize(movement.value),
+            "date": date_format(localtime(movement.date), "d/m/Y H:i:s"),
+            "url": reverse("movement_detail", args=[movement.id]),
+        },
+        "ingredients": quantities,
+        "alerts": alerts,
+        "restored": restored,
+    }
+
+
+def record_movement(
+    movement: Movement, rows: int, ingredients=(), previous: dict | None = None, store_day: bool = True
+) -> None:
+    """Atualiza as métricas de negócio e os totais da loja depois do commit da movimentação
+    e publica as variações para as páginas abertas.
+
+    Args:
+        movement (Movement): Movimentação registrada.
+        rows (int): Linhas gravadas (movimentação, itens e ingredientes alterados).
+        ingredients (list): Ingredientes com o estoque alterado.
+        previous (dict): Estoque de cada ingrediente antes da movimentação.
+        store_day (bool): Se os totais da loja ainda precisam ser atualizados.
+    """
+
+    metrics.MOVEMENTS.labels(movement.type).inc()
+    metrics.MOVEMENT_ROWS.labels(movement.type).observe(rows)
+    if store_day:
+        record_store_movement(movement)
+    publish(movement.store_id, movement_event(movement, ingredients, previous))
+
+
+def commit_movement(movement: Movement, rows: int, ingredients, previous: dict) -> None:
+    """Agenda o record_movement para depois do commit da movimentação.
+
+    Com a loja no banco "default" os totais da loja são gravados na própria transação. Em
+    outro banco ficam para depois do commit, já que não há transação entre os dois bancos.
+    O hook é robust: um erro nele (ex: banco travado) é registrado no log e não chega ao
+    retry_on_lock, que registraria a movimentação, já gravada, outra vez.
+    """
+
+    using = store_db()
+    in_transaction = using == "default"
+    if in_transaction:
+        record_store_movement(movement)
+    invalidate_reports(movement)
+
+    transaction.on_commit(
+        lambda: record_movement(movement, rows, ingredients, previous, store_day=not in_transaction),
+        using=using,
+        robust=True,
+    )
+
+
+@retry_on_lock()
+@store_atomic
+def delete_movement(movement: Movement) -> None:
+    """Remove a movimentação e desconta o valor dela dos totais da loja.
+
+    Como no commit_movement, com a loja no banco "default" os totais são corrigidos na
+    própria transação, e em outro banco depois do commit. Os relatórios e as páginas
+    abertas só são avisados depois do commit, então uma exclusão desfeita não muda nada.
+    """
+
+    # O delete limpa o id da movimentação, usado no link enviado às páginas abertas
+    event = movement_event(movement, sign=-1)
+    movement.delete()
+
+    using = store_db()
+    in_transaction = using == "default"
+    if in_transaction:
+        record_store_movement(movement, sign=-1)
+
+    def deleted():
+        if not in_transaction:
+            record_store_movement(movement, sign=-1)
+        invalidate_reports(movement)
+        publish(movement.store_id, event)
+
+    transaction.on_commit(deleted, using=using, robust=True)
+
+
+def lock_ingredients(ingredients_ids) -> dict[int, Ingredient]:
+    """Busca os ingredientes travando as linhas (SELECT ... FOR UPDATE) até o fim da transação.
+
+    As linhas são travadas sempre na ordem do id para que dois terminais alterando os
+    mesmos ingredientes não entrem em deadlock. No SQLite o select_for_update é ignorado,
+    já que a escrita trava o banco inteiro.
+
+    Args:
+        ingredients_ids (list): Identificadores dos ingredientes.
+
+    Returns:
+        dict: Ingredientes indexados pelo id.
+    """
+
+    ingredients = Ingredient.objects.select_for_update().filter(id__in=ingredients_ids).order_by("id")
+    return {ingredient.id: ingredient for ingredient in ingredients}
+
+
+@retry_on_lock()
+@store_atomic
 def create_inflow(data: dict, username: str) -> None:
     """Valida e cria uma movimentação de entrada de ingredientes.
 
@@ -97,14 +259,22 @@ def create_inflow(data: dict, username: str) -> None:
 
     errors = []
     ingredients_to_add = []
+    lots = []
     value = Decimal("0")
 
     ingredients_ids = data.getlist("ingredients")
     if not ingredients_ids:
         raise ValidationError(["Selecione ao menos 1 ingrediente"])
 
+    ingredients = lock_ingredients(ingredients_ids)
+    previous = {ingredient.id: ingredient.qte for ingredient in ingredients.values()}
+
+    packs = {}
+    if any(data.get(f"m-{ingredient_id}", "").startswith(units.PACK_PREFIX) for ingredient_id in ingredients_ids):
+        packs = Pack.objects.filter(ingredient_id__in=ingredients_ids).in_bulk()
+
     for ingredient_id in ingredients_ids:
-        ingredient = Ingredient.objects.get(pk=ingredient_id)
+        ingredient = ingredients[int(ingredient_id)]
 
         qte_to_add, qte_errors = parse_value_br(data[f"qi-{ingredient_id}"], ingredient.name)
 
@@ -114,16 +284,26 @@ def create_inflow(data: dict, username: str) -> None:
             errors.extend(qte_errors + price_errors)
             continue
 
-        measure = data[f"m-{ingredient_id}"]
-        ingredient.qte += convert_measures(qte_to_add, measure, ingredient.measure)
+        try:
+            qte_to_add = inflow_quantity(qte_to_add, data[f"m-{ingredient_id}"], ingredient, packs)
+            expires_on = parse_expiry(data.get(f"v-{ingredient_id}"), ingredient.name)
+        except ValidationError as e:
+            errors.extend(e.messages)
+            continue
+        ingredient.qte += qte_to_add
 
-        ingredients_to_add.append((ingredient, qte_to_add, price, measure))
+        ingredients_to_add.append((ingredient, qte_to_add, price))
+        lots.append((ingredient, qte_to_add, expires_on))
         value += price
 
     if errors:
         raise ValidationError(errors)
 
     Ingredient.objects.bulk_update([i[0] for i in ingredients_to_add], ["qte"])
+    # bulk_update não dispara sinais
+    bump_version("stock")
+    log_changes([i[0] for i in ingredients_to_add])
+    create_lots(lots)
 
     movement = Movement.objects.create(
         user=username,
@@ -132,17 +312,23 @@ def create_inflow(data: dict, username: str) -> None:
         commentary=data["commentary"],
     )
 
-    for ingredient, qte_added, price, measure in ingredients_to_add:
+    for ingredient, qte_added, price in ingredients_to_add:
         MovementInflow.objects.create(
             movement=movement,
+            ingredient=ingredient,
             name=ingredient.name,
             quantity=qte_added,
             price=price,
-            measure=measure,
+            measure=ingredient.measure,
         )
 
+    rows = 1 + 3 * len(ingredients_to_add)
+    changed = list({ingredient.id: ingredient for ingredient, *_ in ingredients_to_add}.values())
+    commit_movement(movement, rows, changed, previous)
+
 
-@transaction.atomic
+@retry_on_lock()
+@store_atomic
 def create_outflow(data: dict, username: str) -> None:
     """Valida e cria uma movimentação de saida de produtos.
 
@@ -163,9 +349,23 @@ def create_outflow(data: dict, username: str) -> None:
     if not products_ids:
         raise ValidationError(["Selecione ao menos 1 produto"])
 
+    products = Product.objects.in_bulk(products_ids)
+    # Produtos cadastrados antes das versões de receita recebem a primeira na venda
+    for product in products.values():
+        if product.recipe_id is None:
+            publish_recipe(product)
+
+    recipes = {}
+    for recipe_item in ProductIngredient.objects.filter(product_id__in=products_ids):
+        recipes.setdefault(recipe_item.product_id, []).append(recipe_item)
+
+    ingredients = lock_ingredients({item.ingredient_id for items in recipes.values() for item in items})
+    previous = {ingredient.id: ingredient.qte for ingredient in ingredients.values()}
+    ingredients_to_reduce = {}
+
     for product_id in products_ids:
-        product = Product.objects.get(pk=product_id)
-        ingredients_to_reduce = []
+        product = products[int(product_id)]
+        remaining_qte = {}
         product_errors = []
 
         quantity, qte_error = parse_value_br(data[f"qp-{product_id}"], product.name)
@@ -175,16 +375,15 @@ def create_outflow(data: dict, username: str) -> None:
             continue
 
         if quantity:
-            for recipe_item in product.productingredient_set.all():
-                ingredient = recipe_item.ingredient
+            for recipe_item in recipes.get(product.id, []):
+                ingredient = ingredients[recipe_item.ingredient_id]
                 decrease_qte = recipe_item.quantity * quantity
                 remaining = ingredient.qte - decrease_qte
 
                 if remaining < 0:
                     product_errors.append(f"Estoque insuficiente para o ingrediente {ingredient.name}!")
                 else:
-                    ingredient.qte = remaining
-                    ingredients_to_reduce.append(ingredient)
+                    remaining_qte[ingredient] = remaining
 
         if product_errors:
             errors.extend(product_errors)
@@ -193,12 +392,22 @@ def create_outflow(data: dict, username: str) -> None:
         value = product.price * quantity
         total_value += value
 
-        Ingredient.objects.bulk_update(ingredients_to_reduce, ["qte"])
-        products_sold.append((product.name, quantity, value))
+        for ingredient, remaining in remaining_qte.items():
+            ingredient.qte = remaining
+            ingredients_to_reduce[ingredient.id] = ingredient
+
+        products_sold.append((product, quantity, value))
 
     if errors:
+        metrics.STOCK_REJECTIONS.inc()
         raise ValidationError(errors)
 
+    Ingredient.objects.bulk_update(ingredients_to_reduce.values(), ["qte"])
+    # bulk_update não dispara sinais
+    bump_version("stock")
+    log_changes(ingredients_to_reduce.values())
+    trim_lots(ingredients_to_reduce.values(), previous)
+
     movement = Movement.objects.create(
         user=username,
         value=total_value,
@@ -206,10 +415,15 @@ def create_outflow(data: dict, username: str) -> None:
         commentary=data["commentary"],
     )
 
-    for name, quantity, price in products_sold:
+    for product, quantity, price in products_sold:
         MovementOutflow.objects.create(
             movement=movement,
-            name=name,
+            name=product.name,
             quantity=quantity,
             price=price,
+            recipe_id=product.recipe_id,
         )
+
+    rows = 1 + len(products_sold) + len(ingredients_to_reduce)
+    changed = list(ingredients_to_reduce.values())
+    commit_movement(movement, rows, changed, previous)
@@ -1,3 +1,441 @@
-from django.test import TestCase
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import OperationalError, connection
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.timezone import localdate
+
+from core.decorators import retry_on_lock
+from stock.models import Ingredient, Pack, Product, ProductIngredient
+from stores.models import Store, StoreDay
+from stores.services import using_store
+
+from .archive import archive_db, archive_month, create_archive, get_movement, movements_between, month_range
+from .filters import facets, filter_movements, parse_filters, sort_movements
+from .models import ArchivedMonth, Movement, MovementInflow, MovementOutflow, ReportArtifact
+from .reports import generate_closed_reports, invalidate_reports, last_closed, period_range
+from .services import create_inflow, create_outflow, lock_ingredients
+
+
+def outflow_data(products: dict) -> QueryDict:
+    """Monta o POST do formulário de saída ({produto: quantidade})."""
+
+    data = QueryDict(mutable=True)
+    data.setlist("products", [str(product.id) for product in products])
+    for product, quantity in products.items():
+        data[f"qp-{product.id}"] = quantity
+    data["commentary"] = ""
+    return data
+
+
+class CreateOutflowTests(TestCase):
+    def setUp(self):
+        self.cheese = Ingredient.objects.create(name="Queijo", measure="kg", qte=Decimal("1.000"), min_qte=0)
+        self.pizza = Product.objects.create(name="Pizza", price=Decimal("40.00"))
+        ProductIngredient.objects.create(product=self.pizza, ingredient=self.cheese, quantity=Decimal("0.300"))
+
+    def test_reduces_stock(self):
+        create_outflow(outflow_data({self.pizza: "3"}), "caixa")
+
+        self.cheese.refresh_from_db()
+        self.assertEqual(self.cheese.qte, Decimal("0.100"))
+        movement = Movement.objects.get()
+        self.assertEqual((movement.type, movement.value), ("out", Decimal("120.00")))
+        self.assertEqual(MovementOutflow.objects.get().quantity, 3)
+
+    def test_rejects_insufficient_stock(self):
+        with self.assertRaisesMessage(ValidationError, "Estoque insuficiente para o ingrediente Queijo!"):
+            create_outflow(outflow_data({self.pizza: "4"}), "caixa")
+
+        self.cheese.refresh_from_db()
+        self.assertEqual(self.cheese.qte, Decimal("1.000"))
+        self.assertFalse(Movement.objects.exists())
+
+    def test_locks_ingredients(self):
+        with CaptureQueriesContext(connection) as queries:
+            ingredients = lock_ingredients([self.cheese.id])
+
+        self.assertEqual(ingredients, {self.cheese.id: self.cheese})
+        if connection.features.has_select_for_update:
+            self.assertIn("FOR UPDATE", queries[0]["sql"])
+
+    def test_store_totals_are_written_with_the_movement(self):
+        store = Store.objects.create(name="Centro", code="centro")
+        with using_store(store):
+            cheese = Ingredient.objects.create(name="Queijo", measure="kg", qte=Decimal("1.000"), min_qte=0)
+            pizza = Product.objects.create(name="Pizza", price=Decimal("40.00"))
+            ProductIngredient.objects.create(product=pizza, ingredient=cheese, quantity=Decimal("0.300"))
+
+            # Mesmo banco: os totais são gravados antes do commit, sem depender do on_commit
+            with self.captureOnCommitCallbacks() as callbacks:
+                create_outflow(outflow_data({pizza: "1"}), "caixa")
+
+        day = StoreDay.objects.get(store=store)
+        self.assertEqual((day.movements, day.outflow_value), (1, Decimal("40.00")))
+        self.assertEqual(Movement.objects.get(store=store).store_id, store.id)
+        self.assertTrue(callbacks)
+
+
+class CreateInflowTests(TestCase):
+    def test_converts_measure(self):
+        flour = Ingredient.objects.create(name="Farinha", measure="kg", qte=Decimal("1.000"), min_qte=0)
+        data = QueryDict(mutable=True)
+        data.setlist("ingredients", [str(flour.id)])
+        data.update({f"qi-{flour.id}": "500", f"pi-{flour.id}": "10,00", f"m-{flour.id}": "g", "commentary": ""})
+
+        create_inflow(data, "estoquista")
+
+        flour.refresh_from_db()
+        self.assertEqual(flour.qte, Decimal("1.500"))
+        self.assertEqual(Movement.objects.get().value, Decimal("10.00"))
+        # O item é gravado na unidade do ingrediente
+        inflow = MovementInflow.objects.get()
+        self.assertEqual((inflow.quantity, inflow.measure), (Decimal("0.500"), "kg"))
+
+    def inflow_data(self, ingredient: Ingredient, quantity: str, measure: str) -> QueryDict:
+        data = QueryDict(mutable=True)
+        data.setlist("ingredients", [str(ingredient.id)])
+        data.update({f"qi-{ingredient.id}": quantity, f"pi-{ingredient.id}": "10,00", f"m-{ingredient.id}": measure})
+        data["commentary"] = ""
+        return data
+
+    def test_pack_is_normalized(self):
+        dough = Ingredient.objects.create(name="Massa", measure="unit", qte=Decimal("5"), min_qte=0)
+        box = Pack.objects.create(ingredient=dough, name="Caixa", quantity=Decimal("12"))
+
+        create_inflow(self.inflow_data(dough, "2", f"pack-{box.id}"), "estoquista")
+
+        dough.refresh_from_db()
+        self.assertEqual(dough.qte, Decimal("29"))
+        inflow = MovementInflow.objects.get()
+        self.assertEqual((inflow.quantity, inflow.measure), (Decimal("24"), "unit"))
+
+    def test_rejects_other_dimension(self):
+        dough = Ingredient.objects.create(name="Massa", measure="unit", qte=Decimal("5"), min_qte=0)
+
+        with self.assertRaisesMessage(ValidationError, "Não é possível converter Quilos em Unidades"):
+            create_inflow(self.inflow_data(dough, "2", "kg"), "estoquista")
+        self.assertFalse(Movement.objects.exists())
+
+
+class RetryOnLockTests(SimpleTestCase):
+    def locked_function(self, failures: int, message: str = "database is locked"):
+        calls = []
+
+        @retry_on_lock(attempts=3)
+        def function():
+            calls.append(1)
+            if len(calls) <= failures:
+                raise OperationalError(message)
+            return "ok"
+
+        return function, calls
+
+    @mock.patch("core.decorators.time.sleep")
+    def test_retries_until_the_lock_is_released(self, sleep):
+        function, calls = self.locked_function(failures=2)
+
+        self.assertEqual(function(), "ok")
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    @mock.patch("core.decorators.time.sleep")
+    def test_gives_up_after_the_last_attempt(self, sleep):
+        function, calls = self.locked_function(failures=3)
+
+        with self.assertRaises(OperationalError):
+            function()
+        self.assertEqual(len(calls), 3)
+
+    @mock.patch("core.decorators.time.sleep")
+    def test_other_errors_are_not_retried(self, sleep):
+        function, calls = self.locked_function(failures=1, message="no such table")
+
+        with self.assertRaises(OperationalError):
+            function()
+        self.assertEqual(len(calls), 1)
+
+
+class RetryInsideTransactionTests(TestCase):
+    @mock.patch("core.decorators.time.sleep")
+    def test_outer_transaction_is_not_retried(self, sleep):
+        # O TestCase roda cada teste em uma transação: repetir só a parte interna não é possível
+        calls = []
+
+        @retry_on_lock()
+        def function():
+            calls.append(1)
+            raise OperationalError("database is locked")
+
+        with self.assertRaises(OperationalError):
+            function()
+        self.assertEqual(len(calls), 1)
+        sleep.assert_not_called()
+
+
+class DeleteMovementTests(TestCase):
+    def setUp(self):
+        from accounts.tests import create_user
+
+        self.store = Store.objects.create(name="Centro", code="centro")
+        self.client.force_login(create_user("admin", store=self.store))
+        with using_store(self.store):
+            cheese = Ingredient.objects.create(name="Queijo", measure="kg", qte=Decimal("1.000"), min_qte=0)
+            pizza = Product.objects.create(name="Pizza", price=Decimal("40.00"))
+            ProductIngredient.objects.create(product=pizza, ingredient=cheese, quantity=Decimal("0.300"))
+            create_outflow(outflow_data({pizza: "1"}), "caixa")
+        self.movement = Movement.objects.get(store=self.store)
+
+    def delete(self):
+        return self.client.post(reverse("movement_delete", args=[self.movement.id]), {"password": "senha-forte"})
+
+    @mock.patch("movements.services.invalidate_reports")
+    @mock.patch("movements.services.publish")
+    def test_notifies_after_commit(self, publish, invalidate_reports):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertRedirects(self.delete(), reverse("movement_list"))
+
+        day = StoreDay.objects.get(store=self.store)
+        self.assertEqual((day.movements, day.outflow_value), (0, Decimal("0.00")))
+        publish.assert_not_called()
+        invalidate_reports.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+        invalidate_reports.assert_called_once()
+        store_id, event = publish.call_args.args
+        self.assertEqual((store_id, event["movement"]["id"]), (self.store.id, self.movement.id))
+
+    def test_failed_rollup_keeps_the_movement(self):
+        with mock.patch("movements.services.record_store_movement", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError), self.assertLogs("django.request", "ERROR"):
+                self.delete()
+
+        self.assertTrue(Movement.objects.filter(id=self.movement.id).exists())
+
+
+class MovementFilterTests(TestCase):
+    def setUp(self):
+        self.cheap = Movement.objects.create(user="Ana", type="in", value=Decimal("10.00"))
+        MovementInflow.objects.create(movement=self.cheap, name="Queijo", quantity=1, price=10, measure="kg")
+        self.big = Movement.objects.create(user="Bruno", type="out", value=Decimal("80.00"))
+        MovementOutflow.objects.create(movement=self.big, name="Pizza", quantity=2, price=80)
+        self.medium = Movement.objects.create(user="Ana", type="out", value=Decimal("40.00"))
+        MovementOutflow.objects.create(movement=self.medium, name="Calzone", quantity=1, price=40)
+
+    def movements(self, **params) -> list:
+        filters = parse_filters(params)
+        return list(sort_movements(filter_movements(Movement.objects.all(), filters), filters["sort"]))
+
+    def test_filters(self):
+        self.assertEqual(self.movements(type="out", sort="date"), [self.big, self.medium])
+        self.assertEqual(self.movements(user="Ana", sort="date"), [self.cheap, self.medium])
+        self.assertEqual(self.movements(item="Queijo"), [self.cheap])
+        self.assertEqual(self.movements(item="Queijo", type="out"), [])
+        self.assertEqual(self.movements(min_value="20", max_value="50,00"), [self.medium])
+
+    def test_sorts_by_value(self):
+        self.assertEqual(self.movements(sort="-value"), [self.big, self.medium, self.cheap])
+
+    def test_invalid_filters(self):
+        with self.assertRaises(ValidationError) as context:
+            parse_filters({"type": "x", "min_value": "9", "max_value": "1", "sort": "user"})
+        self.assertEqual(len(context.exception.messages), 3)
+
+    def test_facets_in_one_query(self):
+        with self.assertNumQueries(1):
+            summary = facets(Movement.objects.all())
+
+        totals = {row["type"]: (row["count"], row["total"]) for row in summary}
+        self.assertEqual(totals, {"in": (1, Decimal("10.00")), "out": (2, Decimal("120.00"))})
+
+    def test_list_view(self):
+        from accounts.tests import create_user
+
+        self.client.force_login(create_user("admin"))
+        response = self.client.get(reverse("movement_list"), {"type": "out", "sort": "-value"})
+
+        self.assertEqual(list(response.context["page_obj"]), [self.big, self.medium])
+        self.assertEqual([row["count"] for row in response.context["facets"]()], [2])
+
+    def test_facets_cached_across_pages(self):
+        from accounts.tests import create_user
+
+        cache.clear()
+        self.client.force_login(create_user("admin"))
+        with mock.patch("movements.views.facets", wraps=facets) as summary:
+            for page in ("1", "2", "1"):
+                self.client.get(reverse("movement_list"), {"type": "out", "page": page})
+            self.assertEqual(summary.call_count, 1)
+
+            self.client.get(reverse("movement_list"), {"type": "in", "page": "2"})
+            self.assertEqual(summary.call_count, 2)
+
+
+@override_settings(REPORT_DIR=Path(tempfile.mkdtemp()))
+class ReportArtifactTests(TestCase):
+    def setUp(self):
+        from accounts.tests import create_user
+
+        self.client.force_login(create_user("admin"))
+        self.yesterday = localdate() - timedelta(days=1)
+        self.movement = Movement.objects.create(user="Ana", type="out", value=Decimal("10.00"))
+        Movement.objects.filter(id=self.movement.id).update(date=timezone.now() - timedelta(days=1))
+        self.movement.refresh_from_db()
+
+    def test_periods(self):
+        day = date(2026, 3, 18)
+        self.assertEqual(period_range("weekly", day), (date(2026, 3, 16), date(2026, 3, 22)))
+        self.assertEqual(period_range("monthly", day), (date(2026, 3, 1), date(2026, 3, 31)))
+        self.assertEqual(last_closed("monthly", day), date(2026, 2, 1))
+        self.assertEqual(last_closed("daily", day), date(2026, 3, 17))
+
+    def test_generated_once_and_served_with_cache_headers(self):
+        generate_closed_reports()
+
+        with mock.patch("movements.reports.render_report") as render_report:
+            response = self.client.get(reverse("report_artifact", args=["daily"]))
+        render_report.assert_not_called()
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertNotIn("max-age", response["Cache-Control"])
+
+        cached = self.client.get(reverse("report_artifact", args=["daily"]), HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        self.assertIn("no-cache", cached["Cache-Control"])
+        cached = self.client.get(
+            reverse("report_artifact", args=["daily"]), HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(cached.status_code, 304)
+
+    def test_deleting_a_movement_of_the_period_invalidates(self):
+        generate_closed_reports()
+        artifact = ReportArtifact.objects.get(kind="daily")
+
+        self.movement.delete()
+        invalidate_reports(self.movement)
+
+        artifact.refresh_from_db()
+        self.assertFalse(artifact.fresh)
+        self.assertIn("daily", [report.kind for report in generate_closed_reports()])
+
+    def test_other_periods_are_kept(self):
+        generate_closed_reports()
+        # Movimentação de hoje: fora do dia fechado
+        invalidate_reports(Movement.objects.create(user="Ana", type="out", value=Decimal("5.00")))
+
+        self.assertTrue(ReportArtifact.objects.get(kind="daily").fresh)
+
+    def test_open_period_is_not_served(self):
+        response = self.client.get(reverse("report_artifact", args=["daily"]), {"start": localdate().isoformat()})
+        self.assertEqual(response.status_code, 404)
+
+
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # O arquivo do mês é criado antes das transações do TestCase (o SQLite não altera
+        # tabelas dentro de uma) e participa delas, então cada teste começa com ele vazio
+        cls.enterClassContext(override_settings(ARCHIVE_DIR=Path(tempfile.mkdtemp())))
+        cls.month = (localdate().replace(day=1) - timedelta(days=150)).replace(day=1)
+        cls.databases = {"default", create_archive(cls.month)}
+        super().setUpClass()
+
+    def setUp(self):
+        self.centro = Store.objects.create(name="Centro", code="centro")
+        self.sul = Store.objects.create(name="Sul", code="sul")
+
+    def create(self, store: Store, type: str, value: str) -> Movement:
+        with using_store(store):
+            movement = Movement.objects.create(user="Ana", type=type, value=Decimal(value))
+        start, _ = month_range(self.month)
+        Movement.objects.filter(id=movement.id).update(date=start + timedelta(days=2))
+        movement.refresh_from_db()
+        return movement
+
+    def test_round_trip(self):
+        inflow = self.create(self.centro, "in", "30.00")
+        MovementInflow.objects.create(movement=inflow, name="Queijo", quantity=Decimal("1.500"), price=30, measure="kg")
+        outflow = self.create(self.centro, "out", "40.00")
+        MovementOutflow.objects.create(movement=outflow, name="Pizza", quantity=1, price=40)
+
+        self.assertEqual(archive_month(self.month), 2)
+
+        self.assertFalse(Movement.objects.exists())
+        self.assertFalse(MovementInflow.objects.exists())
+        archived = get_movement(inflow.id)
+        self.assertEqual(
+            (archived.date, archived.value, archived.store_id), (inflow.date, inflow.value, self.centro.id)
+        )
+        self.assertEqual(
+            [(item.name, item.quantity) for item in archived.ingredients.all()], [("Queijo", Decimal("1.5"))]
+        )
+        self.assertEqual(get_movement(outflow.id).products.get().name, "Pizza")
+
+    def test_rollups_per_store(self):
+        self.create(self.centro, "in", "30.00")
+        self.create(self.centro, "out", "40.00")
+        self.create(self.sul, "out", "25.00")
+
+        archive_month(self.month)
+
+        rollups = {
+            rollup.store_id: (rollup.movements, rollup.inflow_value, rollup.outflow_value)
+            for rollup in ArchivedMonth.objects.filter(month=self.month)
+        }
+        self.assertEqual(
+            rollups,
+            {
+                self.centro.id: (2, Decimal("30.00"), Decimal("40.00")),
+                self.sul.id: (1, Decimal("0.00"), Decimal("25.00")),
+            },
+        )
+
+    def test_rerun_does_not_duplicate(self):
+        movement = self.create(self.centro, "out", "40.00")
+        # Arquivamento interrompido depois da cópia, antes de remover as linhas
+        Movement.objects.using(archive_db(self.month)).bulk_create([movement])
+
+        self.assertEqual(archive_month(self.month), 1)
+        self.assertEqual(archive_month(self.month), 0)
+
+        self.assertEqual(ArchivedMonth.objects.get(month=self.month).movements, 1)
+        self.assertEqual(Movement.objects.using(archive_db(self.month)).count(), 1)
+
+    def test_movements_between_reads_archive(self):
+        archived = self.create(self.centro, "out", "40.00")
+        archive_month(self.month)
+        start, _ = month_range(self.month)
+        hot = Movement.objects.create(user="Ana", type="out", value=Decimal("10.00"))
+
+        movements = movements_between(start, timezone.now())
+
+        self.assertEqual([movement.id for movement in movements], [hot.id, archived.id])
+
+    def test_stocktake_counts_archived_inflows(self):
+        from stock.models import Stocktake, StocktakeLine
+        from stock.stocktake import apply_stocktake
+
+        cheese = Ingredient.objects.create(name="Queijo", measure="kg", qte=Decimal("10"), min_qte=0)
+        apply_stocktake({cheese.id: Decimal("10")}, "gerente")
+        start, _ = month_range(self.month)
+        Stocktake.objects.update(date=start)
+        inflow = self.create(self.centro, "in", "30.00")
+        MovementInflow.objects.create(
+            movement=inflow, ingredient=cheese, name="Queijo", quantity=Decimal("1500"), price=30, measure="g"
+        )
+        archive_month(self.month)
+
+        apply_stocktake({cheese.id: Decimal("11")}, "gerente")
+
+        # 10 contados + 1,5 kg arquivados - 11 contados agora
+        self.assertEqual(StocktakeLine.objects.latest("id").actual_usage, Decimal("0.500"))
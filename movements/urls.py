@@ -8,4 +8,5 @@ urlpatterns = [
     path("<int:id>", views.movement_detail, name="movement_detail"),
     path("<int:id>/delete", views.movement_delete, name="movement_delete"),
     path("report", views.report, name="report"),
+    path("report/<str:kind>", views.report_artifact, name="report_artifact"),
 ]
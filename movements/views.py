@@ -1,17 +1,25 @@
+from datetime import date
+
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
-from django.http import HttpRequest, HttpResponse
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, HttpResponseBadRequest
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.utils.timezone import localdate
 from django.views.decorators.http import require_http_methods
-from fpdf import FPDF
 
-from core.decorators import admin_required
+from accounts.services import confirm_password
+from core.decorators import admin_required, conditional_view, use_replica
 from stock.models import Ingredient, Product
 
-from .models import Movement
-from .services import create_inflow, create_outflow, format_period
+from .archive import get_movement, movements_between
+from .filters import DEFAULT_SORT, SORT_CHOICES, facets, filter_movements, parse_filters, sort_movements
+from .models import Movement, ReportArtifact
+from .reports import get_artifact, last_closed, period_range, render_report, report_file
+from .services import create_inflow, create_outflow, delete_movement, format_period
 
 
 @login_required
@@ -38,7 +46,7 @@ def movement_create(request: HttpRequest) -> HttpResponse:
 
     context = {
         "products": Product.objects.all(),
-        "ingredients": Ingredient.objects.all(),
+        "ingredients": Ingredient.objects.prefetch_related("packs"),
         "type_choices": Movement._meta.get_field("type").choices,
     }
 
@@ -67,6 +75,8 @@ def movement_create(request: HttpRequest) -> HttpResponse:
 
 @login_required
 @require_http_methods(["GET"])
+@use_replica
+@conditional_view("movements")
 def movement_list(request: HttpRequest) -> HttpResponse:
     """Exibe uma lista com as movimentações do sistema.
 
@@ -74,12 +84,14 @@ def movement_list(request: HttpRequest) -> HttpResponse:
         request (HttpRequest): Objeto de requisição do Django.
 
     GET:
-        renderiza a tela de movimentações com o filtro de data vazio.
-            - Se tiver filtro, retorna as movimentações correspondentes ao período.
-            - Se não tiver filtro, retorna as movimentações de acordo com a página.
+        renderiza a tela de movimentações com os filtros vazios.
+            - Se tiver período, retorna as movimentações correspondentes ao período.
+            - Tipo, responsável, item (produto ou ingrediente), faixa de valor e ordem
+              filtram e ordenam as movimentações (ver movements.filters).
+            - Sem filtros, retorna as movimentações de acordo com a página.
 
     Returns:
-        HttpResponse: Listando as movimentações
+        HttpResponse: Listando as movimentações e o resumo por tipo das filtradas.
     """
 
     start_date = request.GET.get("start_date")
@@ -88,6 +100,13 @@ def movement_list(request: HttpRequest) -> HttpResponse:
     start_dt, end_dt = None, None
     has_error = False
 
+    try:
+        filters = parse_filters(request.GET)
+    except ValidationError as e:
+        for msg in e.messages:
+            messages.error(request, msg)
+        filters = {"sort": DEFAULT_SORT}
+
     if start_date and end_date:
         try:
             start_dt, end_dt = format_period(str(start_date), str(end_date))
@@ -95,28 +114,41 @@ def movement_list(request: HttpRequest) -> HttpResponse:
             messages.error(request, e.message)
             has_error = True
 
-        movements = Movement.objects.filter(date__range=(start_dt, end_dt)).order_by("-date")
+        movements = movements_between(start_dt, end_dt, filters=filters)
 
     if not start_dt or not end_dt or has_error:
-        movements = Movement.objects.all().order_by("-date")
+        movements = filter_movements(Movement.objects.all(), filters)
+
+    movements = sort_movements(movements, filters["sort"])
 
     page_number = request.GET.get("page") or 1
     paginator = Paginator(movements, 10)
 
     page_obj = paginator.get_page(page_number)
 
+    # Parâmetros dos links de página e chave do resumo, sem a página atual
+    query = request.GET.copy()
+    query.pop("page", None)
+
     context = {
         "page_obj": page_obj,
         "Paginator": paginator,
         "is_paginated": page_obj.has_other_pages(),
         "start_date": start_date,
         "end_date": end_date,
+        "filters": filters,
+        "query": query.urlencode(),
+        # Calculado só quando o resumo não está no cache do template
+        "facets": lambda: facets(movements),
+        "type_choices": Movement._meta.get_field("type").choices,
+        "sort_choices": SORT_CHOICES,
     }
     return render(request, "movement_list.html", context)
 
 
 @login_required
 @require_http_methods(["GET"])
+@conditional_view("movements")
 def movement_detail(request: HttpRequest, id: int) -> HttpResponse:
     """Renderiza uma página com detalhes da movimentação.
 
@@ -132,7 +164,9 @@ def movement_detail(request: HttpRequest, id: int) -> HttpResponse:
 
     """
 
-    movement = get_object_or_404(Movement, id=id)
+    movement = get_movement(id)
+    if movement is None:
+        raise Http404
 
     context = {"movement": movement}
     return render(request, "movement_detail.html", context)
@@ -169,11 +203,11 @@ def movement_delete(request: HttpRequest, id: int) -> HttpResponse:
 
     password = request.POST.get("password")
 
-    if not request.user.check_password(password):
+    if not confirm_password(request, password):
         messages.error(request, "A senha que você inseriu está incorreta!")
         return render(request, "movement_delete.html", context)
 
-    movement.delete()
+    delete_movement(movement)
 
     messages.success(request, "Movimentação deletada com sucesso!")
     return redirect("movement_list")
@@ -182,6 +216,7 @@ def movement_delete(request: HttpRequest, id: int) -> HttpResponse:
 @login_required
 @admin_required
 @require_http_methods(["GET", "POST"])
+@use_replica
 def report(request: HttpRequest) -> HttpResponse:
     """Cria um relatório de movimentações de acordo com um período específico.
 
@@ -202,7 +237,7 @@ def report(request: HttpRequest) -> HttpResponse:
     """
 
     if request.method == "GET":
-        return render(request, "report.html")
+        return render(request, "report.html", {"kinds": ReportArtifact.KINDS})
 
     start_date = request.POST.get("start_date")
     end_date = request.POST.get("end_date")
@@ -211,84 +246,62 @@ def report(request: HttpRequest) -> HttpResponse:
         start_dt, end_dt = format_period(str(start_date), str(end_date))
     except ValidationError as e:
         messages.error(request, e.message)
-        return render(request, "report.html", {"start_date": start_date, "end_date": end_date})
-
-    # prefetch_related para realizar apenas uma busca por todos os dados que atendem ao filtro
-    movements = (
-        Movement.objects.filter(date__range=(start_dt, end_dt))
-        .prefetch_related("ingredients", "products")
-        .order_by("-date")
-    )
-
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(200, 10, txt="Relatório de Movimentações", ln=True, align="C")
-    pdf.set_font("Arial", size=10)
-    pdf.cell(200, 10, f"Período: {start_date} até {end_date}", ln=True, align="C")
-    pdf.ln(5)
-
-    total_in = 0
-    total_out = 0
-
-    for movement in movements:
-        pdf.set_font("Arial", "B", 12)
-        pdf.cell(0, 10, f"{movement.get_type_display()} - {movement.date.strftime('%d/%m/%Y %H:%M')}", ln=True)
-        pdf.set_font("Arial", size=10)
-        pdf.cell(0, 8, f"Responsável: {movement.user}", ln=True)
-        pdf.cell(
-            0,
-            8,
-            f"Valor total: R$ {movement.value:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
-            ln=True,
-        )
-
-        pdf.ln(2)
-        if movement.type == "in":
-            total_in += movement.value
-            pdf.set_font("Arial", "B", 10)
-            pdf.cell(60, 8, "Nome", border=1)
-            pdf.cell(40, 8, "Quantidade", border=1)
-            pdf.cell(30, 8, "Medida", border=1)
-            pdf.cell(40, 8, "Preço (R$)", border=1)
-            pdf.ln()
-
-            for ing in movement.ingredients.all():
-                pdf.set_font("Arial", size=10)
-                pdf.cell(60, 8, ing.name, border=1)
-                pdf.cell(40, 8, f"{ing.quantity}", border=1)
-                pdf.cell(30, 8, ing.get_measure_display(), border=1)
-                pdf.cell(40, 8, f"{ing.price:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."), border=1)
-                pdf.ln()
-        else:
-            total_out += movement.value
-            pdf.set_font("Arial", "B", 10)
-            pdf.cell(60, 8, "Nome", border=1)
-            pdf.cell(40, 8, "Quantidade", border=1)
-            pdf.cell(40, 8, "Preço (R$)", border=1)
-            pdf.ln()
-
-            for prod in movement.products.all():
-                pdf.set_font("Arial", size=10)
-                pdf.cell(60, 8, prod.name, border=1)
-                pdf.cell(40, 8, f"{prod.quantity}", border=1)
-                pdf.cell(40, 8, f"{prod.price:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."), border=1)
-                pdf.ln()
-
-        pdf.ln(5)  # espaço entre movimentos
-
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 10, "Resumo Financeiro", ln=True)
-
-    pdf.set_font("Arial", size=10)
-    pdf.cell(
-        0, 8, f"Total de Entradas: R$ {total_in:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."), ln=True
-    )
-    pdf.cell(
-        0, 8, f"Total de Saídas:   R$ {total_out:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."), ln=True
-    )
+        context = {"start_date": start_date, "end_date": end_date, "kinds": ReportArtifact.KINDS}
+        return render(request, "report.html", context)
+
+    pdf = render_report(start_dt, end_dt, f"{start_date} até {end_date}")
 
     # Retornando o pdf como resposta HTTP
-    response = HttpResponse(bytes(pdf.output(dest="S")), content_type="application/pdf")
+    response = HttpResponse(pdf, content_type="application/pdf")
     response["Content-Disposition"] = "inline; filename='relatorio.pdf'"
     return response
+
+
+@login_required
+@admin_required
+@require_http_methods(["GET"])
+def report_artifact(request: HttpRequest, kind: str) -> HttpResponse:
+    """Serve o relatório pré-gerado de um período fechado.
+
+    Args:
+        request (HttpRequest): Objeto de requisição do Django.
+        kind (str): Tipo de período (daily/weekly/monthly).
+
+    GET:
+        Sem parâmetros, serve o último período fechado (ontem, a semana passada ou o mês
+        passado); com ?start=AAAA-MM-DD, o período fechado que contém a data. O relatório
+        é gerado na hora apenas se ainda não existe na versão atual dos dados.
+
+    Returns:
+        FileResponse: PDF do relatório, com ETag e Cache-Control.
+        HttpResponseNotModified: Se o navegador já tem a versão atual.
+    """
+
+    if kind not in dict(ReportArtifact.KINDS):
+        raise Http404
+
+    start = last_closed(kind)
+    if request.GET.get("start"):
+        try:
+            start = date.fromisoformat(request.GET["start"])
+        except ValueError:
+            return HttpResponseBadRequest("Data inválida")
+        # Só períodos fechados: o relatório do período atual ainda mudaria a cada movimentação
+        if period_range(kind, start)[1] >= localdate():
+            raise Http404
+
+    artifact = get_artifact(kind, start)
+    etag = quote_etag(f"{artifact.kind}-{artifact.start}-s{artifact.store_id}-v{artifact.version}")
+    # Last-Modified tem precisão de segundos
+    last_modified = int(artifact.generated_at.timestamp()) if artifact.fresh and artifact.generated_at else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        artifact, path = report_file(kind, start)
+        response = FileResponse(path.open("rb"), content_type="application/pdf")
+        response["Content-Disposition"] = f"inline; filename=relatorio-{artifact.kind}-{artifact.start}.pdf"
+        response["Last-Modified"] = http_date(artifact.generated_at.timestamp())
+    response["ETag"] = etag
+    # O navegador guarda o PDF mas revalida a cada visita: o período fechado ainda muda se
+    # uma movimentação dele for removida, e a revalidação só devolve 304
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,100 @@
+// Atualiza a página inicial e a lista de ingredientes com os eventos enviados pelo /events
+document.addEventListener("DOMContentLoaded", () => {
+    if (!window.EventSource) return;
+
+    const source = new EventSource("/events");
+
+    source.addEventListener("movement", (message) => {
+        const event = JSON.parse(message.data);
+        updateTotals(event);
+        updateMovements(event.movement);
+        updateIngredients(event);
+    });
+});
+
+function formatMoney(value) {
+    const text = Math.abs(value).toFixed(2).replace(".", ",");
+    return (value >= 0 ? "+R$ " : "-R$ ") + text;
+}
+
+function updateTotals(event) {
+    const count = document.querySelector("[data-live-count]");
+    if (count) count.textContent = parseInt(count.textContent, 10) + event.count;
+
+    document.querySelectorAll("[data-live-net]").forEach((element) => {
+        const value = parseFloat(element.dataset.liveNet) + parseFloat(event.net);
+        element.dataset.liveNet = value.toFixed(2);
+        element.textContent = formatMoney(value);
+        element.classList.toggle("text-green-500", value >= 0);
+        element.classList.toggle("text-red-500", value < 0);
+    });
+}
+
+function updateMovements(movement) {
+    const body = document.querySelector("[data-live-movements]");
+    if (!body) return;
+
+    const existing = body.querySelector(`[data-movement="${movement.id}"]`);
+    if (movement.deleted) {
+        if (existing) existing.remove();
+        return;
+    }
+    if (existing) return;
+
+    const row = document.createElement("tr");
+    row.className = "table-row";
+    row.dataset.movement = movement.id;
+    row.onclick = () => (window.location = movement.url);
+
+    const value = movement.type === "in" ? ["text-red-500", "-R$ "] : ["text-green-500", "+R$ "];
+    [
+        [movement.date, "py-2"],
+        [movement.type_display, "py-2"],
+        [value[1] + movement.value, `py-2 font-semibold ${value[0]}`],
+    ].forEach(([text, className]) => {
+        const cell = document.createElement("td");
+        cell.className = className;
+        cell.textContent = text;
+        row.appendChild(cell);
+    });
+
+    const empty = body.querySelector("[data-live-empty]");
+    if (empty) empty.remove();
+    body.prepend(row);
+
+    // A página mostra apenas as 5 mais recentes
+    const rows = body.querySelectorAll("[data-movement]");
+    for (let i = 5; i < rows.length; i++) rows[i].remove();
+}
+
+function updateIngredients(event) {
+    Object.entries(event.ingredients).forEach(([id, quantity]) => {
+        const cell = document.querySelector(`[data-live-qte="${id}"]`);
+        if (cell) cell.textContent = quantity;
+    });
+
+    const alerts = document.querySelector("[data-live-alerts]");
+    if (!alerts) return;
+
+    const list = alerts.querySelector("ul");
+    event.alerts.forEach((alert) => {
+        let item = list.querySelector(`[data-ingredient="${alert.id}"]`);
+        if (!item) {
+            item = document.createElement("li");
+            item.dataset.ingredient = alert.id;
+            list.appendChild(item);
+        }
+        item.textContent = alert.text;
+    });
+    event.restored.forEach((id) => {
+        const item = list.querySelector(`[data-ingredient="${id}"]`);
+        if (item) item.remove();
+    });
+
+    const total = list.querySelectorAll("li").length;
+    // Os lotes perto da validade ficam na segunda lista e mantêm o aviso visível
+    alerts.hidden = total === 0 && !alerts.querySelector("[data-lot]");
+
+    const lowCount = document.querySelector("[data-live-low-count]");
+    if (lowCount) lowCount.textContent = total;
+}
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Category, Ingredient, Product, ProductIngredient
+from .models import Category, Ingredient, Pack, Product, ProductIngredient, StockLot
+from .services import publish_recipe
 
 
 class ProductIngredientInline(admin.TabularInline):
@@ -10,8 +11,28 @@ class ProductIngredientInline(admin.TabularInline):
 
 class ProductAdmin(admin.ModelAdmin):
     inlines = [ProductIngredientInline]
+    exclude = ["recipe"]
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        publish_recipe(form.instance)
+
+
+class PackInline(admin.TabularInline):
+    model = Pack
+    extra = 1
+
+
+class StockLotInline(admin.TabularInline):
+    model = StockLot
+    extra = 0
+    fields = ["received", "expires_on", "quantity", "remaining", "expiring"]
+
+
+class IngredientAdmin(admin.ModelAdmin):
+    inlines = [PackInline, StockLotInline]
 
 
 admin.site.register(Category)
-admin.site.register(Ingredient)
+admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Product, ProductAdmin)
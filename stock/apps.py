@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class StockConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'stock'
+
+    def ready(self):
+        from core.versioning import track
+
+        from .models import Category, Ingredient, Product, ProductIngredient, StockLot
+        from .sync import connect_signals
+
+        track(self.label, Category, Ingredient, Product, ProductIngredient, StockLot)
+        connect_signals()
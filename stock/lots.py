@@ -0,0 +1,129 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import F, Sum
+from django.utils.timezone import localdate
+
+from core.versioning import bump_version
+
+from .models import Ingredient, StockLot
+
+# Lotes lidos por consulta ao consumir: quase sempre o primeiro já basta
+LOT_BATCH = 10
+
+
+def lot_order() -> list:
+    """Ordem de consumo dos lotes abertos, a mesma dos índices parciais do StockLot."""
+
+    if settings.LOT_CONSUMPTION == "fifo":
+        return ["received", "id"]
+    # Lotes sem validade ficam por último
+    return [F("expires_on").asc(nulls_last=True), "received", "id"]
+
+
+def parse_expiry(value: str, name: str) -> date | None:
+    """Converte a validade informada na entrada (AAAA-MM-DD, campo date); vazia é sem validade."""
+
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError(f"Insira uma data de validade válida para {name}") from None
+
+
+def create_lots(received: list[tuple[Ingredient, Decimal, date | None]]) -> None:
+    """Cria um lote para cada ingrediente recebido em uma entrada.
+
+    Args:
+        received (list): Ingrediente, quantidade (na unidade do ingrediente) e validade.
+    """
+
+    today = localdate()
+    StockLot.objects.bulk_create(
+        StockLot(
+            ingredient=ingredient,
+            store_id=ingredient.store_id,
+            expires_on=expires_on,
+            quantity=quantity,
+            remaining=quantity,
+            # Lotes já dentro do prazo de alerta não esperam o comando da noite
+            expiring=expires_on is not None and expires_on <= today + timedelta(days=settings.LOT_EXPIRY_DAYS),
+        )
+        for ingredient, quantity, expires_on in received
+    )
+
+
+def trim_lots(ingredients, previous: dict[int, Decimal]) -> None:
+    """Consome dos lotes o que saiu do estoque de cada ingrediente.
+
+    Chamado depois de reduzir o estoque (saídas, contagens e edições), com os ingredientes
+    já travados pela transação. O que saiu (estoque anterior menos o atual) é consumido
+    dos lotes abertos na ordem de lot_order(), e só o que os lotes não cobrem sai do
+    estoque sem lote (anterior ao controle por lotes ou somado em uma contagem), que fica
+    por último. O saldo dos lotes também nunca passa do estoque.
+
+    Os saldos vêm de uma consulta agrupada e, para cada ingrediente, os lotes abertos são
+    lidos em pequenos blocos na ordem de lot_order(), pelo índice parcial, até cobrir o
+    consumo.
+
+    Args:
+        ingredients (list): Ingredientes com o estoque já atualizado.
+        previous (dict): Estoque de cada ingrediente antes da alteração.
+    """
+
+    stock = {ingredient.id: ingredient.qte for ingredient in ingredients}
+    if not stock:
+        return
+
+    totals = (
+        StockLot.objects.filter(ingredient_id__in=stock, remaining__gt=0)
+        .values("ingredient_id")
+        .annotate(total=Sum("remaining"))
+        .values_list("ingredient_id", "total")
+    )
+
+    consumed = []
+    for ingredient_id, total in totals:
+        current = stock[ingredient_id]
+        excess = max(previous.get(ingredient_id, current) - current, total - max(current, 0))
+        lots = StockLot.objects.filter(ingredient_id=ingredient_id, remaining__gt=0).order_by(*lot_order())
+        offset = 0
+        while excess > 0:
+            # Os blocos anteriores só foram zerados em memória, então o próximo vem pelo offset
+            batch = list(lots[offset : offset + LOT_BATCH])
+            if not batch:
+                break
+            offset += LOT_BATCH
+            for lot in batch:
+                used = min(lot.remaining, excess)
+                lot.remaining -= used
+                excess -= used
+                consumed.append(lot)
+                if excess <= 0:
+                    break
+
+    StockLot.objects.bulk_update(consumed, ["remaining"])
+
+
+def flag_expiring_lots(using: str, days: int | None = None) -> int:
+    """Marca os lotes abertos que vencem em até days dias (passada da noite).
+
+    Returns:
+        int: Quantidade de lotes marcados.
+    """
+
+    days = settings.LOT_EXPIRY_DAYS if days is None else days
+    limit = localdate() + timedelta(days=days)
+    flagged = (
+        StockLot._base_manager.using(using)
+        .filter(remaining__gt=0, expiring=False, expires_on__lte=limit)
+        .update(expiring=True)
+    )
+    # update não dispara sinais, e os alertas em cache da página inicial mudam com a data
+    # (lotes que passam a estar vencidos) mesmo quando nenhum lote novo é marcado
+    bump_version("stock", using=using)
+    return flagged
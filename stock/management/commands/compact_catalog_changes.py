@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from stock.sync import compact_changes
+
+
+class Command(BaseCommand):
+    help = "Remove do registro de alterações do catálogo as alterações substituídas por outras mais recentes."
+
+    def handle(self, *args, **options):
+        for alias in ["default", *settings.STORE_DATABASES]:
+            removed = compact_changes(alias)
+            self.stdout.write(f"{alias}: {removed} alterações removidas")
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from stock.lots import flag_expiring_lots
+
+
+class Command(BaseCommand):
+    help = "Marca os lotes abertos que vencem nos próximos dias, exibidos nos alertas da página inicial."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=settings.LOT_EXPIRY_DAYS, help="Dias de antecedência do alerta."
+        )
+
+    def handle(self, *args, **options):
+        for alias in ["default", *settings.STORE_DATABASES]:
+            flagged = flag_expiring_lots(alias, options["days"])
+            self.stdout.write(f"{alias}: {flagged} lotes marcados")
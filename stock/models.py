@@ -1,4 +1,10 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
+
+from stores.models import Store, StoreScopedModel
+
+from . import units
 
 
 class Category(models.Model):
@@ -17,7 +23,7 @@ class Category(models.Model):
         return self.name
 
 
-class Ingredient(models.Model):
+class Ingredient(StoreScopedModel):
     """Representa um ingrediente utilizado nos produtos.
 
     Attributes:
@@ -25,20 +31,115 @@ class Ingredient(models.Model):
         category (Category): Categoria à qual o ingrediente pertence.
         qte (Decimal): Quantidade atual disponível em estoque.
         min_qte (int): Quantidade mínima de segurança no estoque.
-        measure (str): Unidade de medida do ingrediente (g/kg/unit).
+        measure (str): Unidade de medida do ingrediente (ver stock.units). As quantidades
+            do ingrediente (estoque, receitas e embalagens) são gravadas nela.
+        store (Store): Loja dona do estoque.
     """
 
-    name = models.CharField(max_length=100, unique=True)
+    name = models.CharField(max_length=100)
     category = models.ForeignKey(Category, null=True, on_delete=models.SET_NULL)
     qte = models.DecimalField(default=0, max_digits=10, decimal_places=3)
     min_qte = models.DecimalField(default=0, max_digits=10, decimal_places=3)
-    measure = models.CharField(max_length=10, choices=([("g", "Gramas"), ("kg", "Quilos"), ("unit", "Unidades")]))
+    measure = models.CharField(max_length=10, choices=units.MEASURE_CHOICES)
+
+    class Meta:
+        # O nome se repete entre lojas, mas não dentro da mesma loja
+        constraints = [
+            models.UniqueConstraint(fields=["store", "name"], name="unique_ingredient_per_store"),
+            # NULL não se repete em UNIQUE, então os registros sem loja precisam da própria constraint
+            models.UniqueConstraint(
+                fields=["name"], condition=models.Q(store=None), name="unique_ingredient_without_store"
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def fractional(self) -> bool:
+        return units.is_fractional(self.measure)
+
+    @property
+    def input_units(self) -> list[tuple[str, str]]:
+        """Unidades aceitas na entrada do ingrediente: as da mesma grandeza e as embalagens."""
+
+        packs = [(f"{units.PACK_PREFIX}{pack.id}", str(pack)) for pack in self.packs.all()]
+        return units.COMPATIBLE[self.measure] + packs
+
+
+class Pack(models.Model):
+    """Embalagem em que um ingrediente é comprado (ex: caixa com 12 unidades).
+
+    Attributes:
+        ingredient (Ingredient): Ingrediente embalado.
+        name (str): Nome da embalagem.
+        quantity (Decimal): Conteúdo da embalagem, na unidade do ingrediente.
+    """
+
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, related_name="packs")
+    name = models.CharField(max_length=50)
+    quantity = models.DecimalField(max_digits=10, decimal_places=3)
+
+    class Meta:
+        unique_together = ("ingredient", "name")
+
+    def __str__(self):
+        quantity = self.quantity if units.is_fractional(self.ingredient.measure) else int(self.quantity)
+        return f"{self.name} ({quantity} {units.label(self.ingredient.measure)})"
+
+
+class StockLot(StoreScopedModel):
+    """Lote recebido de um ingrediente, criado a cada entrada.
+
+    As saídas consomem os lotes abertos (com saldo) na ordem de settings.LOT_CONSUMPTION
+    (ver stock.lots). Os índices parciais cobrem só os lotes abertos, então a busca do
+    lote mais antigo não passa pelos lotes já consumidos.
+
+    Attributes:
+        ingredient (Ingredient): Ingrediente recebido.
+        received (timestamp): Data de recebimento.
+        expires_on (date): Data de validade (vazia para ingredientes que não vencem).
+        quantity (Decimal): Quantidade recebida, na unidade do ingrediente.
+        remaining (Decimal): Saldo ainda em estoque, na unidade do ingrediente.
+        expiring (bool): Marcado pelo comando flag_expiring_lots perto da validade.
+        store (Store): Loja que recebeu o lote.
+    """
+
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, related_name="lots")
+    received = models.DateTimeField(default=timezone.now)
+    expires_on = models.DateField(null=True, blank=True)
+    quantity = models.DecimalField(max_digits=10, decimal_places=3)
+    remaining = models.DecimalField(max_digits=10, decimal_places=3)
+    expiring = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["ingredient", "expires_on", "received", "id"],
+                condition=models.Q(remaining__gt=0),
+                name="stocklot_open_fefo",
+            ),
+            models.Index(
+                fields=["ingredient", "received", "id"],
+                condition=models.Q(remaining__gt=0),
+                name="stocklot_open_fifo",
+            ),
+            models.Index(
+                fields=["expires_on"],
+                condition=models.Q(expiring=True, remaining__gt=0),
+                name="stocklot_expiring",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.ingredient} - {self.received:%d/%m/%Y}: {self.remaining}"
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_on is not None and self.expires_on < timezone.localdate()
+
 
-class Product(models.Model):
+class Product(StoreScopedModel):
     """Representa um produto disponível para venda.
 
     Attributes:
@@ -46,13 +147,25 @@ class Product(models.Model):
         ingredients (QuerySet[Ingredient]): Ingredientes necessários, relacionados através da tabela ProductIngredient.
         price (Decimal): Preço do produto.
         unit (int): Quantidade do produto (caso sejam bebidas)
+        recipe (RecipeVersion): Versão atual da receita, gravada nas saídas do produto.
+        store (Store): Loja que vende o produto.
     """
 
-    name = models.CharField(max_length=100, unique=True)
+    name = models.CharField(max_length=100)
     ingredients = models.ManyToManyField(
         Ingredient, through="ProductIngredient", through_fields=("product", "ingredient"), blank=True
     )
     price = models.DecimalField(default=0, max_digits=10, decimal_places=2)
+    recipe = models.ForeignKey("RecipeVersion", null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["store", "name"], name="unique_product_per_store"),
+            # NULL não se repete em UNIQUE, então os registros sem loja precisam da própria constraint
+            models.UniqueConstraint(
+                fields=["name"], condition=models.Q(store=None), name="unique_product_without_store"
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -68,7 +181,8 @@ class ProductIngredient(models.Model):
     Attributes:
         product (Product): Produto associado.
         ingredient (Ingredient): Ingrediente associado.
-        quantity (Decimal): Quantidade do ingrediente necessária para o produto.
+        quantity (Decimal): Quantidade do ingrediente necessária para o produto, na unidade
+            do ingrediente.
     """
 
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -80,3 +194,157 @@ class ProductIngredient(models.Model):
 
     def __str__(self):
         return f"{self.product} - {self.ingredient}: {self.quantity}"
+
+
+class RecipeVersion(models.Model):
+    """Versão imutável da receita de um produto.
+
+    Cada alteração da receita (ProductIngredient) cria uma versão nova, e cada item de
+    saída aponta para a versão que consumiu. O consumo de um período é a soma das saídas
+    por versão multiplicada pelos itens dela, sem reconstruir receitas antigas.
+
+    Attributes:
+        product (Product): Produto (vazio se foi removido depois).
+        number (int): Número da versão, crescente por produto.
+        name (str): Nome do produto na data da versão.
+        created_at (timestamp): Data da versão.
+    """
+
+    product = models.ForeignKey(Product, null=True, on_delete=models.SET_NULL, related_name="recipes")
+    number = models.PositiveIntegerField()
+    name = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("product", "number")
+
+    def __str__(self):
+        return f"{self.name} v{self.number}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Versões de receita não podem ser alteradas")
+        super().save(*args, **kwargs)
+
+
+class RecipeVersionItem(models.Model):
+    """Ingrediente de uma versão da receita, na unidade do ingrediente na data da versão.
+
+    Attributes:
+        version (RecipeVersion): Versão da receita.
+        ingredient (Ingredient): Ingrediente (vazio se foi removido depois).
+        name (str): Nome do ingrediente.
+        measure (str): Unidade da quantidade.
+        quantity (Decimal): Quantidade consumida por unidade do produto.
+    """
+
+    version = models.ForeignKey(RecipeVersion, on_delete=models.CASCADE, related_name="items")
+    ingredient = models.ForeignKey(Ingredient, null=True, on_delete=models.SET_NULL, related_name="+")
+    name = models.CharField(max_length=100)
+    measure = models.CharField(max_length=10, choices=units.MEASURE_CHOICES)
+    quantity = models.DecimalField(max_digits=10, decimal_places=3)
+
+    def __str__(self):
+        return f"{self.version} - {self.name}: {self.quantity}"
+
+
+class Stocktake(StoreScopedModel):
+    """Contagem física do estoque, aplicada de uma vez a todos os ingredientes contados.
+
+    Attributes:
+        user (str): Nome do responsável pela contagem.
+        date (timestamp): Data em que a contagem foi aplicada.
+        commentary (str): Comentário sobre a contagem.
+        store (Store): Loja contada.
+    """
+
+    user = models.CharField(max_length=100)
+    date = models.DateTimeField(auto_now_add=True)
+    commentary = models.TextField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.date} - {self.user}"
+
+
+class StocktakeLine(models.Model):
+    """Resultado da contagem de um ingrediente, na unidade do ingrediente.
+
+    O consumo teórico é o que as saídas descontaram (pelas receitas) desde a contagem
+    anterior do ingrediente, e o consumo real é o que de fato saiu do estoque no mesmo
+    período. Ficam vazios na primeira contagem do ingrediente.
+
+    Attributes:
+        stocktake (Stocktake): Contagem.
+        ingredient (Ingredient): Ingrediente contado (vazio se foi removido depois).
+        name (str): Nome do ingrediente.
+        measure (str): Unidade de medida do ingrediente.
+        expected (Decimal): Estoque registrado no sistema antes da contagem.
+        counted (Decimal): Quantidade contada.
+        theoretical_usage (Decimal): Consumo pelas receitas desde a contagem anterior.
+        actual_usage (Decimal): Consumo real desde a contagem anterior.
+    """
+
+    stocktake = models.ForeignKey(Stocktake, on_delete=models.CASCADE, related_name="lines")
+    ingredient = models.ForeignKey(Ingredient, null=True, on_delete=models.SET_NULL, related_name="+")
+    name = models.CharField(max_length=100)
+    measure = models.CharField(max_length=10, choices=units.MEASURE_CHOICES)
+    expected = models.DecimalField(max_digits=10, decimal_places=3)
+    counted = models.DecimalField(max_digits=10, decimal_places=3)
+    theoretical_usage = models.DecimalField(null=True, max_digits=10, decimal_places=3)
+    actual_usage = models.DecimalField(null=True, max_digits=10, decimal_places=3)
+
+    def __str__(self):
+        return f"{self.name}: {self.expected} -> {self.counted}"
+
+    @property
+    def variance(self):
+        return self.counted - self.expected
+
+    @property
+    def fractional(self) -> bool:
+        return units.is_fractional(self.measure)
+
+
+class CatalogVersion(models.Model):
+    """Contador das versões do registro de alterações, com uma única linha por banco.
+
+    As alterações são gravadas depois do commit de quem alterou o catálogo, em uma
+    transação curta que trava esta linha, então recebem versões na ordem em que são
+    gravadas sem segurar as movimentações. O id (sequência do banco) não serve de versão:
+    é reservado no INSERT, e uma transação que começou antes pode commitar depois de um
+    terminal já ter lido ids maiores.
+
+    Attributes:
+        version (int): Última versão atribuída.
+    """
+
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.version)
+
+
+class CatalogChange(models.Model):
+    """Registro de cada alteração do catálogo, lido pelos terminais para sincronizar.
+
+    A versão cresce a cada alteração (CatalogVersion), então um terminal pede apenas as
+    alterações com versão maior que a última que recebeu.
+
+    Attributes:
+        version (int): Versão da alteração.
+        model (str): Tipo do registro alterado (category/ingredient/product/productingredient).
+        object_id (int): Id do registro alterado.
+        data (dict): Campos do registro após a alteração (None quando removido).
+        store (Store): Loja do registro (None para categorias, que são de todas as lojas).
+    """
+
+    version = models.BigIntegerField(unique=True)
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    data = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    store = models.ForeignKey(
+        Store, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+
+    def __str__(self):
+        return f"{self.version}: {self.model} {self.object_id}"
@@ -0,0 +1,257 @@
+import json
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import OuterRef, Subquery
+
+from core.routers import current_store, store_db
+from movements.models import MovementInflow
+
+from . import units
+from .models import Ingredient, Product, ProductIngredient, RecipeVersionItem
+
+# Máximo de cenários simulados por requisição
+MAX_SCENARIOS = 20
+
+
+def parse_planned(value, name: str) -> int:
+    """Converte a quantidade planejada de um produto (inteiro, zero permitido)."""
+
+    try:
+        planned = int(str(value).strip())
+    except ValueError:
+        raise ValidationError(f"Insira uma quantidade válida para {name}") from None
+    if planned < 0:
+        raise ValidationError(f"Insira uma quantidade válida para {name}")
+    return planned
+
+
+def plan_from_form(data) -> dict[int, int]:
+    """Lê as quantidades planejadas do formulário (p-<id>); campos vazios ou zero ficam de fora."""
+
+    plan, errors = {}, []
+    for product in Product.objects.only("id", "name"):
+        value = data.get(f"p-{product.id}", "").strip()
+        if not value:
+            continue
+        try:
+            planned = parse_planned(value, product.name)
+        except ValidationError as e:
+            errors.extend(e.messages)
+            continue
+        if planned:
+            plan[product.id] = planned
+
+    if errors:
+        raise ValidationError(errors)
+    if not plan:
+        raise ValidationError(["Informe a quantidade planejada de ao menos 1 produto"])
+    return plan
+
+
+def plans_from_json(body: bytes) -> list[tuple[str, dict[int, int]]]:
+    """Lê os cenários do corpo JSON da simulação.
+
+    Formato: {"scenarios": [{"name": "Sábado", "plan": {"<id do produto>": 300}}]}, ou
+    apenas {"plan": {...}} para um único cenário.
+
+    Raises:
+        ValidationError: Com as mensagens de todos os cenários inválidos.
+    """
+
+    try:
+        data = json.loads(body)
+        scenarios = data["scenarios"] if "scenarios" in data else [{"name": "", "plan": data["plan"]}]
+    except (ValueError, TypeError, KeyError):
+        raise ValidationError(['Envie um JSON com "plan" ou "scenarios"']) from None
+    if not isinstance(scenarios, list) or not 0 < len(scenarios) <= MAX_SCENARIOS:
+        raise ValidationError([f"Envie de 1 a {MAX_SCENARIOS} cenários"])
+
+    names = dict(Product.objects.values_list("id", "name"))
+    plans, errors = [], []
+    for index, scenario in enumerate(scenarios, 1):
+        plan = scenario.get("plan") if isinstance(scenario, dict) else None
+        if not isinstance(plan, dict) or not plan:
+            errors.append(f"Informe as quantidades planejadas do cenário {index}")
+            continue
+
+        parsed = {}
+        for product_id, value in plan.items():
+            try:
+                product_id = int(product_id)
+                if product_id not in names:
+                    raise ValueError
+            except ValueError:
+                errors.append(f"Produto não encontrado: {product_id}")
+                continue
+            try:
+                planned = parse_planned(value, names[product_id])
+            except ValidationError as e:
+                errors.extend(e.messages)
+                continue
+            if planned:
+                parsed[product_id] = planned
+        plans.append((str(scenario.get("name") or f"Cenário {index}"), parsed))
+
+    if errors:
+        raise ValidationError(errors)
+    return plans
+
+
+def recipe_key(version_id: int, created_at) -> str:
+    # A data de criação evita reaproveitar o cache de um banco recriado (ids repetidos)
+    return f"recipe:{store_db()}:{version_id}:{created_at.timestamp()}"
+
+
+def recipe_rows(product_ids) -> dict[int, list[tuple[int, str, Decimal]]]:
+    """Receita de cada produto: (ingrediente, unidade, quantidade) por unidade vendida.
+
+    As receitas vêm das versões publicadas (RecipeVersion), que nunca mudam, então os
+    itens de cada versão ficam em cache sem expirar e só as versões ausentes do cache são
+    lidas, em uma consulta. Produtos ainda sem versão (nunca vendidos desde o controle de
+    versões) usam a receita atual.
+    """
+
+    products = {}
+    keys = {}
+    for product_id, recipe_id, created_at in Product.objects.filter(id__in=product_ids).values_list(
+        "id", "recipe_id", "recipe__created_at"
+    ):
+        products[product_id] = recipe_id
+        if recipe_id is not None:
+            keys[recipe_id] = recipe_key(recipe_id, created_at)
+
+    cached = cache.get_many(keys.values())
+    recipes = {version_id: cached[key] for version_id, key in keys.items() if key in cached}
+
+    missing = keys.keys() - recipes.keys()
+    if missing:
+        items = RecipeVersionItem.objects.filter(version_id__in=missing, ingredient__isnull=False)
+        loaded = {version_id: [] for version_id in missing}
+        for version_id, ingredient_id, measure, quantity in items.values_list(
+            "version_id", "ingredient_id", "measure", "quantity"
+        ):
+            loaded[version_id].append((ingredient_id, measure, quantity))
+        cache.set_many({keys[version_id]: rows for version_id, rows in loaded.items()}, None)
+        recipes.update(loaded)
+
+    rows = {product_id: recipes[recipe_id] for product_id, recipe_id in products.items() if recipe_id is not None}
+
+    unpublished = [product_id for product_id, recipe_id in products.items() if recipe_id is None]
+    if unpublished:
+        current = ProductIngredient.objects.filter(product_id__in=unpublished).values_list(
+            "product_id", "ingredient_id", "ingredient__measure", "quantity"
+        )
+        for product_id in unpublished:
+            rows[product_id] = []
+        for product_id, ingredient_id, measure, quantity in current:
+            rows[product_id].append((ingredient_id, measure, quantity))
+
+    return rows
+
+
+def unit_costs(ingredient_ids) -> dict[int, Decimal]:
+    """Custo de uma unidade (na unidade do ingrediente) na última entrada de cada ingrediente.
+
+    A última entrada de cada ingrediente é buscada pelo índice (name, movement) dos itens
+    de entrada, em uma subconsulta, e os itens encontrados são lidos em uma segunda consulta.
+    Ingredientes sem entrada ficam de fora.
+    """
+
+    latest = MovementInflow.objects.filter(name=OuterRef("name"), quantity__gt=0)
+    if current_store.get() is not None:
+        latest = latest.filter(movement__store_id=OuterRef("store_id"))
+    latest = latest.order_by("-movement_id").values("id")[:1]
+
+    ingredients = list(
+        Ingredient.objects.filter(id__in=ingredient_ids)
+        .annotate(last_inflow=Subquery(latest))
+        .exclude(last_inflow=None)
+        .values_list("id", "measure", "last_inflow")
+    )
+    inflows = {
+        id: (price, quantity, measure)
+        for id, price, quantity, measure in MovementInflow.objects.filter(
+            id__in={last_inflow for *_, last_inflow in ingredients}
+        ).values_list("id", "price", "quantity", "measure")
+    }
+
+    costs = {}
+    for ingredient_id, ingredient_measure, last_inflow in ingredients:
+        price, quantity, measure = inflows[last_inflow]
+        # Entradas em outra unidade da mesma grandeza (ex: gramas de um ingrediente em quilos)
+        costs[ingredient_id] = price / units.convert(quantity, measure, ingredient_measure)
+    return costs
+
+
+def simulate(plans: list[dict[int, int]]) -> list[dict]:
+    """Calcula o que cada plano de vendas consome de cada ingrediente.
+
+    As receitas dos produtos de todos os planos, o estoque e os custos são lidos uma única
+    vez; cada plano percorre apenas as receitas dos produtos planejados.
+
+    Args:
+        plans (list): Quantidade planejada por id do produto, um dicionário por cenário.
+
+    Returns:
+        list: Para cada plano, ingredients (nome, unidade, necessário, estoque, falta e
+            custo estimado da falta), cost (custo total estimado) e short (ingredientes em falta).
+    """
+
+    rows = recipe_rows({product_id for plan in plans for product_id in plan})
+
+    required = []
+    for plan in plans:
+        totals = defaultdict(lambda: defaultdict(Decimal))
+        for product_id, planned in plan.items():
+            for ingredient_id, measure, quantity in rows.get(product_id, []):
+                totals[ingredient_id][measure] += quantity * planned
+        required.append(totals)
+
+    ingredient_ids = {ingredient_id for totals in required for ingredient_id in totals}
+    ingredients = {
+        ingredient.id: ingredient
+        for ingredient in Ingredient.objects.filter(id__in=ingredient_ids).only("id", "name", "qte", "measure")
+    }
+    costs = unit_costs(ingredient_ids)
+
+    results = []
+    for totals in required:
+        lines = []
+        for ingredient_id, by_measure in totals.items():
+            ingredient = ingredients.get(ingredient_id)
+            if ingredient is None:
+                continue
+            # A unidade do ingrediente pode ter mudado desde a versão da receita
+            needed = sum(
+                (units.convert(quantity, measure, ingredient.measure) for measure, quantity in by_measure.items()),
+                Decimal(0),
+            )
+            shortfall = max(needed - max(ingredient.qte, Decimal(0)), Decimal(0))
+            cost = costs.get(ingredient_id)
+            lines.append(
+                {
+                    "id": ingredient.id,
+                    "name": ingredient.name,
+                    "measure": ingredient.measure,
+                    "measure_label": ingredient.get_measure_display(),
+                    "fractional": ingredient.fractional,
+                    "required": needed,
+                    "stock": ingredient.qte,
+                    "shortfall": shortfall,
+                    "cost": None if cost is None else (shortfall * cost).quantize(Decimal("0.01")),
+                }
+            )
+
+        # Ingredientes em falta primeiro
+        lines.sort(key=lambda line: (-line["shortfall"], line["name"]))
+        results.append(
+            {
+                "ingredients": lines,
+                "cost": sum((line["cost"] for line in lines if line["cost"]), Decimal(0)),
+                "short": sum(1 for line in lines if line["shortfall"]),
+            }
+        )
+    return results
@@ -1,8 +1,15 @@
 from decimal import Decimal, InvalidOperation
 
 from django.core.exceptions import ValidationError
+from django.db.models import F, Max
 
-from .models import Ingredient, Product, ProductIngredient
+from core.decorators import store_atomic
+from core.versioning import bump_version
+
+from . import units
+from .lots import trim_lots
+from .models import Ingredient, Pack, Product, ProductIngredient, RecipeVersion, RecipeVersionItem, StockLot
+from .sync import log_changes
 
 
 def parse_value_br(value: str, msg: str) -> tuple[Decimal | None, list[str]]:
@@ -27,3 +34,106 @@ def parse_value_br(value: str, msg: str) -> tuple[Decimal | None, list[str]]:
         errors.append(f"{msg}")
         return None, errors
     return value, []
+
+
+def validate_measure(measure: str) -> None:
+    if measure not in units.UNITS:
+        raise ValidationError("Selecione uma unidade de medida válida!")
+
+
+@store_atomic
+def save_ingredient(ingredient: Ingredient, measure: str) -> None:
+    """Grava o ingrediente, convertendo receitas, embalagens e lotes quando a unidade muda.
+
+    As quantidades de um ingrediente são sempre gravadas na unidade dele, então a troca
+    de unidade converte tudo de uma vez (um UPDATE por tabela), na mesma transação. Se o
+    estoque foi reduzido, a diferença sai dos lotes (ver stock.lots.trim_lots).
+
+    Args:
+        ingredient (Ingredient): Ingrediente com os novos dados.
+        measure (str): Nova unidade de medida.
+
+    Raises:
+        ValidationError: Se a unidade é inválida, ou é de outra grandeza e o ingrediente
+            já está em receitas, embalagens ou lotes abertos.
+    """
+
+    validate_measure(measure)
+    previous, stock = Ingredient.objects.filter(id=ingredient.id).values_list("measure", "qte").first() or (None, None)
+
+    if previous is not None and previous != measure:
+        recipes = ProductIngredient.objects.filter(ingredient=ingredient)
+        packs = Pack.objects.filter(ingredient=ingredient)
+        lots = StockLot.objects.filter(ingredient=ingredient)
+        if (previous, measure) in units.FACTORS:
+            factor = units.factor(previous, measure)
+            if recipes.update(quantity=F("quantity") * factor):
+                # update não dispara sinais
+                bump_version("stock")
+                log_changes(recipes.select_related("product"))
+            packs.update(quantity=F("quantity") * factor)
+            lots.update(quantity=F("quantity") * factor, remaining=F("remaining") * factor)
+            stock *= factor
+        elif recipes.exists() or packs.exists() or lots.filter(remaining__gt=0).exists():
+            raise ValidationError(
+                f"Não é possível converter {units.label(previous)} em {units.label(measure)}: "
+                "o ingrediente já é usado em receitas, embalagens ou lotes abertos"
+            )
+
+    ingredient.measure = measure
+    ingredient.save()
+    if stock is not None:
+        trim_lots([ingredient], {ingredient.id: stock})
+
+
+def recipe_changed(version: RecipeVersion | None, items: list[ProductIngredient]) -> bool:
+    """Compara a receita atual com a versão, convertendo as unidades que mudaram desde ela."""
+
+    if version is None:
+        return True
+
+    current = {item.ingredient_id: (item.quantity, item.ingredient.measure) for item in items}
+    published = list(version.items.all())
+    if {item.ingredient_id for item in published} != current.keys():
+        return True
+    for item in published:
+        quantity, measure = current[item.ingredient_id]
+        if units.convert(item.quantity, item.measure, measure) != quantity:
+            return True
+    return False
+
+
+@store_atomic
+def publish_recipe(product: Product) -> RecipeVersion:
+    """Cria uma versão da receita do produto se ela mudou desde a última.
+
+    As versões nunca são alteradas: as saídas apontam para a versão que consumiram, então
+    os relatórios de consumo não mudam quando a receita é editada.
+
+    Args:
+        product (Product): Produto com a receita (ProductIngredient) já gravada.
+
+    Returns:
+        RecipeVersion: Versão atual da receita.
+    """
+
+    items = list(ProductIngredient.objects.filter(product=product).select_related("ingredient"))
+    if not recipe_changed(product.recipe, items):
+        return product.recipe
+
+    number = RecipeVersion.objects.filter(product=product).aggregate(last=Max("number"))["last"] or 0
+    version = RecipeVersion.objects.create(product=product, number=number + 1, name=product.name)
+    RecipeVersionItem.objects.bulk_create(
+        RecipeVersionItem(
+            version=version,
+            ingredient_id=item.ingredient_id,
+            name=item.ingredient.name,
+            measure=item.ingredient.measure,
+            quantity=item.quantity,
+        )
+        for item in items
+    )
+
+    product.recipe = version
+    product.save(update_fields=["recipe"])
+    return version
@@ -0,0 +1,242 @@
+import csv
+import io
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.decorators import retry_on_lock, store_atomic
+from core.routers import store_db
+from core.versioning import bump_version
+from movements.archive import archive_db, archive_path, archived_months
+from movements.models import MovementInflow
+from movements.services import lock_ingredients
+
+from . import units
+from .lots import trim_lots
+from .models import Ingredient, Stocktake, StocktakeLine
+from .sync import log_changes
+
+# Colunas do CSV de contagem
+CSV_NAME = "ingrediente"
+CSV_QUANTITY = "quantidade"
+
+QUANTITY_FIELD = DecimalField(max_digits=20, decimal_places=6)
+
+
+def parse_count(value: str, name: str) -> Decimal:
+    """Converte a quantidade contada (formato brasileiro, zero permitido)."""
+
+    try:
+        count = Decimal(value.strip().replace(".", "").replace(",", "."))
+    except (InvalidOperation, AttributeError):
+        raise ValidationError(f"Insira uma quantidade válida para {name}") from None
+    if count < 0 or not count.is_finite():
+        raise ValidationError(f"Insira uma quantidade válida para {name}")
+    return count
+
+
+def counts_from_form(data) -> dict[int, Decimal]:
+    """Lê as quantidades do formulário (c-<id>); campos vazios não foram contados."""
+
+    counts, errors = {}, []
+    for ingredient in Ingredient.objects.only("id", "name"):
+        value = data.get(f"c-{ingredient.id}", "").strip()
+        if not value:
+            continue
+        try:
+            counts[ingredient.id] = parse_count(value, ingredient.name)
+        except ValidationError as e:
+            errors.extend(e.messages)
+
+    if errors:
+        raise ValidationError(errors)
+    return counts
+
+
+def counts_from_csv(file) -> dict[int, Decimal]:
+    """Lê as quantidades de um CSV com as colunas "ingrediente" e "quantidade".
+
+    O separador pode ser vírgula ou ponto e vírgula, e os ingredientes são buscados pelo
+    nome (sem diferenciar maiúsculas).
+    """
+
+    try:
+        text = file.read().decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValidationError("O arquivo deve estar em UTF-8") from None
+
+    try:
+        dialect = csv.Sniffer().sniff(text.split("\n", 1)[0], delimiters=";,")
+    except csv.Error:
+        raise ValidationError("Arquivo CSV inválido") from None
+
+    reader = csv.DictReader(io.StringIO(text), dialect=dialect)
+    fields = {(field or "").strip().lower() for field in reader.fieldnames or []}
+    if not {CSV_NAME, CSV_QUANTITY} <= fields:
+        raise ValidationError(f'O arquivo deve ter as colunas "{CSV_NAME}" e "{CSV_QUANTITY}"')
+
+    ingredients = {name.lower(): id for id, name in Ingredient.objects.values_list("id", "name")}
+    counts, errors = {}, []
+    for row in reader:
+        row = {(key or "").strip().lower(): value for key, value in row.items()}
+        name = (row.get(CSV_NAME) or "").strip()
+        if not name:
+            continue
+        if name.lower() not in ingredients:
+            errors.append(f"Ingrediente não encontrado: {name}")
+            continue
+        try:
+            counts[ingredients[name.lower()]] = parse_count(row.get(CSV_QUANTITY) or "", name)
+        except ValidationError as e:
+            errors.extend(e.messages)
+
+    if errors:
+        raise ValidationError(errors)
+    return counts
+
+
+def base_factor(field: str) -> Case:
+    """Fator de cada unidade para a unidade base da grandeza (g, ml, unit), em SQL."""
+
+    whens = [When(**{field: code}, then=Value(factor)) for code, (_, factor, _) in units.UNITS.items()]
+    return Case(*whens, output_field=QUANTITY_FIELD)
+
+
+def archived_inflows(since: dict, measures: dict[int, str]) -> dict[int, Decimal]:
+    """Entradas de cada ingrediente desde a última contagem que já estão no arquivo.
+
+    Só são lidos os meses arquivados (ver movements.archive) posteriores à contagem
+    mais antiga, normalmente nenhum.
+
+    Args:
+        since (dict): Data da última contagem por id do ingrediente.
+        measures (dict): Unidade de cada ingrediente.
+
+    Returns:
+        dict: Entradas na unidade do ingrediente, por id do ingrediente.
+    """
+
+    using = store_db()
+    start = min(since.values())
+    months = [month for month in archived_months(start, timezone.now()) if archive_path(month, using).exists()]
+
+    totals = defaultdict(Decimal)
+    for month in months:
+        rows = MovementInflow.objects.using(archive_db(month, using)).filter(
+            ingredient_id__in=since, movement__date__gt=start
+        )
+        for ingredient_id, date, quantity, measure in rows.values_list(
+            "ingredient_id", "movement__date", "quantity", "measure"
+        ):
+            if date > since[ingredient_id]:
+                totals[ingredient_id] += units.convert(quantity, measure, measures[ingredient_id])
+    return totals
+
+
+def usage_baseline(ingredient_ids) -> dict[int, tuple[Decimal, Decimal] | None]:
+    """Última contagem e entradas desde ela de cada ingrediente.
+
+    As entradas são ligadas ao ingrediente pelo id (um ingrediente renomeado mantém o
+    histórico) e somadas no banco já convertidas para a unidade do ingrediente, em uma
+    consulta; as que já foram arquivadas são somadas por archived_inflows.
+
+    Returns:
+        dict: (quantidade contada, entradas desde a contagem) por ingrediente, ou None
+            para ingredientes nunca contados.
+    """
+
+    last_line = StocktakeLine.objects.filter(ingredient=OuterRef(OuterRef("pk"))).order_by("-id")
+    inflows = (
+        MovementInflow.objects.filter(
+            ingredient=OuterRef("pk"), movement__date__gt=Subquery(last_line.values("stocktake__date")[:1])
+        )
+        .values("ingredient")
+        .annotate(total=Sum(F("quantity") * base_factor("measure"), output_field=QUANTITY_FIELD))
+        .values("total")
+    )
+
+    lines = StocktakeLine.objects.filter(ingredient=OuterRef("pk")).order_by("-id")
+    rows = list(
+        Ingredient.objects.filter(id__in=ingredient_ids)
+        .annotate(
+            last_counted=Subquery(lines.values("counted")[:1]),
+            last_date=Subquery(lines.values("stocktake__date")[:1]),
+            inflow=Coalesce(Subquery(inflows), Value(0), output_field=QUANTITY_FIELD) / base_factor("measure"),
+        )
+        .values_list("id", "measure", "last_counted", "last_date", "inflow")
+    )
+
+    since = {id: last_date for id, _, last_counted, last_date, _ in rows if last_counted is not None}
+    archived = archived_inflows(since, {id: measure for id, measure, *_ in rows}) if since else {}
+    return {
+        id: None if last_counted is None else (last_counted, Decimal(inflow or 0) + archived.get(id, 0))
+        for id, _, last_counted, _, inflow in rows
+    }
+
+
+def quantize(value: Decimal) -> Decimal:
+    return Decimal(value).quantize(Decimal("0.001"))
+
+
+@retry_on_lock()
+@store_atomic
+def apply_stocktake(counts: dict[int, Decimal], username: str, commentary: str = "") -> Stocktake:
+    """Aplica a contagem: o estoque de cada ingrediente contado passa a ser o contado.
+
+    Os ingredientes são travados, o estoque é gravado com um único bulk_update e cada
+    ingrediente recebe uma linha com o esperado, o contado e o consumo teórico e real
+    desde a contagem anterior.
+
+    Args:
+        counts (dict): Quantidade contada por id do ingrediente.
+        username (str): Nome do responsável.
+        commentary (str): Comentário sobre a contagem.
+
+    Returns:
+        Stocktake: Contagem registrada.
+    """
+
+    if not counts:
+        raise ValidationError(["Informe a quantidade contada de ao menos 1 ingrediente"])
+
+    ingredients = lock_ingredients(counts.keys())
+    previous = {ingredient.id: ingredient.qte for ingredient in ingredients.values()}
+    baseline = usage_baseline(ingredients.keys())
+
+    stocktake = Stocktake.objects.create(user=username, commentary=commentary)
+    lines = []
+    for ingredient in ingredients.values():
+        expected, counted = ingredient.qte, quantize(counts[ingredient.id])
+        theoretical = actual = None
+        if baseline.get(ingredient.id) is not None:
+            last_counted, inflow = baseline[ingredient.id]
+            # O sistema desconta o consumo das receitas: o que falta para o esperado é o teórico
+            theoretical = quantize(last_counted + inflow - expected)
+            actual = quantize(last_counted + inflow - counted)
+
+        lines.append(
+            StocktakeLine(
+                stocktake=stocktake,
+                ingredient=ingredient,
+                name=ingredient.name,
+                measure=ingredient.measure,
+                expected=expected,
+                counted=counted,
+                theoretical_usage=theoretical,
+                actual_usage=actual,
+            )
+        )
+        ingredient.qte = counted
+
+    StocktakeLine.objects.bulk_create(lines)
+    Ingredient.objects.bulk_update(ingredients.values(), ["qte"])
+    # bulk_update não dispara sinais
+    bump_version("stock")
+    log_changes(ingredients.values())
+    # Contado abaixo do esperado: a diferença sai dos lotes, na ordem de consumo
+    trim_lots(ingredients.values(), previous)
+    return stocktake
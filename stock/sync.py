@@ -0,0 +1,258 @@
+import json
+from decimal import Decimal
+
+import msgpack
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, router, transaction
+from django.db.models import Max, Q
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+from core.routers import current_store
+
+from .models import CatalogChange, CatalogVersion, Category, Ingredient, Product, ProductIngredient
+
+# Nome de cada model no registro de alterações e no retorno da sincronização
+SYNC_MODELS = {
+    "category": Category,
+    "ingredient": Ingredient,
+    "product": Product,
+    "productingredient": ProductIngredient,
+}
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+
+def snapshot(instance) -> dict:
+    """Campos do registro enviados ao terminal (sem o id e a loja)."""
+
+    data = {}
+    for field in instance._meta.concrete_fields:
+        if field.primary_key or field.name == "store":
+            continue
+        value = field.value_from_object(instance)
+        # Valores vindos do formulário ainda são texto; o terminal recebe o mesmo formato do banco
+        if isinstance(field, models.DecimalField) and value is not None:
+            value = field.to_python(value).quantize(Decimal(10) ** -field.decimal_places)
+        data[field.attname] = value
+    return data
+
+
+def change_store(instance) -> int | None:
+    # Receitas não têm loja própria, pertencem à loja do produto
+    if isinstance(instance, ProductIngredient):
+        return instance.product.store_id
+    return getattr(instance, "store_id", None)
+
+
+def next_versions(count: int, using: str) -> int:
+    """Reserva as próximas versões do registro de alterações.
+
+    Trava a linha do contador até o fim da transação: outra gravação do registro espera
+    o commit desta, então uma versão nunca fica visível antes de uma menor.
+
+    Returns:
+        int: Primeira versão reservada.
+    """
+
+    counter, _ = CatalogVersion.objects.using(using).select_for_update().get_or_create(id=1)
+    counter.version += count
+    counter.save(update_fields=["version"])
+    return counter.version - count + 1
+
+
+def write_changes(records: list[tuple], using: str) -> None:
+    """Grava as alterações já commitadas, com o estado atual de cada registro.
+
+    Roda em uma transação curta própria, depois do commit de quem alterou o catálogo. O
+    estado é lido aqui, com o contador travado: se duas transações gravam fora de ordem,
+    a de versão maior traz o estado mais recente, e um registro removido nesse meio
+    tempo é registrado como removido.
+
+    Args:
+        records (list): (model, id, loja, removido) de cada registro alterado.
+        using (str): Banco dos registros.
+    """
+
+    with transaction.atomic(using=using):
+        first = next_versions(len(records), using)
+
+        current = {}
+        for model in {model for model, _, _, deleted in records if not deleted}:
+            ids = [id for record_model, id, _, deleted in records if record_model is model and not deleted]
+            current[model] = model._base_manager.using(using).in_bulk(ids)
+
+        changes = []
+        for index, (model, id, store_id, deleted) in enumerate(records):
+            instance = None if deleted else current[model].get(id)
+            changes.append(
+                CatalogChange(
+                    version=first + index,
+                    model=model._meta.model_name,
+                    object_id=id,
+                    data=None if instance is None else snapshot(instance),
+                    store_id=store_id,
+                )
+            )
+        CatalogChange.objects.using(using).bulk_create(changes)
+
+
+def log_changes(instances, deleted: bool = False, using: str | None = None) -> None:
+    """Registra a alteração dos registros depois do commit da transação que os alterou.
+
+    Deve ser chamado após bulk_update e update, que não disparam sinais (ex: estoque
+    alterado pelas movimentações). O registro é gravado por write_changes no on_commit,
+    então o contador de versões só fica travado pela gravação do registro, nunca durante
+    uma movimentação ou contagem de estoque.
+
+    Args:
+        instances (list): Registros alterados.
+        deleted (bool): Se os registros foram removidos.
+        using (str): Banco dos registros (padrão: o banco da loja atual).
+    """
+
+    # A loja é lida agora: o produto de um item de receita removido não existe depois do commit
+    records = [(type(instance), instance.pk, change_store(instance), deleted) for instance in instances]
+    if not records:
+        return
+
+    using = using or router.db_for_write(CatalogChange)
+    # Fora de um bloco atômico o on_commit executa imediatamente
+    transaction.on_commit(lambda: write_changes(records, using), using=using)
+
+
+def connect_signals() -> None:
+    """Registra as alterações feitas pelo ORM (save e delete) nos models do catálogo."""
+
+    def saved(sender, instance, using, **kwargs):
+        log_changes([instance], using=using)
+
+    def deleted(sender, instance, using, **kwargs):
+        log_changes([instance], deleted=True, using=using)
+
+    for model in SYNC_MODELS.values():
+        uid = f"sync:{model._meta.label}"
+        post_save.connect(saved, sender=model, weak=False, dispatch_uid=uid)
+        post_delete.connect(deleted, sender=model, weak=False, dispatch_uid=uid + ":delete")
+
+    # Remover uma categoria limpa a categoria dos ingredientes por um UPDATE (SET_NULL),
+    # sem sinais; os ingredientes afetados são guardados antes e registrados depois
+    def category_deleting(sender, instance, using, **kwargs):
+        instance._sync_ingredients = list(
+            Ingredient._base_manager.using(using).filter(category=instance).values_list("id", flat=True)
+        )
+
+    def category_deleted(sender, instance, using, **kwargs):
+        ingredients = getattr(instance, "_sync_ingredients", [])
+        if ingredients:
+            log_changes(Ingredient._base_manager.using(using).filter(id__in=ingredients).order_by("id"), using=using)
+
+    pre_delete.connect(category_deleting, sender=Category, weak=False, dispatch_uid="sync:category:ingredients")
+    post_delete.connect(category_deleted, sender=Category, weak=False, dispatch_uid="sync:category:ingredients")
+
+
+def store_changes():
+    """Alterações visíveis para a loja atual (as dela e as das categorias)."""
+
+    store = current_store.get()
+    if store is None:
+        return CatalogChange.objects.all()
+    return CatalogChange.objects.filter(Q(store_id=store.id) | Q(store_id=None))
+
+
+def full_snapshot() -> dict:
+    """Todos os registros do catálogo da loja, para um terminal sem cópia local."""
+
+    # A versão é lida antes dos registros: alterações feitas durante a leitura são
+    # reenviadas na próxima sincronização, nunca perdidas
+    version = store_changes().aggregate(version=Max("version"))["version"] or 0
+
+    products = Product.objects.all()
+    querysets = {
+        "category": Category.objects.all(),
+        "ingredient": Ingredient.objects.all(),
+        "product": products,
+        "productingredient": ProductIngredient.objects.filter(product__in=products.values("id")),
+    }
+    changes = [
+        [name, instance.pk, snapshot(instance)]
+        for name, queryset in querysets.items()
+        for instance in queryset.order_by("id")
+    ]
+    return {"version": version, "full": True, "more": False, "changes": changes}
+
+
+def changes_since(since: int, limit: int) -> dict:
+    """Alterações do catálogo posteriores à versão informada.
+
+    Cada registro aparece uma vez, com o estado da alteração mais recente da página. Sem
+    versão (0) retorna o catálogo completo (full=True).
+
+    Args:
+        since (int): Última versão recebida pelo terminal.
+        limit (int): Máximo de alterações lidas por página.
+
+    Returns:
+        dict: version (nova versão do terminal), full, more (há outra página) e
+            changes ([model, id, campos ou None quando removido]).
+    """
+
+    if since <= 0:
+        return full_snapshot()
+
+    rows = list(
+        store_changes()
+        .filter(version__gt=since)
+        .order_by("version")
+        .values_list("version", "model", "object_id", "data")[: limit + 1]
+    )
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for _, model, object_id, data in rows:
+        # A alteração mais recente de cada registro substitui as anteriores
+        latest.pop((model, object_id), None)
+        latest[(model, object_id)] = data
+
+    return {
+        "version": rows[-1][0] if rows else since,
+        "full": False,
+        "more": more,
+        "changes": [[model, object_id, data] for (model, object_id), data in latest.items()],
+    }
+
+
+def compact_changes(using: str) -> int:
+    """Mantém apenas a alteração mais recente de cada registro.
+
+    Um terminal em qualquer versão continua recebendo o estado atual de cada registro
+    alterado depois dela, então as alterações substituídas podem ser removidas.
+
+    Returns:
+        int: Quantidade de alterações removidas.
+    """
+
+    changes = CatalogChange.objects.using(using)
+    latest = changes.values("model", "object_id").annotate(latest=Max("version")).values("latest")
+    removed, _ = changes.exclude(version__in=latest).delete()
+    return removed
+
+
+def wants_msgpack(request) -> bool:
+    if request.GET.get("format") == "msgpack":
+        return True
+    accept = request.headers.get("Accept", "")
+    return any(content_type in accept for content_type in MSGPACK_TYPES)
+
+
+def encode(payload: dict, msgpack_format: bool) -> tuple[bytes, str]:
+    """Serializa a sincronização em MessagePack ou JSON compacto.
+
+    Returns:
+        tuple: Conteúdo e content type.
+    """
+
+    # Decimais viram texto nos dois formatos, sem perder precisão
+    if msgpack_format:
+        return msgpack.packb(payload, default=str), "application/msgpack"
+    return json.dumps(payload, cls=DjangoJSONEncoder, separators=(",", ":")).encode(), "application/json"
@@ -1,3 +1,498 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import QueryDict
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils.timezone import localdate, make_aware
+
+from accounts.models import CustomUser
+from stores.models import Store
+from stores.services import using_store
+
+from . import units
+from .lots import flag_expiring_lots
+from .planning import simulate
+from .models import (
+    CatalogChange,
+    CatalogVersion,
+    Category,
+    Ingredient,
+    Pack,
+    Product,
+    ProductIngredient,
+    StockLot,
+    StocktakeLine,
+)
+from .services import publish_recipe, save_ingredient
+from .stocktake import apply_stocktake, counts_from_csv
+from .sync import changes_since, compact_changes, log_changes
+
+
+def latest_version() -> int:
+    return CatalogChange.objects.order_by("-version").values_list("version", flat=True).first() or 0
+
+
+class ChangesSinceTests(TransactionTestCase):
+    """Sincronização do catálogo pelos terminais (stock/sync).
+
+    As alterações são registradas no on_commit, que o TestCase nunca executa.
+    """
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Laticínios")
+        self.cheese = Ingredient.objects.create(name="Queijo", measure="kg", qte=Decimal("10"), category=self.category)
+
+    def test_without_version_returns_full_catalog(self):
+        result = changes_since(0, 100)
+
+        self.assertTrue(result["full"])
+        self.assertEqual(result["version"], latest_version())
+        names = {(model, data["name"]) for model, _, data in result["changes"]}
+        self.assertEqual(names, {("category", "Laticínios"), ("ingredient", "Queijo")})
+
+    def test_returns_latest_state_once(self):
+        since = latest_version()
+        self.cheese.qte = Decimal("8")
+        self.cheese.save()
+        self.cheese.qte = Decimal("5")
+        self.cheese.save()
+
+        result = changes_since(since, 100)
+
+        self.assertEqual(result["version"], latest_version())
+        self.assertEqual(len(result["changes"]), 1)
+        model, object_id, data = result["changes"][0]
+        self.assertEqual((model, object_id, data["qte"]), ("ingredient", self.cheese.id, "5.000"))
+
+    def test_versions_grow_with_each_change(self):
+        since = latest_version()
+        log_changes([self.cheese, self.category])
+
+        versions = list(CatalogChange.objects.filter(version__gt=since).values_list("version", flat=True))
+        self.assertEqual(sorted(versions), [since + 1, since + 2])
+
+    def test_changes_are_written_after_commit(self):
+        since = latest_version()
+        with transaction.atomic():
+            log_changes([self.cheese])
+            # O contador não é travado durante a transação que alterou o estoque
+            self.assertEqual(latest_version(), since)
+            self.assertEqual(CatalogVersion.objects.get().version, since)
+
+        self.assertEqual(latest_version(), since + 1)
+
+    def test_change_has_current_state(self):
+        since = latest_version()
+        with transaction.atomic():
+            log_changes([self.cheese])
+            Ingredient.objects.filter(id=self.cheese.id).update(qte=Decimal("3"))
+
+        [(model, object_id, data)] = changes_since(since, 100)["changes"]
+        self.assertEqual((model, object_id, data["qte"]), ("ingredient", self.cheese.id, "3.000"))
+
+    def test_pages(self):
+        since = latest_version()
+        for name in ("Tomate", "Orégano", "Farinha"):
+            Ingredient.objects.create(name=name, measure="kg")
+
+        first = changes_since(since, 2)
+        second = changes_since(first["version"], 2)
+
+        self.assertTrue(first["more"])
+        self.assertFalse(second["more"])
+        names = [data["name"] for _, _, data in first["changes"] + second["changes"]]
+        self.assertEqual(names, ["Tomate", "Orégano", "Farinha"])
+
+    def test_deleted_records(self):
+        since = latest_version()
+        product = Product.objects.create(name="Pizza")
+        ProductIngredient.objects.create(product=product, ingredient=self.cheese, quantity=1)
+        product.delete()
+
+        changes = {(model, data) for model, _, data in changes_since(since, 100)["changes"]}
+        self.assertEqual(changes, {("product", None), ("productingredient", None)})
+
+    def test_category_delete_logs_ingredients(self):
+        since = latest_version()
+        self.category.delete()
+
+        changes = {model: data for model, _, data in changes_since(since, 100)["changes"]}
+        self.assertIsNone(changes["category"])
+        self.assertIsNone(changes["ingredient"]["category_id"])
+
+    def test_store_sees_own_changes_and_categories(self):
+        centro = Store.objects.create(name="Centro", code="centro")
+        sul = Store.objects.create(name="Sul", code="sul")
+        since = latest_version()
+        with using_store(centro):
+            product = Product.objects.create(name="Pizza")
+            ProductIngredient.objects.create(product=product, ingredient=self.cheese, quantity=1)
+        with using_store(sul):
+            Product.objects.create(name="Calzone")
+
+        with using_store(centro):
+            changes = changes_since(since, 100)["changes"]
+
+        self.assertEqual([model for model, *_ in changes], ["product", "productingredient"])
+
+    def test_compact_keeps_latest_change(self):
+        for qte in ("8", "5"):
+            self.cheese.qte = Decimal(qte)
+            self.cheese.save()
+
+        self.assertEqual(compact_changes("default"), 2)
+        self.assertEqual(CatalogChange.objects.filter(model="ingredient").get().data["qte"], "5.000")
+
+
+class CatalogSyncViewTests(TransactionTestCase):
+    def setUp(self):
+        user = CustomUser.objects.create_user(
+            username="caixa",
+            email="caixa@devspizza.com",
+            password="senha-forte",
+            role="employee",
+            first_name="Caixa",
+            last_name="Teste",
+        )
+        self.client.force_login(user)
+
+    def test_invalid_version(self):
+        self.assertEqual(self.client.get(reverse("catalog_sync"), {"since": "abc"}).status_code, 400)
+
+    def test_version_header(self):
+        Category.objects.create(name="Molhos")
+        response = self.client.get(reverse("catalog_sync"))
+
+        self.assertEqual(response["X-Catalog-Version"], str(latest_version()))
+        self.assertEqual(response.json()["changes"][0][:2], ["category", Category.objects.get().id])
+
+
+class UnitsTests(SimpleTestCase):
+    def test_converts_within_dimension(self):
+        self.assertEqual(units.convert(Decimal("2500"), "g", "kg"), Decimal("2.5"))
+        self.assertEqual(units.convert(Decimal("1.5"), "l", "ml"), Decimal("1500"))
+        self.assertEqual(units.convert(Decimal("2"), "dz", "unit"), Decimal("24"))
+
+    def test_rejects_other_dimension(self):
+        with self.assertRaisesMessage(ValidationError, "Não é possível converter Quilos em Unidades"):
+            units.convert(Decimal("1"), "kg", "unit")
+
+    def test_compatible_units(self):
+        self.assertEqual([code for code, _ in units.COMPATIBLE["ml"]], ["ml", "l"])
+
+
+class SaveIngredientTests(TestCase):
+    def setUp(self):
+        self.cheese = Ingredient.objects.create(name="Queijo", measure="kg", qte=Decimal("2"))
+        self.pizza = Product.objects.create(name="Pizza", price=Decimal("40"))
+        ProductIngredient.objects.create(product=self.pizza, ingredient=self.cheese, quantity=Decimal("0.250"))
+        Pack.objects.create(ingredient=self.cheese, name="Peça", quantity=Decimal("3"))
+
+    def test_measure_change_converts_recipes_and_packs(self):
+        self.cheese.qte = Decimal("2000")
+        save_ingredient(self.cheese, "g")
+
+        self.assertEqual(ProductIngredient.objects.get().quantity, Decimal("250"))
+        self.assertEqual(Pack.objects.get().quantity, Decimal("3000"))
+        self.assertEqual(Ingredient.objects.get().measure, "g")
+
+    def test_measure_change_to_other_dimension_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            save_ingredient(self.cheese, "unit")
+
+        self.assertEqual(Ingredient.objects.get().measure, "kg")
+        self.assertEqual(ProductIngredient.objects.get().quantity, Decimal("0.250"))
+
+
+class StocktakeTests(TestCase):
+    def setUp(self):
+        self.cheese = Ingredient.objects.create(name="Queijo", measure="kg", qte=Decimal("10"))
+        self.dough = Ingredient.objects.create(name="Massa", measure="unit", qte=Decimal("50"))
+
+    def test_applies_counts_and_records_variance(self):
+        apply_stocktake({self.cheese.id: Decimal("9.5"), self.dough.id: Decimal("50")}, "gerente")
+
+        self.cheese.refresh_from_db()
+        self.assertEqual(self.cheese.qte, Decimal("9.500"))
+        line = StocktakeLine.objects.get(ingredient=self.cheese)
+        self.assertEqual((line.expected, line.counted, line.variance), (Decimal("10"), Decimal("9.5"), Decimal("-0.5")))
+        # Primeira contagem: sem consumo anterior para comparar
+        self.assertIsNone(line.actual_usage)
+
+    def test_usage_since_last_count(self):
+        from movements.services import create_inflow
+
+        apply_stocktake({self.cheese.id: Decimal("10")}, "gerente")
+
+        data = QueryDict(mutable=True)
+        data.setlist("ingredients", [str(self.cheese.id)])
+        data.update({f"qi-{self.cheese.id}": "2000", f"pi-{self.cheese.id}": "50,00", f"m-{self.cheese.id}": "g"})
+        data["commentary"] = ""
+        create_inflow(data, "estoquista")
+        # Saídas pelas receitas: 3 kg
+        Ingredient.objects.filter(id=self.cheese.id).update(qte=Decimal("9"))
+
+        apply_stocktake({self.cheese.id: Decimal("8")}, "gerente")
+
+        line = StocktakeLine.objects.filter(ingredient=self.cheese).latest("id")
+        self.assertEqual((line.theoretical_usage, line.actual_usage), (Decimal("3.000"), Decimal("4.000")))
+
+    def test_usage_survives_rename(self):
+        from movements.services import create_inflow
+
+        apply_stocktake({self.cheese.id: Decimal("10")}, "gerente")
+        data = QueryDict(mutable=True)
+        data.setlist("ingredients", [str(self.cheese.id)])
+        data.update({f"qi-{self.cheese.id}": "2", f"pi-{self.cheese.id}": "50,00", f"m-{self.cheese.id}": "kg"})
+        data["commentary"] = ""
+        create_inflow(data, "estoquista")
+        self.cheese.refresh_from_db()
+        self.cheese.name = "Mussarela"
+        self.cheese.save()
+
+        apply_stocktake({self.cheese.id: Decimal("11")}, "gerente")
+
+        line = StocktakeLine.objects.filter(ingredient=self.cheese).latest("id")
+        self.assertEqual(line.actual_usage, Decimal("1.000"))
+
+    def test_requires_a_count(self):
+        with self.assertRaises(ValidationError):
+            apply_stocktake({}, "gerente")
+
+    def test_reads_csv(self):
+        file = SimpleUploadedFile("contagem.csv", "ingrediente;quantidade\nqueijo;7,250\nMassa;0\n".encode())
+
+        self.assertEqual(counts_from_csv(file), {self.cheese.id: Decimal("7.250"), self.dough.id: Decimal("0")})
+
+    def test_csv_with_unknown_ingredient(self):
+        file = SimpleUploadedFile("contagem.csv", b"ingrediente,quantidade\nTomate,3\n")
+
+        with self.assertRaisesMessage(ValidationError, "Ingrediente não encontrado: Tomate"):
+            counts_from_csv(file)
+
+
+class StockLotTests(TestCase):
+    def setUp(self):
+        self.cheese = Ingredient.objects.create(name="Queijo", measure="kg", qte=Decimal("0"))
+        self.pizza = Product.objects.create(name="Pizza", price=Decimal("40"))
+        ProductIngredient.objects.create(product=self.pizza, ingredient=self.cheese, quantity=Decimal("1"))
+
+    def receive(self, quantity: str, expires_on: str = ""):
+        from movements.services import create_inflow
+
+        data = QueryDict(mutable=True)
+        data.setlist("ingredients", [str(self.cheese.id)])
+        data.update(
+            {
+                f"qi-{self.cheese.id}": quantity,
+                f"pi-{self.cheese.id}": "10,00",
+                f"m-{self.cheese.id}": "kg",
+                f"v-{self.cheese.id}": expires_on,
+                "commentary": "",
+            }
+        )
+        create_inflow(data, "estoquista")
+
+    def sell(self, quantity: str):
+        from movements.services import create_outflow
+
+        data = QueryDict(mutable=True)
+        data.setlist("products", [str(self.pizza.id)])
+        data.update({f"qp-{self.pizza.id}": quantity, "commentary": ""})
+        create_outflow(data, "caixa")
+
+    def remaining(self) -> list:
+        return list(StockLot.objects.order_by("id").values_list("remaining", flat=True))
+
+    def test_inflow_creates_lot(self):
+        self.receive("500", "2030-01-10")
+
+        lot = StockLot.objects.get()
+        self.assertEqual(
+            (lot.quantity, lot.remaining, lot.expires_on), (Decimal("500"), Decimal("500"), date(2030, 1, 10))
+        )
+        self.assertFalse(lot.expiring)
+
+    def test_outflow_consumes_first_expiring_lot(self):
+        self.receive("5", "2030-02-01")
+        self.receive("5", "2030-01-01")
+        self.receive("5")
+
+        self.sell("7")
+
+        self.assertEqual(self.remaining(), [Decimal("3"), Decimal("0"), Decimal("5")])
+
+    @override_settings(LOT_CONSUMPTION="fifo")
+    def test_fifo_consumes_first_received_lot(self):
+        self.receive("5", "2030-02-01")
+        self.receive("5", "2030-01-01")
+
+        self.sell("7")
+
+        self.assertEqual(self.remaining(), [Decimal("0"), Decimal("3")])
+
+    def test_stock_without_lot_is_consumed_last(self):
+        Ingredient.objects.filter(id=self.cheese.id).update(qte=Decimal("4"))
+        self.receive("5", "2030-01-01")
+        self.receive("5", "2030-02-01")
+
+        self.sell("6")
+
+        # Os lotes saem na ordem de validade; o estoque sem lote continua intacto
+        self.assertEqual(self.remaining(), [Decimal("0"), Decimal("4")])
+        self.cheese.refresh_from_db()
+        self.assertEqual(self.cheese.qte, Decimal("8"))
+
+    def test_stocktake_surplus_is_consumed_last(self):
+        self.receive("5", "2030-01-01")
+        apply_stocktake({self.cheese.id: Decimal("8")}, "gerente")
+
+        self.sell("6")
+
+        self.assertEqual(self.remaining(), [Decimal("0")])
+
+    def test_stocktake_consumes_lots(self):
+        self.receive("5", "2030-01-01")
+
+        apply_stocktake({self.cheese.id: Decimal("2")}, "gerente")
+
+        self.assertEqual(self.remaining(), [Decimal("2")])
+
+    def test_nightly_pass_flags_lots_near_expiry(self):
+        today = localdate()
+        self.receive("5", (today + timedelta(days=30)).isoformat())
+        self.receive("5", (today + timedelta(days=10)).isoformat())
+        self.receive("5")
+
+        self.assertEqual(flag_expiring_lots("default", days=10), 1)
+        flagged = StockLot.objects.filter(expiring=True).values_list("expires_on", flat=True)
+        self.assertEqual(list(flagged), [today + timedelta(days=10)])
+
+    def test_lot_near_expiry_is_flagged_on_inflow(self):
+        self.receive("5", localdate().isoformat())
+
+        self.assertTrue(StockLot.objects.get().expiring)
+
+    def test_rejects_invalid_expiry(self):
+        with self.assertRaisesMessage(ValidationError, "Insira uma data de validade válida para Queijo"):
+            self.receive("5", "31/12/2030")
+
+
+class RecipeVersionTests(TestCase):
+    def setUp(self):
+        self.cheese = Ingredient.objects.create(name="Queijo", measure="kg", qte=Decimal("10"))
+        self.tomato = Ingredient.objects.create(name="Tomate", measure="kg", qte=Decimal("10"))
+        self.pizza = Product.objects.create(name="Pizza", price=Decimal("40"))
+        self.item = ProductIngredient.objects.create(
+            product=self.pizza, ingredient=self.cheese, quantity=Decimal("0.300")
+        )
+
+    def test_versions_only_when_recipe_changes(self):
+        first = publish_recipe(self.pizza)
+        self.assertEqual(publish_recipe(self.pizza), first)
+
+        ProductIngredient.objects.create(product=self.pizza, ingredient=self.tomato, quantity=Decimal("0.100"))
+        second = publish_recipe(self.pizza)
+
+        self.assertEqual((first.number, second.number), (1, 2))
+        self.assertEqual([item.name for item in first.items.all()], ["Queijo"])
+        self.assertEqual(Product.objects.get().recipe, second)
+
+    def test_measure_change_keeps_version(self):
+        version = publish_recipe(self.pizza)
+        save_ingredient(self.cheese, "g")
+
+        self.assertEqual(publish_recipe(Product.objects.get()), version)
+
+    def test_versions_are_immutable(self):
+        version = publish_recipe(self.pizza)
+
+        with self.assertRaises(ValueError):
+            version.save()
+
+    def test_consumption_uses_the_version_sold(self):
+        from movements.archive import recipe_consumption
+        from movements.models import MovementOutflow
+        from movements.services import create_outflow
+
+        def sell(quantity: str):
+            data = QueryDict(mutable=True)
+            data.setlist("products", [str(self.pizza.id)])
+            data.update({f"qp-{self.pizza.id}": quantity, "commentary": ""})
+            create_outflow(data, "caixa")
+
+        sell("2")
+        self.item.quantity = Decimal("0.500")
+        self.item.save()
+        self.pizza.refresh_from_db()
+        publish_recipe(self.pizza)
+        sell("1")
+
+        versions = MovementOutflow.objects.order_by("id").values_list("recipe__number", flat=True)
+        self.assertEqual(list(versions), [1, 2])
+        today = localdate()
+        start = make_aware(datetime.combine(today, time.min))
+        consumption = recipe_consumption(start, start + timedelta(days=1))
+        self.assertEqual(consumption, [{"name": "Queijo", "measure": "kg", "quantity": Decimal("1.100")}])
+
+
+class SalesPlanTests(TestCase):
+    def setUp(self):
+        from movements.models import Movement, MovementInflow
+
+        self.cheese = Ingredient.objects.create(name="Queijo", measure="kg", qte=Decimal("10"))
+        self.tomato = Ingredient.objects.create(name="Tomate", measure="kg", qte=Decimal("20"))
+        self.pizza = Product.objects.create(name="Calabresa", price=Decimal("40"))
+        ProductIngredient.objects.create(product=self.pizza, ingredient=self.cheese, quantity=Decimal("0.300"))
+        ProductIngredient.objects.create(product=self.pizza, ingredient=self.tomato, quantity=Decimal("0.100"))
+        publish_recipe(self.pizza)
+
+        # Última entrada em gramas: R$ 100,00 por 2 kg
+        movement = Movement.objects.create(user="Ana", type="in", value=Decimal("100"))
+        MovementInflow.objects.create(
+            movement=movement, name="Queijo", quantity=Decimal("2000"), price=Decimal("100"), measure="g"
+        )
+
+    def test_shortfall_and_cost(self):
+        result = simulate([{self.pizza.id: 50}])[0]
+
+        cheese, tomato = result["ingredients"]
+        self.assertEqual((cheese["name"], cheese["required"], cheese["shortfall"]), ("Queijo", 15, 5))
+        self.assertEqual(cheese["cost"], Decimal("250.00"))
+        self.assertEqual((tomato["shortfall"], tomato["cost"]), (0, None))
+        self.assertEqual((result["short"], result["cost"]), (1, Decimal("250.00")))
+
+    def test_measure_changed_since_the_version(self):
+        self.cheese.qte = Decimal("10000")
+        save_ingredient(self.cheese, "g")
+
+        cheese = simulate([{self.pizza.id: 50}])[0]["ingredients"][0]
+        self.assertEqual((cheese["measure"], cheese["required"], cheese["shortfall"]), ("g", 15000, 5000))
+
+    def test_scenarios_read_recipes_once(self):
+        simulate([{self.pizza.id: 1}])
+
+        # Produtos, estoque e as duas consultas de custo; os itens da receita vêm do cache
+        with self.assertNumQueries(4):
+            small, large = simulate([{self.pizza.id: 10}, {self.pizza.id: 100}])
+        self.assertEqual((small["short"], large["short"]), (0, 1))
+
+    def test_json_endpoint(self):
+        user = CustomUser.objects.create_user(
+            username="gerente", email="gerente@devspizza.com", password="senha-forte", role="admin"
+        )
+        self.client.force_login(user)
+        url = reverse("sales_plan_simulate")
+
+        body = {"scenarios": [{"name": "Sábado", "plan": {str(self.pizza.id): 300}}]}
+        response = self.client.post(url, body, content_type="application/json")
+        scenario = response.json()["scenarios"][0]
+        self.assertEqual((scenario["name"], scenario["short"]), ("Sábado", 2))
+
+        response = self.client.post(url, {"plan": {"999": 1}}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"], ["Produto não encontrado: 999"])
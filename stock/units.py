@@ -0,0 +1,72 @@
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+
+# Unidade: (grandeza, quantas unidades base da grandeza ela vale, nome)
+UNITS = {
+    "g": ("mass", Decimal(1), "Gramas"),
+    "kg": ("mass", Decimal(1000), "Quilos"),
+    "ml": ("volume", Decimal(1), "Mililitros"),
+    "l": ("volume", Decimal(1000), "Litros"),
+    "unit": ("count", Decimal(1), "Unidades"),
+    "dz": ("count", Decimal(12), "Dúzias"),
+}
+
+MEASURE_CHOICES = [(code, label) for code, (_, _, label) in UNITS.items()]
+
+# Unidades exibidas com casas decimais (as demais são arredondadas para inteiro)
+FRACTIONAL = {"kg", "l", "dz"}
+
+# Prefixo das embalagens (Pack) no campo de unidade do formulário de entrada
+PACK_PREFIX = "pack-"
+
+# Tabela calculada uma vez: fator de cada par de unidades da mesma grandeza
+FACTORS = {
+    (origin, destiny): origin_factor / destiny_factor
+    for origin, (dimension, origin_factor, _) in UNITS.items()
+    for destiny, (other, destiny_factor, _) in UNITS.items()
+    if dimension == other
+}
+
+# Unidades em que a quantidade de um ingrediente pode ser informada, por unidade do ingrediente
+COMPATIBLE = {
+    measure: [(code, UNITS[code][2]) for code in UNITS if (code, measure) in FACTORS] for measure in UNITS
+}
+
+
+def label(measure: str) -> str:
+    return UNITS[measure][2] if measure in UNITS else measure
+
+
+def factor(origin: str, destiny: str) -> Decimal:
+    """Fator que converte uma quantidade de origin para destiny.
+
+    Raises:
+        ValidationError: Se as unidades são de grandezas diferentes (ex: Quilos e Unidades).
+    """
+
+    try:
+        return FACTORS[(origin, destiny)]
+    except KeyError:
+        raise ValidationError(f"Não é possível converter {label(origin)} em {label(destiny)}") from None
+
+
+def convert(qte: Decimal, origin: str, destiny: str) -> Decimal:
+    """Converte a quantidade entre duas unidades da mesma grandeza (ex: g em kg).
+
+    Args:
+        qte (Decimal): Quantidade a ser convertida.
+        origin (str): Unidade informada.
+        destiny (str): Unidade do ingrediente.
+
+    Returns:
+        Decimal: Quantidade na unidade do ingrediente.
+    """
+
+    if origin == destiny:
+        return qte
+    return qte * factor(origin, destiny)
+
+
+def is_fractional(measure: str) -> bool:
+    return measure in FRACTIONAL
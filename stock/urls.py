@@ -18,4 +18,10 @@ urlpatterns = [
     path("product/<int:id>", views.product_detail, name="product_detail"),
     path("product/<int:id>/update", views.product_update, name="product_update"),
     path("product/<int:id>/delete", views.product_delete, name="product_delete"),
+    path("stocktake/new", views.stocktake_create, name="stocktake_create"),
+    path("stocktake/", views.stocktake_list, name="stocktake_list"),
+    path("stocktake/<int:id>", views.stocktake_detail, name="stocktake_detail"),
+    path("plan", views.sales_plan, name="sales_plan"),
+    path("plan/simulate", views.sales_plan_simulate, name="sales_plan_simulate"),
+    path("sync", views.catalog_sync, name="catalog_sync"),
 ]
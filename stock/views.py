@@ -1,15 +1,23 @@
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
-from django.http import HttpRequest, HttpResponse
+from django.db.models import Count, F, Q
+from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from django.views.decorators.http import require_http_methods
 
-from core.decorators import admin_required
+from accounts.services import confirm_password
+from core.decorators import admin_required, conditional_view
 
-from .models import Category, Ingredient, Product, ProductIngredient
-from .services import parse_value_br
+from .lots import lot_order
+from .models import Category, Ingredient, Product, ProductIngredient, Stocktake
+from .planning import plan_from_form, plans_from_json, simulate
+from .services import parse_value_br, publish_recipe, save_ingredient, validate_measure
+from .stocktake import apply_stocktake, counts_from_csv, counts_from_form
+from .sync import changes_since, encode, wants_msgpack
 
 
 @login_required
@@ -166,7 +174,7 @@ def category_delete(request: HttpRequest, id: int) -> HttpResponse:
 
     password = request.POST.get("password")
 
-    if not request.user.check_password(password):
+    if not confirm_password(request, password):
         messages.error(request, "A senha que você inseriu está incorreta!")
         return redirect("category_list")
 
@@ -209,6 +217,7 @@ def ingredient_create(request: HttpRequest) -> HttpResponse:
         measure = request.POST.get("measure")
 
         category = get_object_or_404(Category, id=category_id)
+        validate_measure(measure)
 
         if Ingredient.objects.filter(name__iexact=name).exists():
             raise ValidationError("O ingrediente que deseja cadastrar já existe!")
@@ -244,6 +253,7 @@ def ingredient_create(request: HttpRequest) -> HttpResponse:
 
 @login_required
 @require_http_methods(["GET"])
+@conditional_view("stock")
 def ingredient_list(request: HttpRequest) -> HttpResponse:
     """Lista todos os ingredientes cadastrados, com filtros e paginação.
 
@@ -290,6 +300,7 @@ def ingredient_list(request: HttpRequest) -> HttpResponse:
 
 @login_required
 @require_http_methods(["GET"])
+@conditional_view("stock")
 def ingredient_detail(request: HttpRequest, id: int) -> HttpResponse:
     """Exibe os detalhes de um ingrediente específico.
 
@@ -303,7 +314,9 @@ def ingredient_detail(request: HttpRequest, id: int) -> HttpResponse:
         HttpResponse: Página com os detalhes do ingrediente.
     """
 
-    context = {"ingredient": get_object_or_404(Ingredient, id=id)}
+    ingredient = get_object_or_404(Ingredient, id=id)
+    lots = ingredient.lots.filter(remaining__gt=0).order_by(*lot_order())
+    context = {"ingredient": ingredient, "lots": lots}
     return render(request, "ingredient_detail.html", context)
 
 
@@ -358,9 +371,8 @@ def ingredient_update(request: HttpRequest, id: int) -> HttpResponse:
         ingredient.category = get_object_or_404(Category, id=category_id)
         ingredient.qte = qte
         ingredient.min_qte = min_qte
-        ingredient.measure = request.POST.get("measure")
 
-        ingredient.save()
+        save_ingredient(ingredient, request.POST.get("measure"))
 
         messages.success(request, "Ingrediente alterado com sucesso!")
         return redirect("ingredient_list")
@@ -400,11 +412,15 @@ def ingredient_delete(request: HttpRequest, id: int) -> HttpResponse:
 
     password = request.POST.get("password")
 
-    if not request.user.check_password(password):
+    if not confirm_password(request, password):
         messages.error(request, "A senha que você inseriu está incorreta!")
         return redirect("ingredient_list")
 
+    products = list(Product.objects.filter(productingredient__ingredient=ingredient).select_related("recipe"))
     ingredient.delete()
+    # As receitas perderam o ingrediente: as próximas saídas usam uma versão nova
+    for product in products:
+        publish_recipe(product)
 
     messages.success(request, "Ingrediente deletado com sucesso!")
     return redirect("ingredient_list")
@@ -476,6 +492,7 @@ def product_create(request: HttpRequest) -> HttpResponse:
                 ingredient_id=ingredient_id,
                 quantity=quantity,
             )
+        publish_recipe(product)
 
         messages.success(request, "Produto criado com sucesso!")
         return redirect("product_list")
@@ -644,6 +661,8 @@ def product_update(request: HttpRequest, id: int) -> HttpResponse:
                 ingredient_id=ingredient_id,
                 defaults={"quantity": quantity},
             )
+        # Só cria uma versão nova se a receita mudou (nome e preço não entram na versão)
+        publish_recipe(product)
 
         messages.success(request, "Produto alterado com sucesso!")
         return redirect("product_list")
@@ -683,7 +702,7 @@ def product_delete(request: HttpRequest, id: int) -> HttpResponse:
 
     password = request.POST.get("password")
 
-    if not request.user.check_password(password):
+    if not confirm_password(request, password):
         messages.error(request, "A senha que você inseriu está incorreta!")
         return redirect("product_list")
 
@@ -691,3 +710,183 @@ def product_delete(request: HttpRequest, id: int) -> HttpResponse:
 
     messages.success(request, "Produto deletado com sucesso!")
     return redirect("product_list")
+
+
+@login_required
+@admin_required
+@require_http_methods(["GET", "POST"])
+def stocktake_create(request: HttpRequest) -> HttpResponse:
+    """Registra a contagem física do estoque.
+
+    GET:
+        Renderiza o formulário com todos os ingredientes.
+
+    POST:
+        - Lê as quantidades do formulário ou do CSV enviado (colunas "ingrediente" e "quantidade").
+        - Aplica a contagem em uma transação e redireciona para as diferenças encontradas.
+        - Caso algum dado seja inválido, retorna o formulário com os erros.
+
+    Returns:
+        HttpResponse: Página de contagem (GET ou POST inválido).
+        HttpResponseRedirect: Redireciona para o detalhe da contagem.
+    """
+
+    context = {"ingredients": Ingredient.objects.order_by("name")}
+
+    if request.method == "GET":
+        return render(request, "stocktake_create.html", context)
+
+    try:
+        upload = request.FILES.get("file")
+        counts = counts_from_csv(upload) if upload else counts_from_form(request.POST)
+
+        user = request.user
+        stocktake = apply_stocktake(counts, f"{user.first_name} {user.last_name}", request.POST.get("commentary", ""))
+
+        messages.success(request, "Contagem registrada com sucesso!")
+        return redirect("stocktake_detail", id=stocktake.id)
+
+    except ValidationError as e:
+        for msg in e.messages:
+            messages.error(request, msg)
+        context["old_data"] = request.POST
+        # Mantém as quantidades já digitadas
+        context["ingredients"] = list(context["ingredients"])
+        for ingredient in context["ingredients"]:
+            ingredient.old_count = request.POST.get(f"c-{ingredient.id}", "")
+        return render(request, "stocktake_create.html", context)
+
+
+@login_required
+@admin_required
+@require_http_methods(["GET"])
+def stocktake_list(request: HttpRequest) -> HttpResponse:
+    """Lista as contagens de estoque, da mais recente para a mais antiga.
+
+    Returns:
+        HttpResponse: Página com a lista de contagens.
+    """
+
+    stocktakes = Stocktake.objects.annotate(
+        ingredients=Count("lines"),
+        divergent=Count("lines", filter=~Q(lines__counted=F("lines__expected"))),
+    ).order_by("-date")
+
+    paginator = Paginator(stocktakes, 10)
+    page_obj = paginator.get_page(request.GET.get("page") or 1)
+
+    context = {
+        "page_obj": page_obj,
+        "Paginator": paginator,
+        "is_paginated": page_obj.has_other_pages(),
+    }
+    return render(request, "stocktake_list.html", context)
+
+
+@login_required
+@admin_required
+@require_http_methods(["GET"])
+def stocktake_detail(request: HttpRequest, id: int) -> HttpResponse:
+    """Exibe as diferenças (esperado x contado) e o consumo de cada ingrediente contado.
+
+    Args:
+        id (int): Identificador único da contagem.
+
+    Returns:
+        HttpResponse: Página de detalhes da contagem.
+    """
+
+    stocktake = get_object_or_404(Stocktake, id=id)
+    return render(request, "stocktake_detail.html", {"stocktake": stocktake, "lines": stocktake.lines.order_by("name")})
+
+
+@login_required
+@admin_required
+@require_http_methods(["GET", "POST"])
+def sales_plan(request: HttpRequest) -> HttpResponse:
+    """Simula um plano de vendas: quanto de cada ingrediente ele consome e o que vai faltar.
+
+    GET:
+        Renderiza o formulário com a quantidade planejada de cada produto.
+
+    POST:
+        - Lê as quantidades planejadas (p-<id>).
+        - Exibe, para cada ingrediente usado, o necessário, o estoque, a falta e o custo
+          estimado da compra (pelo preço da última entrada).
+        - Caso algum dado seja inválido, retorna o formulário com os erros.
+
+    Returns:
+        HttpResponse: Página do planejamento.
+    """
+
+    products = list(Product.objects.order_by("name").only("id", "name", "price"))
+    context = {"products": products}
+
+    if request.method == "POST":
+        for product in products:
+            product.planned = request.POST.get(f"p-{product.id}", "")
+        try:
+            context["result"] = simulate([plan_from_form(request.POST)])[0]
+        except ValidationError as e:
+            for msg in e.messages:
+                messages.error(request, msg)
+
+    return render(request, "sales_plan.html", context)
+
+
+@login_required
+@admin_required
+@require_http_methods(["POST"])
+def sales_plan_simulate(request: HttpRequest) -> HttpResponse:
+    """Simula vários cenários de vendas de uma vez (JSON).
+
+    POST:
+        Recebe {"scenarios": [{"name": ..., "plan": {"<id do produto>": quantidade}}]} e
+        retorna, para cada cenário, os ingredientes (necessário, estoque, falta e custo
+        estimado), o custo total e a quantidade de ingredientes em falta. As receitas,
+        o estoque e os custos são lidos uma única vez para todos os cenários.
+
+    Returns:
+        JsonResponse: Resultado de cada cenário, ou os erros com status 400.
+    """
+
+    try:
+        plans = plans_from_json(request.body)
+    except ValidationError as e:
+        return JsonResponse({"errors": e.messages}, status=400)
+
+    results = simulate([plan for _, plan in plans])
+    scenarios = [{"name": name, **result} for (name, _), result in zip(plans, results)]
+    return JsonResponse({"scenarios": scenarios})
+
+
+@login_required
+@require_http_methods(["GET"])
+def catalog_sync(request: HttpRequest) -> HttpResponse:
+    """Retorna as alterações do catálogo e do estoque desde a versão informada.
+
+    Usado pelos terminais, que guardam o cardápio e o estoque localmente e pedem apenas
+    o que mudou (?since=<versão>). Responde em MessagePack com ?format=msgpack ou
+    Accept: application/msgpack, e em JSON compacto nos demais casos.
+
+    GET:
+        Retorna version, full (catálogo completo), more (há outra página) e changes
+        ([model, id, campos ou null quando removido]).
+
+    Returns:
+        HttpResponse: Alterações codificadas.
+    """
+
+    try:
+        since = max(int(request.GET.get("since") or 0), 0)
+    except ValueError:
+        return HttpResponseBadRequest("Versão inválida")
+
+    payload = changes_since(since, settings.SYNC_PAGE_SIZE)
+    content, content_type = encode(payload, wants_msgpack(request))
+
+    response = HttpResponse(content, content_type=content_type)
+    response["X-Catalog-Version"] = payload["version"]
+    patch_vary_headers(response, ["Accept"])
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
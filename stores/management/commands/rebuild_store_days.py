@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from stores.models import Store
+from stores.services import rebuild_store_days
+
+
+class Command(BaseCommand):
+    help = "Recalcula os totais diários (painel da matriz) a partir das movimentações de cada loja."
+
+    def add_arguments(self, parser):
+        parser.add_argument("codes", nargs="*", help="Códigos das lojas (padrão: todas).")
+
+    def handle(self, *args, **options):
+        stores = Store.objects.order_by("code")
+        if options["codes"]:
+            stores = stores.filter(code__in=options["codes"])
+
+        for store in stores:
+            days = rebuild_store_days(store)
+            self.stdout.write(f"{store.code}: {days} dias")
@@ -0,0 +1,102 @@
+from django.db import models
+
+from core.routers import current_store
+
+
+class Store(models.Model):
+    """Representa uma loja (pizzaria) da rede.
+
+    Atributes:
+        name (str): Nome da loja.
+        code (str): Identificador curto da loja.
+        database (str): Alias do banco com o estoque e as movimentações da loja
+            ("default" ou um dos STORE_DATABASES).
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+    code = models.SlugField(max_length=30, unique=True)
+    database = models.CharField(max_length=30, default="default")
+
+    def __str__(self):
+        return self.name
+
+
+class StoreDay(models.Model):
+    """Totais diários das movimentações de cada loja, usados pelo painel da matriz.
+
+    Ficam no banco "default", então a matriz soma os totais de todas as lojas sem
+    consultar as movimentações no banco de cada uma.
+
+    Atributes:
+        store (Store): Loja.
+        day (date): Dia.
+        movements (int): Quantidade de movimentações.
+        inflow_value (Decimal): Soma das entradas.
+        outflow_value (Decimal): Soma das saídas.
+    """
+
+    store = models.ForeignKey(Store, on_delete=models.CASCADE)
+    day = models.DateField()
+    movements = models.IntegerField(default=0)
+    inflow_value = models.DecimalField(default=0, max_digits=14, decimal_places=2)
+    outflow_value = models.DecimalField(default=0, max_digits=14, decimal_places=2)
+
+    class Meta:
+        unique_together = ("store", "day")
+
+    def __str__(self):
+        return f"{self.store} - {self.day}"
+
+
+class StoreEvent(models.Model):
+    """Alteração publicada para as páginas abertas (painel e lista de ingredientes).
+
+    Fica no banco "default", então todos os processos do servidor leem os mesmos
+    eventos, independente do banco da loja.
+
+    Atributes:
+        store (Store): Loja da movimentação (None para movimentações sem loja).
+        created_at (datetime): Data de publicação.
+        data (dict): Variações enviadas aos clientes.
+    """
+
+    store = models.ForeignKey(Store, null=True, blank=True, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    data = models.JSONField()
+
+    def __str__(self):
+        return f"{self.id}: {self.store or '-'}"
+
+
+class StoreScopedManager(models.Manager):
+    """Filtra os registros pela loja do usuário logado (current_store)."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        store = current_store.get()
+        if store is None:
+            return queryset
+        return queryset.filter(store_id=store.id)
+
+
+class StoreScopedModel(models.Model):
+    """Base dos models que pertencem a uma loja.
+
+    Registros criados durante uma requisição recebem a loja do usuário logado. A loja
+    pode estar em outro banco, por isso a chave estrangeira não tem constraint.
+    """
+
+    store = models.ForeignKey(
+        Store, null=True, blank=True, on_delete=models.PROTECT, db_constraint=False, related_name="+"
+    )
+
+    objects = StoreScopedManager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        store = current_store.get()
+        if self.store_id is None and store is not None:
+            self.store_id = store.id
+        super().save(*args, **kwargs)
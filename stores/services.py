@@ -0,0 +1,133 @@
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils.timezone import localdate
+
+from core.routers import current_store
+
+from .models import Store, StoreDay
+
+
+def store_cache_key(store_id) -> str:
+    return f"store:{store_id}"
+
+
+def get_store(store_id: int) -> Store | None:
+    """Busca a loja pelo id, guardando em cache (invalidado quando a loja é alterada)."""
+
+    key = store_cache_key(store_id)
+    store = cache.get(key)
+    if store is None:
+        store = Store.objects.filter(id=store_id).first()
+        if store is not None:
+            cache.set(key, store, settings.USER_CACHE_TIMEOUT)
+    return store
+
+
+@contextmanager
+def using_store(store: Store | None):
+    """Executa o bloco como se o usuário logado fosse da loja informada (ex: em comandos)."""
+
+    token = current_store.set(store)
+    try:
+        yield
+    finally:
+        current_store.reset(token)
+
+
+def record_store_movement(movement, sign: int = 1) -> None:
+    """Soma (ou subtrai, com sign=-1) a movimentação aos totais diários da loja.
+
+    Args:
+        movement (Movement): Movimentação registrada ou removida.
+        sign (int): 1 para registro, -1 para exclusão.
+    """
+
+    if movement.store_id is None:
+        return
+
+    field = "inflow_value" if movement.type == "in" else "outflow_value"
+    StoreDay.objects.get_or_create(store_id=movement.store_id, day=localdate(movement.date))
+    StoreDay.objects.filter(store_id=movement.store_id, day=localdate(movement.date)).update(
+        movements=F("movements") + sign,
+        **{field: F(field) + sign * movement.value},
+    )
+
+
+def rebuild_store_days(store: Store) -> int:
+    """Recalcula os totais diários da loja a partir das movimentações.
+
+    Returns:
+        int: Quantidade de dias gravados.
+    """
+
+    from movements.models import Movement
+
+    with using_store(store):
+        days = (
+            Movement.objects.annotate(day=TruncDate("date"))
+            .values("day")
+            .annotate(
+                count=Count("id"),
+                inflow=Sum("value", filter=Q(type="in")),
+                outflow=Sum("value", filter=Q(type="out")),
+            )
+        )
+        rows = [
+            StoreDay(
+                store=store,
+                day=row["day"],
+                movements=row["count"],
+                inflow_value=row["inflow"] or 0,
+                outflow_value=row["outflow"] or 0,
+            )
+            for row in days
+        ]
+
+    with transaction.atomic():
+        StoreDay.objects.filter(store=store).delete()
+        StoreDay.objects.bulk_create(rows)
+    return len(rows)
+
+
+def get_hq_dashboard() -> dict:
+    """Reúne o faturamento de cada loja a partir dos totais diários, em uma consulta.
+
+    Returns:
+        dict: Contexto do template hq_dashboard.html.
+    """
+
+    today = localdate()
+    starts = {
+        "daily": today,
+        "weekly": today - timedelta(days=today.weekday()),
+        "monthly": today.replace(day=1),
+    }
+
+    sums = {"movements_month": Sum("movements", filter=Q(day__gte=starts["monthly"]))}
+    for period, start in starts.items():
+        sums[f"{period}_in"] = Sum("inflow_value", filter=Q(day__gte=start))
+        sums[f"{period}_out"] = Sum("outflow_value", filter=Q(day__gte=start))
+
+    rows = {
+        row["store_id"]: row
+        for row in StoreDay.objects.filter(day__gte=min(starts.values())).values("store_id").annotate(**sums)
+    }
+
+    stores = []
+    totals = dict.fromkeys(["daily_net", "weekly_net", "monthly_net", "movements_month"], 0)
+    for store in Store.objects.order_by("name"):
+        row = rows.get(store.id, {})
+        summary = {"store": store, "movements_month": row.get("movements_month") or 0}
+        for period in starts:
+            summary[f"{period}_net"] = (row.get(f"{period}_out") or 0) - (row.get(f"{period}_in") or 0)
+        for key in totals:
+            totals[key] += summary[key]
+        stores.append(summary)
+
+    return {"stores": stores, "totals": totals}
@@ -0,0 +1,14 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Store
+from .services import store_cache_key
+
+
+@receiver([post_save, post_delete], sender=Store)
+def invalidate_store_cache(sender, instance, **kwargs):
+    key = store_cache_key(instance.pk)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,67 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from accounts.models import CustomUser
+from stock.models import Ingredient
+
+from .models import Store
+from .services import using_store
+
+
+class StoreScopedManagerTests(TestCase):
+    """Registros filtrados pela loja do usuário logado (current_store)."""
+
+    def setUp(self):
+        self.centro = Store.objects.create(name="Centro", code="centro")
+        self.sul = Store.objects.create(name="Sul", code="sul")
+        Ingredient.objects.create(name="Queijo", measure="kg", store=self.centro)
+        Ingredient.objects.create(name="Tomate", measure="kg", store=self.sul)
+
+    def test_store_sees_only_own_records(self):
+        with using_store(self.centro):
+            self.assertEqual(list(Ingredient.objects.values_list("name", flat=True)), ["Queijo"])
+            self.assertFalse(Ingredient.objects.filter(name="Tomate").exists())
+
+    def test_hq_sees_every_store(self):
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+    def test_new_records_belong_to_current_store(self):
+        with using_store(self.sul):
+            ingredient = Ingredient.objects.create(name="Queijo", measure="kg")
+
+        self.assertEqual(ingredient.store_id, self.sul.id)
+
+    def test_related_lookups_ignore_the_scope(self):
+        # O acesso por chave estrangeira usa o _base_manager, sem o filtro da loja
+        ingredient = Ingredient.objects.get(name="Tomate")
+        with using_store(self.centro):
+            self.assertEqual(Ingredient._base_manager.get(id=ingredient.id), ingredient)
+
+
+class HqDashboardTests(TestCase):
+    def setUp(self):
+        self.store = Store.objects.create(name="Centro", code="centro")
+
+    def login(self, store: Store | None):
+        user = CustomUser.objects.create_user(
+            username="admin",
+            email="admin@devspizza.com",
+            password="senha-forte",
+            role="admin",
+            first_name="Admin",
+            last_name="Teste",
+            store=store,
+        )
+        self.client.force_login(user)
+
+    def test_hq_admin_sees_the_panel(self):
+        self.login(store=None)
+        response = self.client.get(reverse("hq_dashboard"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["store"] for row in response.context["stores"]], [self.store])
+
+    def test_store_admin_is_redirected(self):
+        self.login(store=self.store)
+
+        self.assertRedirects(self.client.get(reverse("hq_dashboard")), reverse("home"), fetch_redirect_response=False)
@@ -0,0 +1,26 @@
+from django.contrib.auth.decorators import login_required
+from django.http import HttpRequest, HttpResponse
+from django.shortcuts import render
+from django.views.decorators.http import require_http_methods
+
+from core.decorators import admin_required, conditional_view, hq_required
+
+from .services import get_hq_dashboard
+
+
+@login_required
+@admin_required
+@hq_required
+@require_http_methods(["GET"])
+@conditional_view("movements")
+def hq_dashboard(request: HttpRequest) -> HttpResponse:
+    """Exibe o faturamento de todas as lojas, lido dos totais diários de cada uma.
+
+    Args:
+        request (HttpRequest): Objeto de requisição do Django.
+
+    Returns:
+        HttpResponse: Painel da matriz.
+    """
+
+    return render(request, "hq_dashboard.html", get_hq_dashboard())